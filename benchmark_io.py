@@ -0,0 +1,83 @@
+"""
+Compare I/O strategies ('settings.io_strategy') on this machine.
+
+Each strategy compresses the same file into a stream that discards
+its output, so only reading, hashing and compressing are measured.
+
+    python benchmark_io.py [FILE] [--size MiB] [--level LEVEL] [--chunk KiB] [--rounds N]
+
+Without FILE, a temporary file of '--size' MiB is created.
+Run it against a file on the storage you back up, a second
+run may be served from page cache.
+"""
+import os
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from time import perf_counter
+
+import zstandard as zstd
+
+from src.archive import STRATEGIES, NullWriter, read_chunks
+from src.compress import new_digest
+from src.converter import size_converter
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='Compare I/O strategies used to read large files')
+    parser.add_argument('file', nargs='?', help='file to read (default: a temporary file)')
+    parser.add_argument('--size', type=int, default=512, help='size of temporary file in MiB (default: 512)')
+    parser.add_argument('--level', type=int, default=1, help='compression level (default: 1)')
+    parser.add_argument('--chunk', type=int, default=1024, help='bytes per read in KiB (default: 1024)')
+    parser.add_argument('--rounds', type=int, default=3, help='runs per strategy, best is kept (default: 3)')
+    return parser.parse_args()
+
+
+def run(filepath: str, strategy: str, level: int, chunk_size: int) -> tuple:
+    """
+    :return: seconds taken and peak bytes allocated by Python
+    """
+    size: int = os.path.getsize(filepath)
+    cctx = zstd.ZstdCompressor(level=level)
+    buffer = bytearray(chunk_size)
+    digest = new_digest()
+
+    tracemalloc.start()
+    start: float = perf_counter()
+
+    with open(filepath, 'rb') as file, cctx.stream_writer(NullWriter()) as writer:
+        for chunk in read_chunks(file, size, chunk_size, strategy, buffer):
+            digest.update(chunk)
+            writer.write(chunk)
+
+    elapsed: float = perf_counter() - start
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+if __name__ == '__main__':
+    args: Namespace = parse_args()
+
+    filepath: str = args.file
+    temporary: bool = filepath is None
+    if temporary:
+        " Half random, half repeated: something zstd can work with "
+        fd, filepath = tempfile.mkstemp(prefix='zstd-backup-', suffix='.bin')
+        with os.fdopen(fd, 'wb') as file:
+            for _ in range(args.size):
+                file.write(os.urandom(512 * 1024) + bytes(512 * 1024))
+
+    try:
+        size: int = os.path.getsize(filepath)
+        print(f'File: {filepath} ({size_converter(size)}), level {args.level}, chunk {args.chunk} KiB')
+        print(f'{"strategy":<10} {"time":>9} {"MiB/s":>9} {"peak alloc":>12}')
+
+        for strategy in STRATEGIES:
+            results: list = [run(filepath, strategy, args.level, args.chunk * 1024) for _ in range(args.rounds)]
+            elapsed, peak = min(results)
+            print(f'{strategy:<10} {elapsed:>8.2f}s {size / elapsed / 1024 / 1024:>9.1f} {size_converter(peak):>12}')
+    finally:
+        if temporary:
+            os.remove(filepath)
@@ -10,7 +10,7 @@ setup(
     description="Backup your files/folders using ZStandard algorithm",
     url=__url__,
     download_url=f'{__url__}/releases/latest',
-    py_modules=['zstd_backup'],
+    py_modules=['zstd_backup', 'zstd_restore'],
     install_required=['PyYAML', 'zstandard'],
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
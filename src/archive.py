@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import copy
+import errno
+import mmap
+import os
+import tarfile
+from io import BytesIO
+from typing import Callable, Iterator, Optional, Union
+
+from src import logger
+from src.converter import size_converter
+
+STRATEGIES: tuple = ('read', 'readinto', 'mmap')
+
+" Size field of a tar header holds 11 octal digits, 'tarfile' can't read larger sparse members back "
+SPARSE_LIMIT: int = 8 ** 11
+
+
+def _fileno(file) -> Optional[int]:
+    """
+    :return: file descriptor of 'file', None for in-memory streams
+    """
+    try:
+        return file.fileno()
+    except (AttributeError, OSError):
+        return None
+
+
+def read_chunks(file, size: int, chunk_size: Union[int, Callable[[], int]], strategy: str = 'read',
+                buffer: Optional[bytearray] = None) -> Iterator:
+    """
+    Read exactly 'size' bytes of 'file', one chunk at a time.
+
+    'read': every chunk is a new bytes object
+    'readinto': chunks are views of 'buffer', refilled each time
+    'mmap': chunks are views of the memory-mapped file, nothing is copied
+
+    A chunk is only valid until the next one is requested.
+    Streams without file descriptor (or 'readinto') use the next simpler strategy.
+
+    :param file: binary file positioned at the start
+    :param size: number of bytes to read
+    :param chunk_size: maximum size of each chunk, or a function
+                       returning it (asked again before every chunk)
+    :param strategy: one of STRATEGIES
+    :param buffer: reused by 'readinto', allocated if missing
+    :raise OSError: if file has fewer than 'size' bytes
+    """
+    next_size: Callable[[], int] = chunk_size if callable(chunk_size) else lambda: chunk_size
+
+    if strategy == 'mmap' and size and _fileno(file) is not None:
+        with mmap.mmap(_fileno(file), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) < size:
+                raise OSError('unexpected end of data')
+
+            view: memoryview = memoryview(mapped)
+            try:
+                offset: int = 0
+                while offset < size:
+                    chunk: memoryview = view[offset:min(offset + next_size(), size)]
+                    offset += len(chunk)
+                    yield chunk
+                    " Map can't be closed while views of it exist "
+                    chunk.release()
+            finally:
+                view.release()
+        return
+
+    remaining: int = size
+
+    if strategy in ('readinto', 'mmap') and hasattr(file, 'readinto'):
+        view: Optional[memoryview] = None
+
+        while remaining:
+            wanted: int = min(next_size(), remaining)
+            if buffer is None or len(buffer) < wanted:
+                buffer = bytearray(wanted)
+                view = None
+            if view is None:
+                view = memoryview(buffer)
+
+            n: int = file.readinto(view[:wanted])
+            if not n:
+                raise OSError('unexpected end of data')
+            remaining -= n
+            yield view[:n]
+        return
+
+    while remaining:
+        data: bytes = file.read(min(next_size(), remaining))
+        if not data:
+            raise OSError('unexpected end of data')
+        remaining -= len(data)
+        yield data
+
+
+def sparse_regions(file, size: int, limit: Optional[int] = SPARSE_LIMIT) -> Optional[list]:
+    """
+    Find where data is in a file with holes, without reading it.
+
+    :param file: binary file with a file descriptor
+    :param size: size of the file
+    :param limit: most bytes of data (and map) the regions may hold, None for any
+    :return: list of (offset, length) of data, ending with (size, 0)
+             if file ends with a hole. None if it has no hole, if the
+             system can't tell or if there's more data than 'limit'
+    """
+    fd: Optional[int] = _fileno(file)
+    if fd is None or not hasattr(os, 'SEEK_HOLE'):
+        return None
+
+    regions: list = []
+    try:
+        if os.lseek(fd, 0, os.SEEK_HOLE) >= size:
+            return None
+
+        offset: int = 0
+        while offset < size:
+            try:
+                start: int = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                " Nothing but a hole up to the end "
+                if e.errno == errno.ENXIO:
+                    break
+                raise
+            if start >= size:
+                break
+
+            end: int = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+            regions.append((start, end - start))
+            offset = end
+    except OSError:
+        return None
+    finally:
+        os.lseek(fd, 0, os.SEEK_SET)
+
+    " Readers learn the real size from the last region "
+    if not regions or sum(regions[-1]) < size:
+        regions.append((size, 0))
+
+    data: int = len(sparse_map(regions)) + sum(length for _, length in regions)
+    if limit is not None and data >= limit:
+        logger.warn(f'{getattr(file, "name", "File")} has {size_converter(data)} of data, too much for '
+                    f'a sparse member. Stored whole, holes included')
+        return None
+    return regions
+
+
+def sparse_map(regions: list) -> bytes:
+    """
+    :param regions: list of (offset, length) from 'sparse_regions'
+    :return: GNU sparse map (format 1.0) written before the data, padded to a block
+    """
+    lines: list = [str(len(regions))] + [str(number) for region in regions for number in region]
+    data: bytes = ''.join(f'{line}\n' for line in lines).encode()
+    return data + tarfile.NUL * (-len(data) % tarfile.BLOCKSIZE)
+
+
+class NullWriter:
+    """
+    Counts bytes written, keeps none of them
+    """
+
+    def __init__(self) -> None:
+        self.written: int = 0
+
+    def write(self, data) -> int:
+        self.written += len(data)
+        return len(data)
+
+
+class TarWriter:
+    """
+    Write a tarball straight into a stream.
+
+    Does what 'tarfile' does in 'w|' mode, minus its internal
+    buffer: headers come from 'TarInfo.tobuf' and file data
+    goes to the stream in chunks from 'read_chunks', so large
+    files can be written without allocating per chunk.
+    """
+
+    def __init__(self, fileobj, format: int = tarfile.PAX_FORMAT) -> None:
+        """
+        :param fileobj: writable binary stream
+        :param format: tar format of headers
+        """
+        self.fileobj = fileobj
+        self.format: int = format
+        self.offset: int = 0
+        " Only used to build headers from stat "
+        self._tar = tarfile.TarFile(fileobj=BytesIO(), mode='w', format=format)
+
+    def _write(self, data) -> None:
+        self.fileobj.write(data)
+        self.offset += len(data)
+
+    def _pad(self, size: int) -> None:
+        remainder: int = size % tarfile.BLOCKSIZE
+        if remainder:
+            self._write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    def addfile(self, tarinfo: tarfile.TarInfo, file=None, chunk_size: Union[int, Callable[[], int]] = 1024 * 1024,
+                strategy: str = 'read', buffer: Optional[bytearray] = None,
+                callback: Optional[Callable] = None) -> None:
+        """
+        Write a member, followed by 'tarinfo.size' bytes of 'file'
+
+        :param tarinfo: header of the member
+        :param file: binary file holding member's data
+        :param chunk_size: maximum bytes written per cycle (see 'read_chunks')
+        :param strategy: how file is read (see 'read_chunks')
+        :param buffer: reused by 'readinto' strategy
+        :param callback: called with every chunk before it's written
+        """
+        self._write(tarinfo.tobuf(self.format, tarfile.ENCODING, 'surrogateescape'))
+        if file is None or not tarinfo.size:
+            return
+
+        for chunk in read_chunks(file, tarinfo.size, chunk_size, strategy, buffer):
+            if callback is not None:
+                callback(chunk)
+            self._write(chunk)
+        self._pad(tarinfo.size)
+
+    def addsparse(self, tarinfo: tarfile.TarInfo, file, regions: list,
+                  chunk_size: Union[int, Callable[[], int]] = 1024 * 1024,
+                  callback: Optional[Callable] = None) -> None:
+        """
+        Write a member as a GNU sparse file (PAX format 1.0):
+        only 'regions' of 'file' are read and stored, readers
+        (GNU tar, 'tarfile') fill the holes back in.
+
+        :param tarinfo: header of the member, 'size' is the size of the whole file
+        :param file: seekable binary file holding member's data
+        :param regions: list of (offset, length) from 'sparse_regions'
+        :param chunk_size: maximum bytes written per cycle (see 'read_chunks')
+        :param callback: called with every chunk before it's written
+        """
+        head: bytes = sparse_map(regions)
+        header: tarfile.TarInfo = copy.copy(tarinfo)
+        directory, _, name = tarinfo.name.rpartition('/')
+        " Same stand-in name as GNU tar, real one goes in 'GNU.sparse.name' "
+        header.name = f'{directory}/GNUSparseFile.0/{name}' if directory else f'GNUSparseFile.0/{name}'
+        header.size = len(head) + sum(length for _, length in regions)
+        header.pax_headers = {
+            'path': header.name,
+            'GNU.sparse.major': '1',
+            'GNU.sparse.minor': '0',
+            'GNU.sparse.name': tarinfo.name,
+            'GNU.sparse.realsize': str(tarinfo.size),
+            **tarinfo.pax_headers
+        }
+
+        self._write(header.tobuf(self.format, tarfile.ENCODING, 'surrogateescape'))
+        self._write(head)
+        for offset, length in regions:
+            file.seek(offset)
+            for chunk in read_chunks(file, length, chunk_size):
+                if callback is not None:
+                    callback(chunk)
+                self._write(chunk)
+        self._pad(header.size)
+
+    def add(self, path: str, arcname: Optional[str] = None) -> Optional[tarfile.TarInfo]:
+        """
+        Write a member for 'path' (not recursive), like 'TarFile.add'
+
+        :return: header of the member, None for unsupported file types (sockets)
+        """
+        tarinfo: Optional[tarfile.TarInfo] = self._tar.gettarinfo(path, arcname)
+        if tarinfo is None:
+            return None
+
+        if tarinfo.isreg():
+            with open(path, 'rb') as file:
+                self.addfile(tarinfo, file)
+        else:
+            self.addfile(tarinfo)
+        return tarinfo
+
+    def close(self, end: bool = True) -> None:
+        """
+        :param end: write end-of-archive marker, without it another tarball can follow
+        """
+        if end:
+            self._write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+            " Fill up the last record like 'tarfile' does "
+            remainder: int = self.offset % tarfile.RECORDSIZE
+            if remainder:
+                self._write(tarfile.NUL * (tarfile.RECORDSIZE - remainder))
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Callable, NamedTuple
+
+import zstandard as zstd
+
+from src import logger
+from src.archive import NullWriter
+from src.converter import size_converter
+
+" Levels tried, from fastest to strongest "
+LEVELS: tuple = (1, 3, 5, 7, 9, 12, 15, 17, 19)
+
+" Data compressed at every level tried "
+SAMPLE_SIZE: int = 16 * 1024 * 1024
+" Largest piece taken from a single file "
+PIECE_SIZE: int = 1024 * 1024
+
+
+class Trial(NamedTuple):
+    """
+    Result of compressing the sample at a level
+    """
+    level: int
+    seconds: float
+    ratio: float
+
+
+def budget_of(time_budget: int, target_speed: int, total_size: int) -> float:
+    """
+    :param time_budget: seconds a backup may take, 0 if not set
+    :param target_speed: slowest acceptable bytes per second, 0 if not set
+    :param total_size: bytes to back up
+    :return: seconds the backup may take, the stricter of both, 0 if neither is set
+    """
+    budgets: list = []
+    if time_budget:
+        budgets.append(float(time_budget))
+    if target_speed:
+        budgets.append(total_size / target_speed)
+    return min(budgets) if budgets else 0.0
+
+
+def read_sample(entries: list, size: int = SAMPLE_SIZE, piece: int = PIECE_SIZE) -> tuple:
+    """
+    Take the start of files spread evenly over 'entries',
+    so both small and large files are represented.
+
+    :param entries: list of FileEntry
+    :param size: bytes to collect
+    :param piece: most bytes taken from a single file
+    :return: sample and bytes per second it was read at
+    """
+    files: list = [entry for entry in entries if entry.isreg and entry.size]
+    total: int = sum(min(entry.size, piece) for entry in files)
+    step: float = max(1.0, total / size)
+
+    pieces: list = []
+    collected: int = 0
+    position: float = 0.0
+    start: float = perf_counter()
+
+    " Walk through files by bytes, each file's share is at most 'piece' "
+    covered: int = 0
+    for entry in files:
+        share: int = min(entry.size, piece)
+        covered += share
+        if covered < position:
+            continue
+
+        try:
+            with open(entry.path, 'rb') as file:
+                data: bytes = file.read(share)
+        except OSError:
+            continue
+
+        pieces.append(data)
+        collected += len(data)
+        position += share * step
+        if collected >= size:
+            break
+
+    elapsed: float = perf_counter() - start
+    return b''.join(pieces), collected / elapsed if elapsed else 0.0
+
+
+def trial(sample: bytes, level: int, new_compressor: Callable[[int], zstd.ZstdCompressor]) -> tuple:
+    """
+    :return: seconds it took to compress 'sample' and compressed size
+    """
+    counter = NullWriter()
+    start: float = perf_counter()
+    with new_compressor(level).stream_writer(counter, closefd=False) as writer:
+        writer.write(sample)
+    return perf_counter() - start, counter.written
+
+
+def pick_level(entries: list, total_size: int, budget: float, new_compressor: Callable[[int], zstd.ZstdCompressor],
+               workers: int = 1, overlap: bool = False) -> tuple:
+    """
+    Compress a sample of 'entries' at increasing levels and keep the
+    strongest one whose predicted time for 'total_size' fits 'budget'.
+    Higher levels are only tried while lower ones still fit.
+
+    :param entries: list of FileEntry to be backed up
+    :param total_size: bytes to back up
+    :param budget: seconds the backup may take
+    :param new_compressor: builds a compressor of the given level
+    :param workers: processes compressing at the same time (shards)
+    :param overlap: whether reading and compressing run at the same time
+    :return: picked level, its predicted seconds and every Trial
+    """
+    sample, read_speed = read_sample(entries)
+    if not sample:
+        return LEVELS[0], 0.0, []
+
+    read_seconds: float = total_size / read_speed if read_speed else 0.0
+    trials: list = []
+
+    for level in LEVELS:
+        seconds, compressed = trial(sample, level, new_compressor)
+        compress_seconds: float = total_size * seconds / len(sample) / workers
+        predicted: float = max(read_seconds, compress_seconds) if overlap else read_seconds + compress_seconds
+
+        trials.append(Trial(level, predicted, len(sample) / max(1, compressed)))
+        logger.debug(f'Level {level}: {predicted:.0f}s predicted, ratio {trials[-1].ratio:.2f}')
+        if predicted > budget:
+            break
+
+    fitting: list = [item for item in trials if item.seconds <= budget]
+    if not fitting:
+        logger.warn(f'No level fits in {budget:.0f}s, even level {LEVELS[0]} '
+                    f'is predicted to take {trials[0].seconds:.0f}s')
+        fitting = trials[:1]
+
+    best: Trial = max(fitting, key=lambda x: x.ratio)
+    logger.info(f'Level {best.level} picked: {best.seconds:.0f}s predicted for {size_converter(total_size)}, '
+                f'budget {budget:.0f}s')
+    return best.level, best.seconds, trials
@@ -1,9 +1,12 @@
 import os
-from datetime import timedelta
 from functools import cache
+from typing import Optional
 
-from src import today, time_format, PROJECT_DIR, dir, logger
+from src import today, time_format, PROJECT_DIR, dir, logger, scanner
+from src.catalog import Catalog
 from src.config import Configuration
+from src.ignore import IgnoreMatcher
+from src.manifest import FULL, INCREMENTAL, Manifest, path_of as manifest_path
 from src.parser import parse_date
 
 
@@ -24,115 +27,98 @@ class BackupProfile:
         if dir.folder_exist(self.destination) != dir.ReturnCode.EXIST:
             os.makedirs(self.destination)
         logger.debug(f'Backup will be saved to: {self.destination}')
+        " Loaded once, every step of this backup shares it "
+        self.catalog: Catalog = Catalog.load(self.destination)
 
         #
         #   Paths to compress
         #
-        self._set_children(config.include)
+        self._set_children(config, config.settings.scan_workers)
 
         #
         #   Name of compressed file
         #
         self.filename = f'{today.strftime(time_format)}.zstd'
 
+        #
+        #   Incremental backup
+        #
+        self.kind: str = FULL
+        self.base: str = ''
+        self.previous: Manifest = Manifest()
+        self.deleted: list = []
+        if config.incremental.enabled:
+            self._set_base(config.incremental.full_every)
+
     @property
     def size(self):
         return self.__len__()
 
-    def _set_children(self, paths: set) -> None:
+    def _set_children(self, config: Configuration, workers: int = 1) -> None:
         """
-        Loop through provided paths, and add filtered
-        paths to 'self.children'
-        :param paths: to compress
+        Scan 'include' paths once, keep every file's metadata
+        in 'self.manifest' and add filtered paths to 'self.children'
+        :param config: provides paths to compress and to ignore
+        :param workers: number of threads used to scan
         """
-        self.children = set()
-
-        def _add_file(path: str) -> None:
-            """
-            Add 'path' to 'self.children' if
-            path isn't listed in 'self.ignore_paths'
-            :param path: to compress
-            """
-            for ign in self.ignore:
-                if path.startswith(ign):
-                    logger.debug(f'Ignore {path}!')
-                    return
+        " Convert paths to absolute paths "
+        abspaths: set = {dir.abspath(p) for p in config.include}
 
-            self.children.add(path)
+        " Ignored folders are pruned before the scanner enters them "
+        matcher = IgnoreMatcher(self.ignore, config.ignore_patterns, config.ignore_file)
 
-        def _add_dir(path: str) -> None:
-            """
-            Loop through every single file inside this folder
-            and use '_add_file()' to add file's path to 'self.children'
-            :param path: to loop through
-            """
-            for root, dirs, files in os.walk(path):
-                for name in files:
-                    _add_file(os.path.join(root, name))
+        self.manifest: dict = scanner.scan(abspaths, matcher, workers)
+        self.children = set(self.manifest)
 
-        for p in paths:
-            " Convert path to absolute path "
-            abspath = dir.abspath(p)
-            if not os.path.exists(abspath):
-                " If path doesn't exist, skip next step "
-                logger.warn(f'{abspath} does not exist! Skipping...')
-                continue
-
-            " Path can be either folder or file, use appropriate function for each"
-            if os.path.isdir(abspath):
-                _add_dir(abspath)
-            elif os.path.isfile(abspath):
-                _add_file(abspath)
+    def _set_base(self, full_every: int) -> None:
+        """
+        Find the most recent chain of backups. If it's not
+        full yet, this backup only keeps files that are new
+        or changed since the last backup of that chain.
+        :param full_every: maximum number of backups in a chain
+        """
+        backup_chains: list = self.catalog.chains()
+        if not backup_chains:
+            logger.info('No previous backup found > Making a full backup!')
+            return
+
+        chain: list = backup_chains[-1]
+        if len(chain) >= full_every:
+            logger.info(f'Last chain has {len(chain)} backup(s) > Making a full backup!')
+            return
+
+        previous: Optional[Manifest] = Manifest.load(chain[-1])
+        if previous is None:
+            logger.info(f'{dir.basename(chain[-1])} has no manifest > Making a full backup!')
+            return
+
+        self.kind = INCREMENTAL
+        self.base = dir.basename(chain[-1])
+        self.previous = previous
+        self.deleted = previous.removed(self.manifest)
+        self.children = previous.changed(self.manifest)
+
+        logger.info(f'Incremental backup on top of {self.base}: '
+                    f'{len(self.children)} new or changed, {len(self.deleted)} deleted file(s)')
+
+    def entries(self) -> list:
+        """
+        :return: FileEntry of every child, ready to be archived
+        """
+        return [entry for path, entry in self.manifest.items() if path in self.children]
 
     @cache
     def __len__(self) -> int:
         """
         Calculate the size (in bytes)
         of the total files add up.
+        Sizes come from the scan, no file is stat-ed again.
         :return: total size of children in bytes
         """
-
-        def _size(abspath: str) -> int:
-            """
-            :param abspath: path to file or folder
-            :return: size in bytes
-            """
-            try:
-                return os.path.getsize(abspath)
-            except FileNotFoundError:
-                logger.warn(f'Error while reading {abspath}! Could be a broken link (shortcut). Skipping...')
-            except Exception as e:
-                logger.warn(f'Error while calculating size of {abspath}! Skipping...')
-                logger.exception(e)
-
-            return 0
-
-        def _dir_size(abspath: str) -> int:
-            """
-            Calculate directory's size by adding each file
-            inside the folder (including files inside sub-folder).
-            :param abspath: path to folder
-            :return: size in bytes
-            """
-            total: int = 0
-            for root, dirs, names in os.walk(abspath):
-                for name in names:
-                    filepath = os.path.join(root, name)
-                    total += _size(filepath)
-
-            return total
-
-        size: int = 0
-        for file in self.children:
-            if os.path.isfile(file):
-                size += _size(file)
-            elif os.path.isdir(file):
-                size += _dir_size(file)
-
-        return size
+        return sum(entry.size for entry in self.entries())
 
     def __str__(self) -> str:
-        return f'BackupProfile(name={self.filename}, size={len(self)})'
+        return f'BackupProfile(name={self.filename}, kind={self.kind}, size={len(self)})'
 
 
 class Backup:
@@ -227,16 +213,37 @@ class Backup:
         return size
 
 
-def del_old_backups(backups: list, days: int) -> None:
-    logger.info(f'Deleting old backups that were created {days} day(s) ago...')
-    if len(backups) == 0:
-        logger.info('No old backup found! Skipping this step...')
-
-    try:
-        for file in backups:
-            basename: str = dir.basename(file)
-            if today - parse_date(basename) > timedelta(days=days):
-                dir.delete(file)
-    except Exception as e:
-        logger.error(f'Error occurs while deleting old backups!')
-        logger.exception(e)
+def chains(backups: list) -> list:
+    """
+    Group backups into chains. A chain starts with a full
+    backup, followed by incremental backups built on top of it.
+    Backups without manifest are full backups on their own.
+    :param backups: paths to backups
+    :return: list of chains (list of paths), oldest first
+    """
+    result: list = []
+    by_name: dict = {}
+
+    for path in sorted(backups, key=lambda x: parse_date(dir.basename(x))):
+        manifest: Optional[Manifest] = Manifest.load(path, header_only=True)
+
+        if manifest is not None and manifest.kind == INCREMENTAL and manifest.base in by_name:
+            chain: list = by_name[manifest.base]
+            chain.append(path)
+        else:
+            chain: list = [path]
+            result.append(chain)
+
+        by_name[dir.basename(path)] = chain
+
+    return result
+
+
+def delete_backup(path: str) -> None:
+    """
+    Delete a backup along with its manifest
+    :param path: to backup
+    """
+    dir.delete(path)
+    if os.path.exists(manifest_path(path)):
+        dir.delete(manifest_path(path))
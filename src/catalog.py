@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import os
+from platform import node
+from typing import ContextManager, Iterable, Optional
+
+from src import dir, logger
+from src.manifest import FULL, INCREMENTAL, Manifest, path_of as manifest_path
+from src.parser import parse_date
+
+" Kept in the destination, next to the backups it describes "
+FILENAME: str = 'catalog.jsonl'
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _found(path: str) -> dict:
+    """
+    :param path: backup the catalog doesn't know about
+    :return: its record, kind and base taken from its manifest
+    """
+    manifest: Optional[Manifest] = Manifest.load(path, header_only=True)
+    if manifest is None:
+        return record_of(path)
+    return record_of(path, manifest.kind, manifest.base)
+
+
+def record_of(archive: str, kind: str = FULL, base: str = '', **info) -> dict:
+    """
+    :param archive: path to a backup that was just made
+    :param kind: FULL or INCREMENTAL
+    :param base: name of the backup 'archive' builds upon
+    :param info: anything else worth remembering (source_size, files, duration...)
+    :return: what the catalog stores about 'archive'
+    """
+    size: int = _size(archive) + _size(manifest_path(archive))
+    record: dict = {'name': dir.basename(archive), 'kind': kind, 'base': base, 'size': size, 'host': node()}
+    record.update(info)
+    if record.get('source_size'):
+        record['ratio'] = round(_size(archive) / record['source_size'], 4)
+    return record
+
+
+class Catalog:
+    """
+    What is known about every backup of a destination,
+    so nothing has to be listed, stat-ed or parsed again.
+
+    Stored as JSON lines: a record per backup, appended once
+    it's made, and '{"name": ..., "deleted": true}' once it's
+    deleted. Later lines win. Appending is a single write
+    followed by fsync, a line cut by a crash is skipped.
+
+    Several processes may share a destination: writes hold
+    a lock on 'catalog.jsonl.lock', and compaction merges
+    what others wrote since the file was read.
+
+    Destination is only listed again when its folder
+    changed since the catalog was written (see '_changed').
+    """
+
+    def __init__(self, destination: str, records: Optional[dict] = None) -> None:
+        """
+        :param destination: directory holding backups and the catalog
+        :param records: name -> record, oldest first
+        """
+        self.destination: str = destination
+        self.path: str = os.path.join(destination, FILENAME)
+        self.records: dict = {} if records is None else records
+        " Lines of the file that no longer describe a backup "
+        self._stale: int = 0
+        " Backups this instance forgot, never brought back by a merge "
+        self._removed: set = set()
+        " Modification time of the destination when it was last listed "
+        self._listed: int = 0
+
+    @classmethod
+    def load(cls, destination: str) -> Catalog:
+        """
+        :param destination: directory holding backups
+        :return: catalog read from its file, or built from
+                 backups found in 'destination' if there's none yet
+        """
+        if not os.path.isfile(os.path.join(destination, FILENAME)):
+            return cls.rebuild(destination)
+
+        result = cls(destination)
+        result.records, _, result._stale = result._read()
+        if result._changed():
+            result._reconcile()
+        logger.debug(f'Catalog of {destination}: {len(result.records)} backup(s)')
+        return result
+
+    @classmethod
+    def rebuild(cls, destination: str) -> Catalog:
+        """
+        Describe backups found in 'destination' (made before
+        the catalog existed). Nothing is written until the
+        catalog changes.
+        """
+        result = cls(destination)
+        result._reconcile()
+        logger.debug(f'No catalog in {destination}, found {len(result.records)} backup(s)')
+        return result
+
+    def _read(self) -> tuple:
+        """
+        :return: records in the file (oldest first), names
+                 of deleted backups and number of stale lines
+        """
+        records: dict = {}
+        deleted: set = set()
+        stale: int = 0
+        with open(self.path, 'r') as file:
+            for line in file:
+                try:
+                    record: dict = json.loads(line)
+                    name: str = record['name']
+                except (ValueError, KeyError):
+                    logger.warn(f'Skipping damaged line of {self.path}')
+                    continue
+
+                if name in records:
+                    stale += 1
+                    del records[name]
+                if record.get('deleted'):
+                    stale += 1
+                    deleted.add(name)
+                else:
+                    deleted.discard(name)
+                    records[name] = record
+
+        return dict(sorted(records.items(), key=lambda x: parse_date(x[0]))), deleted, stale
+
+    def _changed(self) -> bool:
+        """
+        Adding, deleting or renaming a file changes the modification
+        time of its folder. Every write of the catalog lists the
+        destination first if it changed (see '_append'), so a catalog
+        written after the last change knows every backup.
+
+        :return: whether backups may have been added or deleted behind catalog's back
+        """
+        try:
+            changed: int = os.stat(self.destination).st_mtime_ns
+            written: int = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return True
+        " Same time may be the same clock tick, both could have happened in any order "
+        return changed >= written and changed != self._listed
+
+    def _reconcile(self) -> bool:
+        """
+        Match records with backups really in the destination:
+        ones copied in or left by a crash are added, deleted
+        ones are dropped. Written with the next change.
+
+        :return: whether any record was added or dropped
+        """
+        self._listed = os.stat(self.destination).st_mtime_ns
+        found: dict = {dir.basename(path): path for path in dir.scan_4_backup(self.destination)}
+
+        gone: list = [name for name in self.records if name not in found]
+        for name in gone:
+            logger.debug(f'{name} is in catalog, but not in {self.destination}')
+            del self.records[name]
+        self._removed.update(gone)
+        self._stale += len(gone)
+
+        unknown: list = [name for name in found if name not in self.records]
+        for name in unknown:
+            self.records[name] = _found(found[name])
+        if unknown:
+            self._stale += 1
+            self.records = dict(sorted(self.records.items(), key=lambda x: parse_date(x[0])))
+
+        return bool(gone or unknown)
+
+    def paths(self) -> list:
+        """
+        :return: paths to every backup, oldest first
+        """
+        return [os.path.join(self.destination, name) for name in self.records]
+
+    def latest(self, key: str) -> Optional[dict]:
+        """
+        :return: most recent record that has 'key', None if there's none
+        """
+        for record in reversed(self.records.values()):
+            if record.get(key) is not None:
+                return record
+        return None
+
+    def chains(self, names: Optional[Iterable] = None) -> list:
+        """
+        Same as 'backup.chains' but from records, no manifest is read.
+
+        :param names: only these backups, all of them if None
+        :return: list of chains (list of paths), oldest first
+        """
+        selected: set = set(self.records if names is None else names)
+        result: list = []
+        by_name: dict = {}
+
+        for name, record in self.records.items():
+            if name not in selected:
+                continue
+
+            path: str = os.path.join(self.destination, name)
+            if record.get('kind') == INCREMENTAL and record.get('base') in by_name:
+                chain: list = by_name[record['base']]
+                chain.append(path)
+            else:
+                chain: list = [path]
+                result.append(chain)
+
+            by_name[name] = chain
+
+        return result
+
+    def _lock(self) -> ContextManager[None]:
+        """
+        Hold the lock of this catalog, other processes wait.
+        A file of its own, the catalog itself is replaced by 'compact'.
+        """
+        return dir.locked(f'{self.path}.lock')
+
+    def _append(self, records: list) -> None:
+        with self._lock():
+            if not os.path.isfile(self.path) or (self._changed() and self._reconcile()):
+                " First change, or backups came or went: write everything known, not just 'records' "
+                self._compact()
+                return
+
+            data: bytes = ''.join(json.dumps(record) + '\n' for record in records).encode()
+            fd: int = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def add(self, record: dict) -> None:
+        """
+        Remember a backup that was just made
+        """
+        if record['name'] in self.records:
+            self._stale += 1
+        self.records[record['name']] = record
+        self._removed.discard(record['name'])
+        self._append([record])
+        logger.debug(f'Added {record["name"]} to catalog')
+
+    def remove(self, paths: list) -> None:
+        """
+        Forget deleted backups
+
+        :param paths: paths to (or names of) backups
+        """
+        names: list = [name for name in map(dir.basename, paths) if name in self.records]
+        if not names:
+            return
+
+        for name in names:
+            del self.records[name]
+        self._removed.update(names)
+        self._stale += 2 * len(names)
+
+        if self._stale > len(self.records):
+            self.compact()
+        else:
+            self._append([{'name': name, 'deleted': True} for name in names])
+
+    def compact(self) -> None:
+        """
+        Rewrite the file with a line per backup. Written
+        aside then renamed over, it's never half written.
+        """
+        with self._lock():
+            self._compact()
+
+    def _compact(self) -> None:
+        " Lock is held. Others may have added or deleted backups since the file was read "
+        if os.path.isfile(self.path):
+            records, deleted, _ = self._read()
+            merged: dict = {name: record for name, record in self.records.items() if name not in deleted}
+            merged.update(records)
+            self.records = {name: record for name, record in sorted(merged.items(), key=lambda x: parse_date(x[0]))
+                            if name not in self._removed}
+
+        temp: str = f'{self.path}.tmp'
+        with open(temp, 'w') as file:
+            for record in self.records.values():
+                file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp, self.path)
+        " Replacing it changed the destination, the catalog still knows every backup "
+        os.utime(self.path)
+        self._stale = 0
+        logger.debug(f'Catalog of {self.destination} rewritten: {len(self.records)} backup(s)')
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from glob import escape, glob
+from typing import Iterator, NamedTuple, Optional
+
+from src import dir, logger
+from src.frames import Frame, FrameWriter
+from src.scanner import FileEntry
+
+" Archive being written is '.NAME.partial', its checkpoints '.NAME.checkpoint' "
+PARTIAL: str = '.partial'
+EXTENSION: str = '.checkpoint'
+
+
+class State(NamedTuple):
+    """
+    Where an interrupted backup can carry on from
+    """
+    " Name of the archive "
+    filename: str
+    " Entries fully written "
+    done: int
+    " Compressed bytes kept, every frame up to here is complete "
+    size: int
+    " Bytes of tarball kept "
+    data: int
+    frames: list
+    members: dict
+    digests: dict
+    " Hash of entries written, see '_prefix' "
+    prefix: str
+
+
+def partial_of(archive: str) -> str:
+    """
+    :return: path 'archive' is written to until it's finished
+    """
+    return os.path.join(os.path.dirname(archive), f'.{dir.basename(archive)}{PARTIAL}')
+
+
+def log_of(archive: str) -> str:
+    """
+    :return: path to checkpoints of 'archive'
+    """
+    return os.path.join(os.path.dirname(archive), f'.{dir.basename(archive)}{EXTENSION}')
+
+
+def _key(entry: FileEntry) -> bytes:
+    return f'{entry.path}\0{entry.size}\0{entry.mtime}\0{entry.mode}\n'.encode('utf-8', 'surrogateescape')
+
+
+def _prefix(entries: list) -> str:
+    """
+    :return: hash of what is known about 'entries', in order
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for entry in entries:
+        digest.update(_key(entry))
+    return digest.hexdigest()
+
+
+def discard(archive: str) -> None:
+    """
+    Delete partial archive of 'archive', its shards and its checkpoints
+    """
+    partial: str = partial_of(archive)
+    for path in [partial, log_of(archive)] + glob(f'{escape(partial)}.*.tmp'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def start(archive: str, header: dict) -> None:
+    """
+    Begin checkpoints of 'archive', they only apply to
+    a backup made with the same 'header'. Written before
+    the archive, even without checkpoints, so leftovers
+    of a crash tell which backup they belong to.
+    """
+    with open(log_of(archive), 'w') as log:
+        log.write(json.dumps(header) + '\n')
+
+
+@contextmanager
+def hold(archive: str) -> Iterator[None]:
+    """
+    Lock checkpoints of 'archive' while it's being written,
+    'resume' of other backups leaves it alone (see 'start').
+    """
+    fd: int = os.open(log_of(archive), os.O_RDWR)
+    try:
+        dir.lock(fd)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _running(log: str) -> bool:
+    """
+    :return: whether another process is writing the archive of 'log' (see 'hold')
+    """
+    try:
+        fd: int = os.open(log, os.O_RDWR)
+    except OSError:
+        " Finished meanwhile "
+        return True
+
+    try:
+        if not dir.lock(fd, wait=False):
+            return True
+        dir.unlock(fd)
+        return False
+    finally:
+        os.close(fd)
+
+
+def _owner(log: str) -> Optional[list]:
+    """
+    :return: include roots of the backup that wrote 'log', None if unknown
+    """
+    try:
+        with open(log, 'r') as file:
+            return json.loads(file.readline()).get('roots')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _load(log: str, header: dict) -> Optional[State]:
+    """
+    :return: last complete checkpoint of 'log', None if there's
+             none or it was written with another 'header'
+    """
+    lines: list = []
+    with open(log, 'r') as file:
+        for line in file:
+            try:
+                lines.append(json.loads(line))
+            except ValueError:
+                " Cut by the interruption, previous ones are still good "
+                break
+
+    if len(lines) < 2 or lines[0] != header:
+        return None
+
+    frames: list = []
+    members: dict = {}
+    digests: dict = {}
+    for line in lines[1:]:
+        frames.extend(Frame(*frame) for frame in line['frames'])
+        members.update(line['members'])
+        digests.update(line['digests'])
+
+    last: dict = lines[-1]
+    filename: str = dir.basename(log)[1:-len(EXTENSION)]
+    return State(filename, last['done'], last['size'], last['data'], frames, members, digests, last['prefix'])
+
+
+def resume(destination: str, entries: list, header: dict) -> Optional[State]:
+    """
+    Find a backup of 'destination' that was interrupted and
+    can be finished: same 'header' and every entry it wrote
+    is still the same. Other leftovers of the same sources
+    are deleted. Leftovers of other sources, and archives
+    still being written, are left alone: a destination
+    may be shared by several backups.
+
+    :param destination: directory of backups
+    :param entries: list of FileEntry to back up, in order
+    :param header: settings the archive depends on (dictionary...), 'roots' tells whose it is
+    :return: state to carry on from, None to start over
+    """
+    found: Optional[State] = None
+    pattern: str = os.path.join(escape(destination), '.*')
+
+    for log in sorted(glob(pattern + EXTENSION)):
+        archive: str = os.path.join(destination, dir.basename(log)[1:-len(EXTENSION)])
+        if _owner(log) != header['roots'] or _running(log):
+            logger.debug(f'Leaving unfinished {dir.basename(archive)}, it belongs to another backup')
+            continue
+
+        try:
+            state: Optional[State] = _load(log, header)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f'Unreadable checkpoints {log}: {e}')
+            state = None
+
+        if state is not None and found is None:
+            partial: str = partial_of(archive)
+            if state.done <= len(entries) and _prefix(entries[:state.done]) == state.prefix \
+                    and os.path.isfile(partial) and os.path.getsize(partial) >= state.size:
+                found = state
+                continue
+
+        logger.info(f'Deleting unfinished {dir.basename(archive)}, it can\'t be resumed')
+        discard(archive)
+
+    if found is not None:
+        logger.info(f'Resuming {found.filename}: {found.done} file(s) written already')
+    return found
+
+
+class Checkpointer:
+    """
+    Called after each entry is written. Once 'interval' bytes
+    of files went in since the last checkpoint, current frame
+    is ended, the archive is flushed to disk and a line saying
+    how far it got is appended to its checkpoints.
+    """
+
+    def __init__(self, archive: str, file, writer: FrameWriter, members: dict, interval: int,
+                 state: Optional[State] = None, entries: Optional[list] = None) -> None:
+        """
+        :param archive: path to the finished archive
+        :param file: binary file the partial archive is written into
+        :param writer: FrameWriter writing into 'file'
+        :param members: index of members, filled while writing
+        :param interval: bytes of files between two checkpoints (see 'start')
+        :param state: if resuming, where it carries on from
+        :param entries: if resuming, every entry to back up
+        """
+        self.path: str = log_of(archive)
+        self._file = file
+        self._writer: FrameWriter = writer
+        self._members: dict = members
+        self.interval: int = interval
+
+        self._hash = hashlib.blake2b(digest_size=16)
+        self.done: int = 0
+        self.saved: bool = False
+        self._since: int = 0
+        self._frames: int = len(writer.frames)
+        self._new_members: dict = {}
+        self._digests: dict = {}
+
+        if state is not None:
+            for entry in entries[:state.done]:
+                self._hash.update(_key(entry))
+            self.done = state.done
+            self.saved = True
+
+    def __call__(self, entry: FileEntry, name: Optional[str], digest: Optional[str]) -> None:
+        """
+        :param entry: entry that was just written
+        :param name: its member in the tarball, None if it was skipped
+        :param digest: hash of its content, if computed
+        """
+        self.done += 1
+        self._hash.update(_key(entry))
+        if name is not None and name in self._members:
+            self._new_members[name] = self._members[name]
+        if digest is not None:
+            self._digests[entry.path] = digest
+
+        self._since += entry.size
+        if self._since >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Make everything written so far durable and remember it
+        """
+        self._writer.end_frame()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        frames: list = self._writer.frames
+        line: dict = {
+            'done': self.done,
+            'prefix': self._hash.hexdigest(),
+            'size': frames[-1].offset + frames[-1].size if frames else 0,
+            'data': self._writer.tell(),
+            'frames': [list(frame) for frame in frames[self._frames:]],
+            'members': self._new_members,
+            'digests': self._digests
+        }
+
+        fd: int = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, (json.dumps(line) + '\n').encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        logger.debug(f'Checkpoint: {self.done} file(s), {line["size"]} bytes')
+        self.saved = True
+        self._since = 0
+        self._frames = len(frames)
+        self._new_members = {}
+        self._digests = {}
@@ -0,0 +1,505 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import ContextManager, Iterator, Optional
+
+import zstandard as zstd
+
+from src import dictionary, dir, logger
+from src.archive import sparse_regions
+from src.backup import BackupProfile
+from src.catalog import record_of
+from src.compress import hard_links
+from src.config import Configuration
+from src.parser import parse_date
+from src.scanner import FileEntry
+
+" Snapshots are named like archives, 'YYYY-Mon-DD HH-MM-ffffff.snapshot' "
+EXTENSION: str = '.snapshot'
+
+MIN_CHUNK: int = 256 * 1024
+AVG_CHUNK: int = 1024 * 1024
+MAX_CHUNK: int = 4 * 1024 * 1024
+
+" A pack is closed once it grows past this size "
+PACK_SIZE: int = 64 * 1024 * 1024
+
+" Every byte value maps to 8 random bits (fixed forever), bit k is used k bytes later "
+_GEAR: bytes = hashlib.shake_256(b'zstd-backup').digest(256)
+" Lowest bit of every mixed byte maps to b'0' or b'1' "
+_BITS: bytes = bytes(ord('0') + (i & 1) for i in range(256))
+" Boundary is where bits of the last bytes spell out this marker "
+_MARKER: bytes = format(int.from_bytes(hashlib.blake2b(b'zstd-backup', digest_size=8).digest(), 'big'), '064b').encode()
+
+
+def _bits(data: bytes, before: bytes = b'') -> bytes:
+    """
+    Rolling hash of 'data', 1 bit per byte: bit i is the XOR
+    of bit k of '_GEAR' of byte i - k, for k from 0 to 7.
+    Shifting the whole tape by 9 bits moves bit 1 of a byte
+    to bit 0 of the next one, and so on. Done on whole
+    integers, so it runs in C.
+
+    :param before: bytes right before 'data' (up to 7), if any
+    :return: b'0' or b'1' for every byte of 'data'
+    """
+    data = before + data
+    tape: int = int.from_bytes(data.translate(_GEAR), 'big')
+    mixed: int = 0
+    for k in range(8):
+        mixed ^= tape >> (9 * k)
+    return mixed.to_bytes(len(data), 'big')[len(before):].translate(_BITS)
+
+
+def _cut(bits: bytes, min_size: int, avg_size: int, max_size: int) -> int:
+    """
+    Find where the first chunk ends.
+
+    Each byte is mixed with the 7 before it and turned into
+    1 bit (see '_bits'), a boundary is placed right after the bits
+    of the last bytes match a fixed marker. So a boundary only
+    depends on the bytes just before it, never on its offset,
+    and edits only move boundaries around them. Mixing keeps
+    data made of few byte values (text, for instance) as likely
+    to match as any other.
+
+    Before 'avg_size' a longer marker (rarer match) is used,
+    after it a shorter one, which keeps chunks close to 'avg_size'
+    (normalized chunking, as in FastCDC).
+
+    Data repeating with a short period (zeros, mostly) never
+    matches, it's cut every 'max_size' bytes. Those chunks are
+    identical, so they're still stored once.
+
+    :param bits: '_bits' of upcoming data
+    :return: length of the first chunk
+    """
+    length: int = len(bits)
+    if length <= min_size:
+        return length
+
+    width: int = avg_size.bit_length() - 1
+    strict, loose = _MARKER[:width + 1], _MARKER[:width - 1]
+    end: int = min(length, max_size)
+    middle: int = min(avg_size, end)
+
+    found: int = bits.find(strict, min_size - len(strict), middle)
+    if found != -1:
+        return found + len(strict)
+
+    found = bits.find(loose, middle - len(loose), end)
+    if found != -1:
+        return found + len(loose)
+
+    return end
+
+
+def chunks(file, min_size: int = MIN_CHUNK, avg_size: int = AVG_CHUNK, max_size: int = MAX_CHUNK,
+           size: int = -1) -> Iterator[bytes]:
+    """
+    Split content of 'file' into content-defined chunks.
+    Inserting or removing bytes only changes the chunks
+    around the edit, the rest stay identical.
+
+    :param file: readable binary file
+    :param size: bytes to read from current position, -1 reads to the end
+    :return: chunks, at most 'max_size' bytes each
+    """
+    buffer: bytes = b''
+    bits: bytes = b''
+    eof: bool = size == 0
+
+    while True:
+        if not eof and len(buffer) < max_size:
+            data: bytes = file.read(max_size if size < 0 else min(max_size, size))
+            if size > 0:
+                size -= len(data)
+            eof = not data or size == 0
+            bits += _bits(data, buffer[-7:])
+            buffer += data
+            continue
+
+        if not buffer:
+            return
+
+        cut: int = _cut(bits, min_size, avg_size, max_size)
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+        bits = bits[cut:]
+
+
+def chunk_id(chunk: bytes) -> str:
+    """
+    :return: content address of 'chunk'
+    """
+    return hashlib.blake2b(chunk, digest_size=32).hexdigest()
+
+
+class ChunkStore:
+    """
+    Content-addressed store of zstd compressed chunks.
+
+    Chunks are appended to pack files under 'chunks/packs'.
+    'chunks/index' has one JSON line per chunk: [id, pack, offset, length].
+    A chunk is only ever stored once, no matter how many
+    files or snapshots refer to it.
+
+    Several processes may share a store: picking a pack,
+    adding to the index and 'gc' hold a lock on 'chunks/lock'.
+    Each backup holds a file of 'chunks/writers' while it runs
+    (see 'writing'), 'gc' waits until no other backup does.
+    """
+
+    def __init__(self, destination: str, level: int = 3, dict_data: Optional[zstd.ZstdCompressionDict] = None) -> None:
+        """
+        :param destination: folder holding backups
+        :param level: compression level of new chunks
+        :param dict_data: dictionary new chunks are compressed with
+        """
+        self.destination: str = destination
+        self.root: str = os.path.join(destination, 'chunks')
+        self._packs: str = os.path.join(self.root, 'packs')
+        self._index_path: str = os.path.join(self.root, 'index')
+        self._writers: str = os.path.join(self.root, 'writers')
+        os.makedirs(self._packs, exist_ok=True)
+
+        self._cctx = zstd.ZstdCompressor(level=level, dict_data=dict_data)
+        " Chunks stored over time may use different dictionaries, one decompressor each "
+        self._dctx: dict = {}
+
+        self.index: dict = {}
+        self._new: list = []
+        self._pack = None
+        self._pack_name: str = ''
+        " File of 'chunks/writers' held by this instance "
+        self._writer: str = ''
+        self._load()
+
+    def _load(self) -> None:
+        self.index = {}
+        if not os.path.isfile(self._index_path):
+            return
+
+        with open(self._index_path, 'r') as file:
+            for line in file:
+                try:
+                    cid, pack, offset, length = json.loads(line)
+                    self.index[cid] = (pack, offset, length)
+                except ValueError:
+                    " Line cut by a crash, chunk will be stored again "
+                    logger.warn(f'Skipping damaged line in {self._index_path}')
+
+        logger.debug(f'Chunk store has {len(self.index)} chunk(s)')
+
+    def __contains__(self, cid: str) -> bool:
+        return cid in self.index
+
+    def put(self, chunk: bytes) -> str:
+        """
+        Compress and store 'chunk' unless an identical one is stored.
+        :return: id of 'chunk'
+        """
+        cid: str = chunk_id(chunk)
+        if cid in self.index:
+            return cid
+
+        if self._pack is None or self._pack.tell() >= PACK_SIZE:
+            self._next_pack()
+
+        data: bytes = self._cctx.compress(chunk)
+        offset: int = self._pack.tell()
+        self._pack.write(data)
+
+        self.index[cid] = (self._pack_name, offset, len(data))
+        self._new.append(cid)
+        return cid
+
+    def get(self, cid: str) -> bytes:
+        """
+        :return: original content of chunk 'cid'
+        """
+        pack, offset, length = self.index[cid]
+        with open(os.path.join(self._packs, pack), 'rb') as file:
+            file.seek(offset)
+            data: bytes = file.read(length)
+
+        dict_id: int = dictionary.dict_id_of(data)
+        if dict_id not in self._dctx:
+            dict_data = dictionary.find(self.destination, dict_id) if dict_id else None
+            self._dctx[dict_id] = zstd.ZstdDecompressor(dict_data=dict_data)
+        return self._dctx[dict_id].decompress(data)
+
+    def _lock(self) -> ContextManager[None]:
+        return dir.locked(os.path.join(self.root, 'lock'))
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        """
+        Tell other processes a backup is using this store.
+        It may reuse chunks no snapshot refers to yet, so
+        their 'gc' deletes nothing meanwhile. Index is read
+        again, 'gc' may have changed it since it was loaded.
+        """
+        with self._lock():
+            os.makedirs(self._writers, exist_ok=True)
+            fd, self._writer = tempfile.mkstemp(dir=self._writers)
+            dir.lock(fd)
+            self._load()
+
+        try:
+            yield
+        finally:
+            os.close(fd)
+            " May be gone already, see '_busy' "
+            if os.path.exists(self._writer):
+                os.remove(self._writer)
+            self._writer = ''
+
+    def _busy(self) -> bool:
+        """
+        Lock is held. Files of backups that died are deleted.
+
+        :return: whether another backup is using this store (see 'writing')
+        """
+        if not os.path.isdir(self._writers):
+            return False
+
+        busy: bool = False
+        for name in os.listdir(self._writers):
+            path: str = os.path.join(self._writers, name)
+            if path == self._writer:
+                continue
+
+            try:
+                fd: int = os.open(path, os.O_RDWR)
+            except OSError:
+                " Finished meanwhile "
+                continue
+            try:
+                alive: bool = not dir.lock(fd, wait=False)
+            finally:
+                os.close(fd)
+
+            if alive:
+                busy = True
+            elif os.path.exists(path):
+                os.remove(path)
+
+        return busy
+
+    def _next_pack(self) -> None:
+        self._close_pack()
+
+        " Another process may be picking a pack too "
+        with self._lock():
+            number: int = 0
+            while os.path.exists(os.path.join(self._packs, f'{number:08d}.pack')):
+                number += 1
+
+            self._pack_name = f'{number:08d}.pack'
+            self._pack = open(os.path.join(self._packs, self._pack_name), 'ab')
+
+    def _close_pack(self) -> None:
+        if self._pack is not None:
+            self._pack.flush()
+            os.fsync(self._pack.fileno())
+            self._pack.close()
+            self._pack = None
+
+    def flush(self) -> None:
+        """
+        Make new chunks durable, then add them to the index.
+        Chunks are on disk before the index points at them.
+        """
+        self._close_pack()
+
+        with self._lock(), open(self._index_path, 'a') as file:
+            for cid in self._new:
+                file.write(json.dumps([cid, *self.index[cid]]) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+        logger.debug(f'Stored {len(self._new)} new chunk(s)')
+        self._new = []
+
+    def gc(self, referenced: set) -> None:
+        """
+        Delete packs that no snapshot refers to anymore
+        and drop their chunks from the index. Packs left by
+        an interrupted backup, never added to the index, go too.
+        Packs with at least 1 referenced chunk are kept as they are.
+        Nothing is deleted while another backup uses the store.
+
+        :param referenced: ids of chunks used by remaining snapshots
+        """
+        with self._lock():
+            if self._busy():
+                logger.info('Chunk store is used by another backup, unused packs are deleted next time')
+                return
+
+            " Others may have added chunks since it was loaded "
+            self._load()
+            used: set = {self.index[cid][0] for cid in referenced if cid in self.index}
+            unused: set = {name for name in os.listdir(self._packs) if name.endswith('.pack')} - used
+            if not unused:
+                return
+
+            kept: dict = {cid: loc for cid, loc in self.index.items() if loc[0] not in unused}
+            if len(kept) < len(self.index):
+                self.index = kept
+                temp: str = f'{self._index_path}.tmp'
+                with open(temp, 'w') as file:
+                    for cid, loc in self.index.items():
+                        file.write(json.dumps([cid, *loc]) + '\n')
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp, self._index_path)
+
+            for pack in unused:
+                dir.delete(os.path.join(self._packs, pack))
+
+
+def save_snapshot(filepath: str, files: list) -> None:
+    """
+    :param filepath: where to save snapshot
+    :param files: list of [path, size, mtime, mode, inode, link, chunk ids, hard link]
+    """
+    " Hidden temporary name, never mistaken for a finished snapshot "
+    temp: str = os.path.join(os.path.dirname(filepath), f'.{dir.basename(filepath)}.tmp')
+    with open(temp, 'wb') as file:
+        file.write(zstd.ZstdCompressor().compress(json.dumps(files).encode('utf-8')))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, filepath)
+
+
+def load_snapshot(filepath: str) -> list:
+    """
+    Chunk ids of a file also hold the length of each hole (int)
+    of a sparse file, in order. Hard link is the path of a file
+    listed earlier that has the same inode, '' for any other file.
+
+    :return: list of [path, size, mtime, mode, inode, link, chunk ids, hard link]
+    """
+    with open(filepath, 'rb') as file:
+        files: list = json.loads(zstd.ZstdDecompressor().stream_reader(file).read())
+
+    " Snapshots made before hard links were recorded "
+    for item in files:
+        if len(item) < 8:
+            item.append('')
+    return files
+
+
+def chunk_ids(item: list) -> list:
+    """
+    :param item: file listed in a snapshot
+    :return: ids of its chunks, holes left out
+    """
+    return [cid for cid in item[6] if isinstance(cid, str)]
+
+
+def _put_file(store: ChunkStore, file, entry: FileEntry) -> list:
+    """
+    Store content of 'file'. Holes of a sparse file are
+    neither read nor stored, only their length is kept.
+
+    :return: chunk ids and lengths of holes, in order
+    """
+    regions: Optional[list] = sparse_regions(file, entry.size, None) if entry.sparse else None
+    if regions is None:
+        return [store.put(chunk) for chunk in chunks(file)]
+
+    ids: list = []
+    position: int = 0
+    for offset, length in regions:
+        if offset > position:
+            ids.append(offset - position)
+        file.seek(offset)
+        ids.extend(store.put(chunk) for chunk in chunks(file, size=length))
+        position = offset + length
+    return ids
+
+
+def snapshots(destination: str) -> list:
+    """
+    :return: paths to snapshots in 'destination', oldest first
+    """
+    found: list = [path for path in dir.scan_4_backup(destination) if path.endswith(EXTENSION)]
+    return sorted(found, key=lambda x: parse_date(dir.basename(x)))
+
+
+def chunk_backup(profile: BackupProfile, config: Configuration) -> None:
+    """
+    Back up every file of 'profile' into the chunk store in its
+    destination. Only chunks the store hasn't seen are written,
+    the backup itself is a snapshot listing chunk ids of each file.
+
+    Files whose size, mtime and inode match the previous
+    snapshot reuse its chunk ids without being read. Other
+    paths to a file listed already (hard links) aren't read
+    either, they're restored as links to it.
+    """
+    store = ChunkStore(profile.destination, config.zstd_arguments.level, dictionary.prepare(profile, config))
+    with store.writing():
+        previous: dict = {}
+        existing: list = snapshots(profile.destination)
+        if existing:
+            previous = {item[0]: item for item in load_snapshot(existing[-1])}
+
+        links: dict = hard_links(list(profile.manifest.values()))
+        " Path -> chunk ids of every file listed so far "
+        written: dict = {}
+
+        files: list = []
+        for path, entry in profile.manifest.items():
+            target: Optional[str] = links.get(path)
+            if target in written:
+                files.append([path, entry.size, entry.mtime, entry.mode, entry.inode, '', written[target], target])
+                continue
+
+            known: Optional[list] = previous.get(path)
+            if known is not None and known[1:5] == [entry.size, entry.mtime, entry.mode, entry.inode]:
+                files.append(known[:7] + [''])
+                written[path] = known[6]
+                continue
+
+            link: str = ''
+            ids: list = []
+            try:
+                if entry.isreg:
+                    with open(path, 'rb') as file:
+                        ids = _put_file(store, file, entry)
+                elif os.path.islink(path):
+                    link = os.readlink(path)
+                elif entry.isdir:
+                    " Empty folder, nothing but its name and mode "
+                    pass
+                else:
+                    logger.warn(f'{path} is not a regular file or link! Skipping...')
+                    continue
+            except OSError as e:
+                logger.warn(f'Error while reading {path}! Skipping...')
+                logger.exception(e)
+                continue
+
+            files.append([path, entry.size, entry.mtime, entry.mode, entry.inode, link, ids, ''])
+            written[path] = ids
+
+        store.flush()
+
+        snapshot: str = os.path.join(profile.destination, os.path.splitext(profile.filename)[0] + EXTENSION)
+        save_snapshot(snapshot, files)
+        logger.info(f'Saved snapshot of {len(files)} file(s) to {snapshot}')
+        profile.catalog.add(record_of(snapshot, files=len(files)))
+
+        " Drop packs only used by snapshots that retention deleted "
+        referenced: set = set()
+        for path in snapshots(profile.destination):
+            for item in load_snapshot(path):
+                referenced.update(chunk_ids(item))
+        store.gc(referenced)
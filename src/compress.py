@@ -1,75 +1,769 @@
+import hashlib
+import heapq
 import os
+import shutil
+import stat
 import tarfile
-from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import cache
+from time import perf_counter
+from typing import Callable, Optional
 
 import zstandard as zstd
 from tqdm import tqdm
 
+from src import autolevel, checkpoint, dictionary, dir, logger, space
+from src.catalog import Catalog, record_of
+from src.archive import TarWriter, sparse_map, sparse_regions
 from src.backup import BackupProfile
-from src.config import Configuration
+from src.config import Configuration, ZstdArguments
+from src.config.settings import ReadAhead, Settings
+from src.converter import size_converter
+from src.frames import MAX_FRAME_SIZE, Frame, FrameWriter, write_metadata, write_seek_table
+from src.manifest import Manifest, entry_info
+from src.order import order
+from src.policy import Policy
+from src.prefetch import Prefetcher
+from src.scanner import FileEntry
+from src.tuner import ChunkTuner
 
+try:
+    import grp
+    import pwd
+except ImportError:
+    grp = pwd = None
 
-def compress(children: set, writer: zstd.ZstdCompressionWriter, epb: bool, chunk_size: int, total_size: int = 0) -> None:
+
+" Bytes copied per cycle when progress bar is off "
+COPY_BUFSIZE: int = 1024 * 1024
+
+
+def new_digest():
+    """
+    :return: hash object used for files' content
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+@cache
+def _uname(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name if pwd else ''
+    except KeyError:
+        return ''
+
+
+@cache
+def _gname(gid: int) -> str:
+    try:
+        return grp.getgrgid(gid).gr_name if grp else ''
+    except KeyError:
+        return ''
+
+
+def arcname(path: str) -> str:
+    """
+    Same member name as 'tar.gettarinfo' (no drive, no leading slash)
+
+    :param path: absolute path of a file
+    :return: name of its member in the tarball
+    """
+    return os.path.splitdrive(path)[1].replace(os.sep, '/').lstrip('/')
+
+
+def tarinfo_of(entry: FileEntry) -> tarfile.TarInfo:
+    """
+    Build the header 'tar.add' would write for a regular
+    file, using metadata from the scan instead of another stat.
+
+    :param entry: regular file collected by the scanner
+    :return: TarInfo of this file
     """
-    Compress data of each files from children.
+    tarinfo = tarfile.TarInfo(arcname(entry.path))
+    tarinfo.size = entry.size
+    tarinfo.mtime = entry.mtime
+    tarinfo.mode = stat.S_IMODE(entry.mode)
+    tarinfo.uid = entry.uid
+    tarinfo.gid = entry.gid
+    tarinfo.uname = _uname(entry.uid)
+    tarinfo.gname = _gname(entry.gid)
+
+    return tarinfo
+
+
+def hard_links(entries: list) -> dict:
+    """
+    Find paths to a file met earlier in 'entries' (same device
+    and inode), they're stored as links to its first path.
+
+    :param entries: list of FileEntry, in the order they're written
+    :return: path -> path of the first entry sharing its inode
+    """
+    first: dict = {}
+    result: dict = {}
+    for entry in entries:
+        if not entry.isreg or entry.nlink < 2:
+            continue
+
+        key: tuple = (entry.dev, entry.inode)
+        if key in first:
+            result[entry.path] = first[key]
+        else:
+            first[key] = entry.path
+
+    return result
+
+
+def compression_params(arguments: ZstdArguments, level: Optional[int] = None,
+                       threads: Optional[int] = None) -> zstd.ZstdCompressionParameters:
+    """
+    :param arguments: 'arguments' section of config
+    :param level: compression level, 'arguments.level' if None
+    :param threads: compression threads, 'arguments.threads' if None
+    :return: parameters of a compressor, unset (0) ones are picked by zstd from the level
+    """
+    return zstd.ZstdCompressionParameters(
+        compression_level=arguments.level if level is None else level,
+        threads=arguments.threads if threads is None else threads,
+        write_checksum=arguments.checksum,
+        # Same as ZstdCompressor's defaults, restore finds dictionaries by id
+        write_content_size=True,
+        write_dict_id=True,
+        window_log=arguments.window_log,
+        enable_ldm=arguments.long_distance_matching,
+        ldm_hash_log=arguments.ldm_hash_log,
+        strategy=arguments.strategy,
+        job_size=arguments.job_size,
+        overlap_log=arguments.overlap_log
+    )
+
+
+def new_compressor(arguments: ZstdArguments, level: Optional[int] = None, threads: Optional[int] = None,
+                   dict_data: Optional[zstd.ZstdCompressionDict] = None) -> zstd.ZstdCompressor:
+    """
+    :return: compressor built from 'arguments' (see 'compression_params')
+    """
+    return zstd.ZstdCompressor(compression_params=compression_params(arguments, level, threads), dict_data=dict_data)
+
+
+def memory_estimate(arguments: ZstdArguments, level: Optional[int] = None) -> tuple:
+    """
+    :param level: compression level, 'arguments.level' if None
+    :return: bytes needed to compress (per thread) and to decompress
+    """
+    level = arguments.level if level is None else level
+    window_log: int = arguments.window_log or zstd.ZstdCompressionParameters.from_level(level).window_log
+    params = compression_params(arguments, level, 0)
+
+    if arguments.long_distance_matching:
+        " zstd can't estimate LDM with its settings left to 0, use its defaults "
+        hash_log: int = arguments.ldm_hash_log or max(6, window_log - 7)
+        params = zstd.ZstdCompressionParameters(
+            compression_level=level,
+            window_log=window_log,
+            strategy=arguments.strategy,
+            enable_ldm=True,
+            ldm_hash_log=hash_log,
+            ldm_min_match=64,
+            ldm_bucket_size_log=3,
+            ldm_hash_rate_log=window_log - hash_log
+        )
+
+    return params.estimated_compression_context_size(), 1 << window_log
+
+
+def chunk_tuner(settings: Settings) -> Optional[ChunkTuner]:
+    """
+    :return: a tuner if 'settings.write_chunk' is auto, None otherwise
+    """
+    if settings.write_chunk:
+        return None
+    return ChunkTuner(*settings.write_chunk_limits)
+
+
+def compress(
+        entries: list,
+        writer: zstd.ZstdCompressionWriter,
+        epb: bool,
+        chunk_size: int,
+        total_size: int = 0,
+        *,
+        checksum: bool = False,
+        members: dict = None,
+        end: bool = True,
+        read_ahead: ReadAhead = None,
+        io_strategy: str = 'read',
+        io_threshold: int = 0,
+        tuner: ChunkTuner = None,
+        policy: Policy = None,
+        offset: int = 0,
+        done: Callable = None,
+        links: dict = None
+) -> dict:
+    """
+    Compress data of each files from entries.
     To enable progress bar, set 'epb' to True.
 
-    :param children: set of file paths to write
+    :param entries: list of FileEntry to write
     :param writer: Stream to be written data into
     :param epb: Show progress bar (beta)
     :param chunk_size: How many bytes to write per cycle
     :param total_size: Total size for progress bar
-    :return:
+    :param checksum: Hash content of each file while writing
+    :param members: if given, filled with arcname -> [start, end] of each member in the tarball
+    :param end: write tar's end-of-archive marker, without it another tarball can follow
+    :param read_ahead: if enabled, files are read by other threads ahead of the compressor
+    :param io_strategy: how files of at least 'io_threshold' bytes are read (see 'read_chunks')
+    :param io_threshold: smaller files are simply read
+    :param tuner: if given, picks bytes per cycle in place of 'chunk_size'
+    :param policy: if given, picks compressor of each file ('writer' must be a FrameWriter)
+    :param offset: bytes of tarball already written, when carrying on an earlier one
+    :param done: if given, called after each entry with it, its member name (None if skipped) and its digest
+    :param links: if given, filled with arcname -> arcname of the member each hard link points to
+    :return: path -> hex digest of every regular file if 'checksum' is True
     """
+    digests: dict = {}
+    bufsize: int = chunk_size if epb else COPY_BUFSIZE
+    if tuner is not None:
+        bufsize = tuner.candidates[-1]
+    " Reused by 'readinto' strategy "
+    buffer = bytearray(bufsize) if io_strategy != 'read' else None
+    " Time between chunks covers reading one and compressing the previous one "
+    last: list = [perf_counter()]
 
     " Use TAR to store multiple files while keeping their absolute paths "
-    tar: tarfile.TarFile = tarfile.open(fileobj=writer, mode='w|', format=tarfile.PAX_FORMAT)
-
-    if epb:
-        " Init progress bar "
-        progress_bar: tqdm = tqdm(total=total_size, desc="Compressing", unit='iB', unit_scale=True)
-
-        for filepath in children:
-            file = open(filepath, 'rb')
-            while True:
-                """
-                For each loop, read a portion of the file.
-                Break if there's nothing to read
-                """
-                chunk = file.read(chunk_size)
-                if not chunk:
-                    break
-
-                " TarInfo helps trimming chunk down if data is less than chunk size "
-                tarinfo = tarfile.TarInfo(name=filepath)
-                tarinfo.size = len(chunk)
-
-                " Add chunk to TAR "
-                tar.addfile(tarinfo, fileobj=BytesIO(chunk))
-                " Update progress bar"
-                progress_bar.update(tarinfo.size)
-
-            file.close()
-    else:
+    tar: TarWriter = TarWriter(writer, tarfile.PAX_FORMAT)
+    tar.offset = offset
+
+    " Init progress bar "
+    progress_bar: tqdm = tqdm(total=total_size, desc="Compressing", unit='iB', unit_scale=True, disable=not epb)
+
+    " Hard links are stored once, sparse files are read around their holes "
+    linked: dict = hard_links(entries)
+
+    prefetcher: Optional[Prefetcher] = None
+    if read_ahead is not None and read_ahead.enabled:
+        prefetcher = Prefetcher(
+            [entry for entry in entries if entry.path not in linked and not entry.sparse],
+            read_ahead.workers,
+            read_ahead.depth,
+            read_ahead.memory
+        )
+
+    try:
+        for entry in entries:
+            start: int = tar.offset
 
-        for filepath in children:
-            tar.add(filepath)
+            if entry.path in linked:
+                " Another path to a file already stored, only its name goes in "
+                tarinfo: Optional[tarfile.TarInfo] = tarinfo_of(entry)
+                tarinfo.type = tarfile.LNKTYPE
+                tarinfo.linkname = arcname(linked[entry.path])
+                tarinfo.size = 0
+                tar.addfile(tarinfo)
 
-    tar.close()
+                progress_bar.update(entry.size)
+                if linked[entry.path] in digests:
+                    digests[entry.path] = digests[linked[entry.path]]
+                if links is not None:
+                    links[tarinfo.name] = tarinfo.linkname
+            elif not entry.isreg:
+                " Links and special files carry no data "
+                tarinfo: Optional[tarfile.TarInfo] = tar.add(entry.path)
+            else:
+                if policy is not None:
+                    writer.use(policy.compressor(entry))
+
+                digest = new_digest() if checksum else None
+                tarinfo: Optional[tarfile.TarInfo] = tarinfo_of(entry)
+                strategy: str = io_strategy if entry.size >= io_threshold else 'read'
+
+                def _update(chunk) -> None:
+                    " Each chunk moves the progress bar "
+                    progress_bar.update(len(chunk))
+                    if digest is not None:
+                        digest.update(chunk)
+                    if tuner is not None and not tuner.done:
+                        now: float = perf_counter()
+                        tuner.record(len(chunk), now - last[0])
+                        last[0] = now
+
+                regions: Optional[list] = None
+                with open(entry.path, 'rb') if prefetcher is None or entry.sparse else prefetcher.open(entry) as file:
+                    if entry.sparse:
+                        regions = sparse_regions(file, entry.size)
+
+                    if regions is None:
+                        " File goes in as one member "
+                        tar.addfile(tarinfo, file, tuner or bufsize, strategy, buffer, _update)
+                    else:
+                        " Holes are neither read nor stored "
+                        tar.addsparse(tarinfo, file, regions, tuner or bufsize, _update)
+                        progress_bar.update(entry.size - sum(length for _, length in regions))
+
+                if digest is not None:
+                    " Data of a sparse file is hashed, then where it goes "
+                    if regions is not None:
+                        digest.update(sparse_map(regions))
+                    digests[entry.path] = digest.hexdigest()
+
+            if members is not None and tarinfo is not None:
+                members[tarinfo.name] = [start, tar.offset]
+            if done is not None:
+                done(entry, None if tarinfo is None else tarinfo.name, digests.get(entry.path))
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+
+    progress_bar.close()
+    if tuner is not None:
+        " Backup may end before every size was tried "
+        tuner.finish()
+
+    tar.close(end)
     # Flush stream (finalize the file)
     writer.flush(zstd.FLUSH_FRAME)
 
+    return digests
 
-def zstd_compress(profile: BackupProfile, config: Configuration) -> None:
-    with open(os.path.join(profile.destination, profile.filename), 'wb') as zfile:
+
+def split_shards(entries: list, count: int) -> list:
+    """
+    Split entries into shards of about the same size.
+    Largest files are placed first, each into the
+    smallest shard so far. Every shard keeps the order of 'entries'.
+
+    :param entries: list of FileEntry
+    :param count: maximum number of shards
+    :return: list of non-empty shards (lists of FileEntry)
+    """
+    heap: list = [(0, i) for i in range(count)]
+    shards: list = [[] for _ in range(count)]
+
+    for position in sorted(range(len(entries)), key=lambda x: entries[x].size, reverse=True):
+        size, i = heapq.heappop(heap)
+        shards[i].append(position)
+        " Empty files still cost a header "
+        heapq.heappush(heap, (size + entries[position].size + tarfile.BLOCKSIZE, i))
+
+    return [[entries[position] for position in sorted(shard)] for shard in shards if shard]
+
+
+def _compress_shard(entries: list, filepath: str, arguments: ZstdArguments, level: int, hashing: bool,
+                    settings: Settings, dict_bytes: Optional[bytes] = None) -> tuple:
+    """
+    Compress a shard into its own file, runs in a worker process.
+    The tarball is left open-ended, so shards can be joined.
+
+    :param level: compression level (may differ from 'arguments.level')
+    :param dict_bytes: content of the dictionary (dictionaries can't be pickled)
+    :return: digests, members, frames, size of tarball and hard links
+    """
+    members: dict = {}
+    links: dict = {}
+    dict_data = zstd.ZstdCompressionDict(dict_bytes) if dict_bytes else None
+    " Each shard is a single thread, there is a process per shard "
+    cctx = new_compressor(arguments, level, 0, dict_data)
+
+    policy: Optional[Policy] = None
+    if arguments.policy.enabled:
+        policy = Policy(
+            arguments.policy,
+            level,
+            lambda x: new_compressor(arguments, x, 0, dict_data)
+        )
+        entries = policy.group(entries)
+
+    with space.SpaceGuard(open(filepath, 'wb'), settings.reserve_space) as file:
+        " Shards always end in a seek table, so frames are bounded even without 'frame_size' "
+        frame_size: int = dictionary.FRAME_SIZE if dict_data is not None else arguments.frame_size or MAX_FRAME_SIZE
+        writer = FrameWriter(cctx, file, frame_size)
+        digests: dict = compress(
+            entries,
+            writer,
+            False,
+            settings.write_chunk,
+            checksum=hashing,
+            members=members,
+            end=False,
+            read_ahead=settings.read_ahead,
+            io_strategy=settings.io_strategy,
+            io_threshold=settings.io_threshold,
+            tuner=chunk_tuner(settings),
+            policy=policy,
+            links=links
+        )
+
+    return digests, members, writer.frames, writer.tell(), links
+
+
+def _run_shards(parts: list, temps: list, config: Configuration, checksum: bool,
+                dict_data: Optional[zstd.ZstdCompressionDict], level: Optional[int], progress_bar: tqdm) -> list:
+    """
+    Compress every shard of 'parts' into its file of 'temps', one process each.
+
+    :return: results of '_compress_shard', in the order of 'parts'
+    """
+    with ProcessPoolExecutor(len(parts)) as executor:
+        futures: list = [
+            executor.submit(
+                _compress_shard,
+                part,
+                temp,
+                config.zstd_arguments,
+                config.zstd_arguments.level if level is None else level,
+                checksum,
+                config.settings,
+                None if dict_data is None else dict_data.as_bytes()
+            )
+            for part, temp in zip(parts, temps)
+        ]
+        for _ in as_completed(futures):
+            progress_bar.update()
+        return [future.result() for future in futures]
+
+
+def compress_sharded(entries: list, archive: str, config: Configuration, shards: int, checksum: bool,
+                     dict_data: Optional[zstd.ZstdCompressionDict] = None, level: Optional[int] = None,
+                     extra: Optional[dict] = None, digest=None) -> dict:
+    """
+    Split entries into shards, compress each one in its own
+    process, then join the results into a single archive.
+
+    Each shard is a run of zstd frames holding a part of the
+    tarball, frames of all shards form one valid tarball.
+    A member index, description of shards and a seek table
+    are appended, so the archive is always seekable.
+
+    :param entries: list of FileEntry to write
+    :param archive: path to the archive
+    :param config: provides compression settings
+    :param shards: number of worker processes
+    :param checksum: hash content of each file while writing
+    :param dict_data: dictionary every shard is compressed with
+    :param level: compression level, 'arguments.level' if None
+    :param extra: more metadata to store in the archive
+    :param digest: if given, updated with every byte of the archive
+    :return: path -> hex digest of every regular file if 'checksum' is True
+    """
+    destination, filename = os.path.split(archive)
+    parts: list = split_shards(entries, shards)
+    temps: list = [os.path.join(destination, f'.{filename}.{i}.tmp') for i in range(len(parts))]
+    logger.info(f'Compressing {len(entries)} file(s) in {len(parts)} shard(s)...')
+
+    epb: bool = config.settings.progress_bar.enabled
+    progress_bar: tqdm = tqdm(total=len(parts), desc="Compressing", unit='shard', disable=not epb)
+
+    try:
+        results: list = _run_shards(parts, temps, config, checksum, dict_data, level, progress_bar)
+    except space.NoSpaceError:
+        for temp in temps:
+            if os.path.exists(temp):
+                os.remove(temp)
+        raise
+    finally:
+        progress_bar.close()
+
+    digests: dict = {}
+    members: dict = {}
+    links: dict = {}
+    frames: list = []
+    described: list = []
+    offset: int = 0
+    data_offset: int = 0
+
+    with space.SpaceGuard(open(archive, 'wb'), config.settings.reserve_space, digest=digest) as zfile:
+        for part, temp, (shard_digests, shard_members, shard_frames, size, shard_links) in zip(parts, temps, results):
+            with open(temp, 'rb') as file:
+                shutil.copyfileobj(file, zfile, 1024 * 1024)
+            os.remove(temp)
+
+            " Positions inside a shard are moved by everything before it "
+            digests.update(shard_digests)
+            links.update(shard_links)
+            for name, (start, stop) in shard_members.items():
+                members[name] = [start + data_offset, stop + data_offset]
+            for frame in shard_frames:
+                frames.append(Frame(frame.offset + offset, frame.size, frame.data_offset + data_offset, frame.data_size))
+
+            length: int = sum(frame.size for frame in shard_frames)
+            described.append({'files': len(part), 'offset': offset, 'length': length, 'data_size': size})
+            offset += length
+            data_offset += size
+
+        " Tar's end-of-archive marker closes the joined tarball "
+        marker: bytes = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        data: bytes = zstd.ZstdCompressor(write_checksum=config.zstd_arguments.checksum).compress(marker)
+        zfile.write(data)
+        frames.append(Frame(offset, len(data), data_offset, len(marker)))
+
+        write_metadata(zfile, {'members': members, 'links': links, 'shards': described, **(extra or {})})
+        write_seek_table(zfile, frames)
+
+        zfile.flush()
+        os.fsync(zfile.fileno())
+
+    return digests
+
+
+def _write_stream(archive: str, entries: list, config: Configuration, total_size: int, checksum: bool,
+                  dict_data: Optional[zstd.ZstdCompressionDict], level: int, extra: dict, digest,
+                  header: Optional[dict] = None, state: Optional[checkpoint.State] = None) -> dict:
+    """
+    Compress 'entries' into the partial file of 'archive' as a single stream.
+
+    :param header: if given, a checkpoint is saved every 'settings.checkpoint' bytes (see 'checkpoint.resume')
+    :param state: if given, carry on from this checkpoint
+    :return: path -> hex digest of every regular file if 'checksum' is True
+    """
+    partial: str = checkpoint.partial_of(archive)
+    frame_size: int = config.zstd_arguments.frame_size
+    if dict_data is not None:
+        " Small files go in batches, a frame each, so the dictionary helps every one of them "
+        frame_size = dictionary.FRAME_SIZE
+    interval: int = config.settings.checkpoint if header is not None else 0
+    members: Optional[dict] = {} if frame_size or interval else None
+    links: dict = {}
+
+    def _compressor(x: int) -> zstd.ZstdCompressor:
+        return new_compressor(config.zstd_arguments, x, dict_data=dict_data)
+
+    policy: Optional[Policy] = None
+    if config.zstd_arguments.policy.enabled:
+        policy = Policy(config.zstd_arguments.policy, level, _compressor)
+        entries = policy.group(entries)
+
+    remaining: list = entries
+    if state is not None:
+        " Frames after the checkpoint may be cut, they're written again "
+        with open(partial, 'r+b') as file:
+            file.truncate(state.size)
+            for chunk in iter(lambda: file.read(COPY_BUFSIZE), b''):
+                digest.update(chunk)
+
+        members.update(state.members)
+        " Links written before the checkpoint are found the same way again "
+        links.update((arcname(path), arcname(target)) for path, target in hard_links(entries[:state.done]).items())
+        remaining = entries[state.done:]
+        total_size -= sum(entry.size for entry in entries[:state.done])
+
+    with space.SpaceGuard(open(partial, 'ab' if state else 'wb'), config.settings.reserve_space, digest=digest) as zfile:
         # Create zstd file and its stream to write data
-        cctx = zstd.ZstdCompressor(level=config.zstd_arguments.level, threads=config.zstd_arguments.threads)
-        cstream = cctx.stream_writer(zfile)
+        cctx = _compressor(level)
+        if frame_size or interval:
+            " Seekable: a new frame every 'frame_size' bytes (and at every checkpoint), bounded for the seek table "
+            cstream = FrameWriter(cctx, zfile, frame_size or MAX_FRAME_SIZE)
+        elif policy is not None:
+            " A new frame for every level "
+            cstream = FrameWriter(cctx, zfile)
+        else:
+            cstream = cctx.stream_writer(zfile)
+
+        checkpointer: Optional[checkpoint.Checkpointer] = None
+        if interval:
+            if state is not None:
+                cstream.resume(state.frames, state.size, state.data)
+            checkpointer = checkpoint.Checkpointer(archive, zfile, cstream, members, interval, state, entries)
 
-        compress(
-            profile.children,
+        digests: dict = compress(
+            remaining,
             cstream,
             config.settings.progress_bar.enabled,
             config.settings.write_chunk,
-            len(profile)
+            total_size,
+            checksum=checksum,
+            members=members,
+            read_ahead=config.settings.read_ahead,
+            io_strategy=config.settings.io_strategy,
+            io_threshold=config.settings.io_threshold,
+            tuner=chunk_tuner(config.settings),
+            policy=policy,
+            offset=0 if state is None else state.data,
+            done=checkpointer,
+            links=links
         )
+        if state is not None:
+            digests = {**state.digests, **digests}
+
+        if frame_size or interval:
+            " Member index first, seek table must be the last frame of the file "
+            write_metadata(zfile, {'members': members, 'links': links, **extra})
+            write_seek_table(zfile, cstream.frames)
+        else:
+            " Source size, dictionary and picked level are kept even without a member index "
+            write_metadata(zfile, {'links': links, **extra})
+
+        zfile.flush()
+        os.fsync(zfile.fileno())
+
+    return digests
+
+
+def _write_archive(archive: str, entries: list, config: Configuration, total_size: int, checksum: bool,
+                   shards: int, dict_data: Optional[zstd.ZstdCompressionDict], level: int, extra: dict,
+                   digest, header: Optional[dict] = None, state: Optional[checkpoint.State] = None) -> dict:
+    """
+    Compress 'entries' into 'archive', split into 'shards' if more than 1.
+    Everything goes to a hidden partial file first, 'archive'
+    only appears once it's complete and on disk.
+
+    :param total_size: bytes to back up, for progress bar
+    :param level: compression level
+    :param extra: more metadata to store in the archive
+    :param digest: hash object updated with every byte of the archive
+    :param header: if given, save checkpoints (single stream only)
+    :param state: if given, carry on from this checkpoint
+    :return: path -> hex digest of every regular file if 'checksum' is True
+    """
+    partial: str = checkpoint.partial_of(archive)
+    if shards > 1:
+        digests: dict = compress_sharded(entries, partial, config, shards, checksum, dict_data, level, extra, digest)
+    else:
+        digests: dict = _write_stream(archive, entries, config, total_size, checksum, dict_data, level, extra,
+                                      digest, header, state)
+
+    dir.commit(partial, archive)
+    return digests
+
+
+def estimated_size(profile: BackupProfile, config: Configuration, backups: list,
+                   catalog: Optional[Catalog] = None) -> int:
+    """
+    :param profile: backup about to be made
+    :param config: provides compression settings
+    :param backups: paths to previous backups
+    :param catalog: catalog of the destination, if loaded already
+    :return: bytes the archive is predicted to take (see 'space.estimate')
+    """
+    return space.estimate(
+        len(profile),
+        profile.entries(),
+        backups,
+        lambda x: new_compressor(config.zstd_arguments, x, 0),
+        config.zstd_arguments.level,
+        catalog
+    )
+
+
+def zstd_compress(profile: BackupProfile, config: Configuration) -> None:
+    archive: str = os.path.join(profile.destination, profile.filename)
+    " Hashes are needed to find changed files and to verify the archive "
+    checksum: bool = config.incremental.enabled or config.settings.verify
+
+    shards: int = config.settings.shards or os.cpu_count() or 1
+    entries: list = order(profile.entries(), config.settings.read_order)
+    dict_data: Optional[zstd.ZstdCompressionDict] = dictionary.prepare(profile, config)
+
+    " Stored in archive's metadata, source size (of a full backup) lets next backup predict its size "
+    extra: dict = {'source_size': len(profile), 'kind': profile.kind}
+    if dict_data is not None:
+        extra['dictionary'] = dict_data.dict_id()
+
+    sharded: bool = shards > 1 and len(entries) > 1
+    level: int = config.zstd_arguments.level
+    budget: float = autolevel.budget_of(
+        config.zstd_arguments.time_budget,
+        config.zstd_arguments.target_speed,
+        len(profile)
+    )
+    if budget:
+        level, predicted, _ = autolevel.pick_level(
+            entries,
+            len(profile),
+            budget,
+            lambda x: new_compressor(config.zstd_arguments, x, 0 if sharded else None, dict_data),
+            shards if sharded else 1,
+            config.settings.read_ahead.enabled
+        )
+        extra['auto_level'] = {'level': level, 'predicted': round(predicted), 'budget': round(budget)}
+
+    compress_memory, decompress_memory = memory_estimate(config.zstd_arguments, level)
+    advanced: bool = config.zstd_arguments.window_log or config.zstd_arguments.long_distance_matching
+    (logger.info if advanced else logger.debug)(
+        f'Compressing needs about {size_converter(compress_memory)} of memory per thread, '
+        f'restoring about {size_converter(decompress_memory)}'
+    )
+    if config.zstd_arguments.window_log > 27:
+        logger.warn(f'Other zstd tools need \'--long={config.zstd_arguments.window_log}\' to decompress this backup')
+
+    " Backups of other sources may share the destination, leftovers tell whose they are "
+    roots: list = sorted(dir.abspath(path) for path in config.include)
+
+    " Only a single stream of a single level can carry on from a checkpoint "
+    header: Optional[dict] = None
+    if config.settings.checkpoint and not sharded and not config.zstd_arguments.policy.enabled:
+        header = {
+            'roots': roots,
+            'base': profile.base,
+            'level': level,
+            'dictionary': extra.get('dictionary'),
+            'checksum': checksum,
+            'frame_size': config.zstd_arguments.frame_size
+        }
+
+    " Leftovers of an interrupted backup are deleted unless this one carries on with it "
+    state: Optional[checkpoint.State] = checkpoint.resume(
+        profile.destination,
+        entries if header else [],
+        header or {'roots': roots}
+    )
+    if state is not None:
+        profile.filename = state.filename
+        archive = os.path.join(profile.destination, profile.filename)
+    else:
+        checkpoint.start(archive, header or {'roots': roots})
+
+    start: float = perf_counter()
+    archive_digest = new_digest()
+    try:
+        with checkpoint.hold(archive):
+            digests: dict = _write_archive(
+                archive,
+                entries,
+                config,
+                len(profile),
+                checksum,
+                shards if sharded else 1,
+                dict_data,
+                level,
+                extra,
+                archive_digest,
+                header,
+                state
+            )
+    except space.NoSpaceError as e:
+        logger.fatal(f'Not enough space to finish {profile.filename}: {e.strerror}, '
+                     f'{size_converter(config.settings.reserve_space)} must stay free')
+        checkpoint.discard(archive)
+        raise
+    except BaseException:
+        if header is None:
+            checkpoint.discard(archive)
+        else:
+            logger.warn(f'{profile.filename} is unfinished, run again to carry on from its last checkpoint')
+        raise
+    " Released first, Windows can't delete an open file "
+    checkpoint.discard(archive)
+
+    if checksum:
+        " Unchanged files keep the hash recorded by previous backup "
+        files: dict = {}
+        for path, entry in profile.manifest.items():
+            if path in profile.children:
+                files[path] = entry_info(entry, digests.get(path))
+            else:
+                files[path] = profile.previous.files[path]
+
+        Manifest(profile.kind, profile.base, files, profile.deleted).save(archive)
+
+    profile.catalog.add(record_of(
+        archive,
+        profile.kind,
+        profile.base,
+        source_size=len(profile),
+        files=len(entries),
+        level=level,
+        duration=round(perf_counter() - start, 3),
+        checksum=archive_digest.hexdigest(),
+        roots=roots
+    ))
@@ -0,0 +1,156 @@
+from src.logger import debug, warn
+from src.utils.type import verify
+from .Section import Section
+
+" Formats that are compressed already "
+DEFAULT_STORE: list = [
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'avif',
+    'mp3', 'aac', 'ogg', 'opus', 'flac', 'm4a',
+    'mp4', 'm4v', 'mkv', 'mov', 'avi', 'webm',
+    'zip', 'gz', 'tgz', 'bz2', 'xz', 'txz', 'zst', 'zstd', '7z', 'rar', 'lz4',
+    'jar', 'apk', 'docx', 'xlsx', 'pptx', 'odt', 'epub', 'pdf'
+]
+
+
+class CompressionPolicy(Section):
+    _configuration: dict
+
+    def __init__(self, configuration: dict) -> None:
+        self._configuration = configuration
+
+        #
+        #   On/Off
+        #
+        self._enabled: bool
+        self._setEnabled(self.get('enabled', False))
+
+        #
+        #   Stored extensions
+        #
+        self._store: set
+        self._setStore(self.get('store', DEFAULT_STORE))
+
+        #
+        #   Levels by extension
+        #
+        self._levels: dict
+        self._setLevels(self.get('levels', {}))
+
+        #
+        #   Sniffing
+        #
+        self._sniff: bool
+        self._setSniff(self.get('sniff', True))
+
+        #
+        #   Entropy threshold
+        #
+        self._entropy: float
+        self._setEntropy(self.get('entropy', 7.5))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :return: whether compression level is picked for each file
+        """
+        return self._enabled
+
+    def _setEnabled(self, value) -> None:
+        try:
+            self._enabled = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._enabled = False
+
+        debug(f'Compression policy? {self.enabled}')
+
+    @property
+    def store(self) -> set:
+        """
+        :return: extensions (lowercase, without dot) of files stored without compression
+        """
+        return self._store
+
+    def _setStore(self, value) -> None:
+        fromfile: list = verify(value, list, DEFAULT_STORE)
+        self._store = {str(ext).lower().lstrip('.') for ext in fromfile}
+
+        debug(f'Stored extensions: {sorted(self.store)}')
+
+    @property
+    def levels(self) -> dict:
+        """
+        :return: extension -> compression level, 'store' for no compression
+        """
+        return self._levels
+
+    def _setLevels(self, value) -> None:
+        """
+        Set compression level of some extensions
+
+        :param value: a dict of extension -> level (or 'store')
+        """
+        self._levels = {}
+        for ext, level in verify(value, dict, {}).items():
+            if level != 'store' and (not isinstance(level, int) or isinstance(level, bool) or level > 22):
+                warn(f'\'{level}\' is not a valid level for \'{ext}\'! Skipping...')
+                continue
+            self._levels[str(ext).lower().lstrip('.')] = level
+
+        debug(f'Levels by extension: {self.levels}')
+
+    @property
+    def sniff(self) -> bool:
+        """
+        :return: whether files of other extensions are sampled to find incompressible data
+        """
+        return self._sniff
+
+    def _setSniff(self, value) -> None:
+        try:
+            self._sniff = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: True.')
+            self._sniff = True
+
+        debug(f'Sniff file types? {self.sniff}')
+
+    @property
+    def entropy(self) -> float:
+        """
+        :return: sampled files with more bits of entropy per byte are stored
+        """
+        return self._entropy
+
+    def _setEntropy(self, value) -> None:
+        """
+        Set entropy (0 to 8 bits per byte) from which data
+        is considered incompressible. Random data is close to 8.
+
+        :param value: a number of bits per byte
+        """
+        try:
+            fromfile: float = float(verify(value, (int, float)))
+
+            if not 0 < fromfile <= 8:
+                warn(f'\'arguments.policy.entropy\' must be between 0 and 8! Corrected to 7.5.')
+                fromfile = 7.5
+
+            self._entropy = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 7.5.')
+            self._entropy = 7.5
+
+        debug(f'Entropy threshold: {self.entropy} bits per byte')
+
+    def __str__(self) -> str:
+        return (
+            'CompressionPolicy('
+            f'enabled={self.enabled}, '
+            f'store={len(self.store)} extension(s), '
+            f'levels={self.levels}, '
+            f'sniff={self.sniff}, '
+            f'entropy={self.entropy}'
+            ')'
+        )
@@ -0,0 +1,83 @@
+from src.logger import debug, warn
+from src.utils.type import verify
+from .Section import Section
+
+" Tiers, from the shortest period to the longest "
+TIERS: tuple = ('daily', 'weekly', 'monthly', 'yearly')
+
+
+class GFSSettings(Section):
+    _configuration: dict
+
+    def __init__(self, configuration: dict) -> None:
+        self._configuration = configuration
+
+        #
+        #   Tiers
+        #
+        self._tiers: dict = {}
+        for tier in TIERS:
+            self._setTier(tier, self.get(tier, 0))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :return: whether at least a tier keeps backups
+        """
+        return any(self._tiers.values())
+
+    @property
+    def tiers(self) -> dict:
+        """
+        :return: tier -> number of days, weeks, months or years a backup is kept for
+        """
+        return dict(self._tiers)
+
+    @property
+    def daily(self) -> int:
+        return self._tiers['daily']
+
+    @property
+    def weekly(self) -> int:
+        return self._tiers['weekly']
+
+    @property
+    def monthly(self) -> int:
+        return self._tiers['monthly']
+
+    @property
+    def yearly(self) -> int:
+        return self._tiers['yearly']
+
+    def _setTier(self, tier: str, value) -> None:
+        """
+        Set how many of the most recent days (weeks, months,
+        years) keep their newest backup.
+
+        :param tier: one of 'TIERS'
+        :param value: an integer, 0 turns the tier off
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'old_backups.gfs.{tier}\' must be greater or equal to 0! Corrected to 0.')
+                fromfile = 0
+
+            self._tiers[tier] = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 0.')
+            self._tiers[tier] = 0
+
+        debug(f'Backups kept {tier}: {self._tiers[tier]}')
+
+    def __str__(self) -> str:
+        return (
+            'GFSSettings('
+            f'daily={self.daily}, '
+            f'weekly={self.weekly}, '
+            f'monthly={self.monthly}, '
+            f'yearly={self.yearly}'
+            ')'
+        )
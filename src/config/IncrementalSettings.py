@@ -0,0 +1,80 @@
+from src.logger import debug, info, warn
+from src.utils.type import verify
+from .Section import Section
+
+
+class IncrementalSettings(Section):
+    _configuration: dict
+
+    def __init__(self, configuration: dict) -> None:
+        self._configuration = configuration
+
+        #
+        #   On/Off
+        #
+        self._enabled: bool
+        self._setEnabled(self.get('enabled', False))
+
+        #
+        #   Full backup interval
+        #
+        self._full_every: int
+        self._setFullEvery(self.get('full_every', 7))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :return: whether only new or changed files are backed up
+        """
+        return self._enabled
+
+    def _setEnabled(self, value) -> None:
+        try:
+            self._enabled = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._enabled = False
+
+        debug(f'Incremental backups: {self.enabled}')
+
+    @property
+    def full_every(self) -> int:
+        """
+        A chain is a full backup followed by incremental
+        backups built on top of it. Once a chain has this
+        many backups, the next one starts a new chain.
+
+        :return: maximum number of backups in a chain
+        """
+        return self._full_every
+
+    def _setFullEvery(self, value) -> None:
+        """
+        Set how many backups a chain can have
+
+        :param value: number of backups, 1 means every backup is a full backup
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'incremental.full_every\' must be greater than 0! Corrected to 1.')
+                fromfile = 1
+
+            self._full_every = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 7.')
+            self._full_every = 7
+
+        debug(f'Full backup every {self.full_every} backup(s)')
+        if self.enabled and self.full_every == 1:
+            info('\'incremental.full_every\' is 1, every backup will be a full backup.')
+
+    def __str__(self) -> str:
+        return (
+            'IncrementalSettings('
+            f'enabled={self.enabled}, '
+            f'full_every={self.full_every}'
+            ')'
+        )
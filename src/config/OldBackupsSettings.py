@@ -1,8 +1,10 @@
 from src.logger import debug, info, warn
 from src.utils.type import verify
+from .GFSSettings import GFSSettings
+from .Section import Section
 
 
-class OldBackupsSettings:
+class OldBackupsSettings(Section):
     _configuration: dict
 
     def __init__(self, configuration: dict) -> None:
@@ -32,6 +34,18 @@ class OldBackupsSettings:
         self._aggressive: bool
         self._setAggressive(self['aggressive'])
 
+        #
+        #   Dry run
+        #
+        self._dry_run: bool
+        self._setDryRun(self.get('dry_run', False))
+
+        #
+        #   Grandfather-father-son tiers
+        #
+        self._gfs: GFSSettings
+        self._setGFS(self.get('gfs', {}))
+
     @property
     def keep(self) -> int:
         """
@@ -153,13 +167,49 @@ class OldBackupsSettings:
 
         debug(f'Delete older backups for space: {self.aggressive}')
 
-    def __exist__(self, item: str) -> bool:
-        return item in self._configuration
+    @property
+    def dry_run(self) -> bool:
+        """
+        :return: whether backups to delete are only reported
+        """
+        return self._dry_run
+
+    def _setDryRun(self, value) -> None:
+        """
+        Set whether program only lists backups it would
+        delete (and why) instead of deleting them.
+
+        :param value: True or False
+        """
+        try:
+            self._dry_run = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._dry_run = False
+
+        debug(f'Only report old backups to delete: {self.dry_run}')
+
+    @property
+    def gfs(self) -> GFSSettings:
+        """
+        When enabled, replaces 'keep' and 'retention'
+
+        :return: an instance of GFSSettings class.
+        """
+        return self._gfs
+
+    def _setGFS(self, value) -> None:
+        """
+        Convert a dictionary represents GFSSettings class.
+
+        :param value: a dict of tier -> number of backups
+        """
+        fromfile: dict = verify(value, dict, {})
+        self._gfs = GFSSettings(fromfile)
 
-    def __getitem__(self, item: str):
-        if not self.__exist__(item):
-            raise KeyError(f'\'{item}\' does NOT exist!')
-        return self._configuration[item]
+        debug(f'GFS tiers: {str(self.gfs)}')
+        if self.gfs.enabled and (self.keep or self.retention):
+            info('\'old_backups.gfs\' is set, \'keep\' and \'retention\' are not used.')
 
     def __str__(self) -> str:
         return (
@@ -167,6 +217,8 @@ class OldBackupsSettings:
             f'keep={self.keep}, '
             f'retention={self.retention}, '
             f'del_old_4_space={self.del_old_4_space}, '
-            f'aggressive={self.aggressive}'
+            f'aggressive={self.aggressive}, '
+            f'dry_run={self.dry_run}, '
+            f'gfs={str(self.gfs)}'
             ')'
         )
@@ -0,0 +1,21 @@
+class Section:
+    """
+    Lookups shared by every part of the configuration.
+    Subclasses keep their part of the file in '_configuration'.
+    """
+    _configuration: dict
+
+    def __exist__(self, item: str) -> bool:
+        return item in self._configuration
+
+    def __getitem__(self, item: str):
+        if not self.__exist__(item):
+            raise KeyError(f'\'{item}\' does NOT exist!')
+        return self._configuration[item]
+
+    def get(self, item: str, default=None):
+        """
+        Same as self[item] but returns 'default'
+        when key is missing (optional settings).
+        """
+        return self._configuration[item] if self.__exist__(item) else default
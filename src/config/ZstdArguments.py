@@ -2,9 +2,14 @@ from multiprocessing import cpu_count
 
 from src.logger import debug, warn
 from src.utils.type import verify
+from .CompressionPolicy import CompressionPolicy
+from .Section import Section
 
+" zstd strategies from fastest to strongest, 'auto' lets the level decide "
+STRATEGIES: tuple = ('auto', 'fast', 'dfast', 'greedy', 'lazy', 'lazy2', 'btlazy2', 'btopt', 'btultra', 'btultra2')
 
-class ZstdArguments:
+
+class ZstdArguments(Section):
     _configuration: dict
 
     def __init__(self, configuration: dict) -> None:
@@ -22,6 +27,72 @@ class ZstdArguments:
         self._threads: int
         self._setThreads(self['threads'])
 
+        #
+        #   Frame size
+        #
+        self._frame_size: int
+        self._setFrameSize(self.get('frame_size', 0))
+
+        #
+        #   Checksum
+        #
+        self._checksum: bool
+        self._setChecksum(self.get('checksum', True))
+
+        #
+        #   Window log
+        #
+        self._window_log: int
+        self._setWindowLog(self.get('window_log', 0))
+
+        #
+        #   Long distance matching
+        #
+        self._long_distance_matching: bool
+        self._setLongDistanceMatching(self.get('long_distance_matching', self.get('enable_ldm', False)))
+
+        #
+        #   LDM hash log
+        #
+        self._ldm_hash_log: int
+        self._setLdmHashLog(self.get('ldm_hash_log', 0))
+
+        #
+        #   Strategy
+        #
+        self._strategy: int
+        self._setStrategy(self.get('strategy', 'auto'))
+
+        #
+        #   Job size
+        #
+        self._job_size: int
+        self._setJobSize(self.get('job_size', 0))
+
+        #
+        #   Overlap log
+        #
+        self._overlap_log: int
+        self._setOverlapLog(self.get('overlap_log', 0))
+
+        #
+        #   Time budget
+        #
+        self._time_budget: int
+        self._setTimeBudget(self.get('time_budget', 0))
+
+        #
+        #   Target speed
+        #
+        self._target_speed: int
+        self._setTargetSpeed(self.get('target_speed', 0))
+
+        #
+        #   Per-file policy
+        #
+        self._policy: CompressionPolicy
+        self._setPolicy(self.get('policy', {}))
+
     @property
     def level(self) -> int:
         """
@@ -87,18 +158,289 @@ class ZstdArguments:
 
         debug(f'Using {self.threads} to compress.')
 
-    def __exist__(self, item: str) -> bool:
-        return item in self._configuration
+    @property
+    def frame_size(self) -> int:
+        """
+        :return: bytes of data per zstd frame, 0 means a single frame
+        """
+        return self._frame_size
+
+    def _setFrameSize(self, value) -> None:
+        """
+        Set size of each frame (in MiB).
+        Archive with more than one frame gets a seek table,
+        so a single file can be restored without
+        decompressing everything before it.
+
+        :param value: an integer represents MiB, 0 to disable
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'arguments.frame_size\' must be a positive number! Corrected to 0 (single frame).')
+                fromfile = 0
+            elif fromfile > 1024:
+                " Seek table stores sizes as 32-bit numbers "
+                warn(f'Maximum frame size is 1024 MiB, got \'{fromfile}\'. Corrected to 1024')
+                fromfile = 1024
+
+            self._frame_size = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'\'{value}\' is not a valid number! Corrected to 0 (single frame).')
+            self._frame_size = 0
+
+        debug(f'Frame size: {self.frame_size} bytes')
+
+    @property
+    def checksum(self) -> bool:
+        """
+        :return: whether each frame ends with a checksum of its content
+        """
+        return self._checksum
+
+    def _setChecksum(self, value) -> None:
+        """
+        Add a checksum (4 bytes) to every frame, so damaged
+        archives fail to decompress instead of restoring bad data.
+
+        :param value: True or False
+        """
+        try:
+            self._checksum = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: True.')
+            self._checksum = True
+
+        debug(f'Frame checksum: {self.checksum}')
+
+    def _verifyLog(self, name: str, value, low: int, high: int) -> int:
+        """
+        Verify a power of 2 parameter
+
+        :return: 'value' if it's 0 (auto) or between 'low' and 'high', 0 otherwise
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile and not low <= fromfile <= high:
+                warn(f'\'arguments.{name}\' must be between {low} and {high}, got \'{fromfile}\'. '
+                     f'Corrected to 0 (auto).')
+                fromfile = 0
+
+            return fromfile
+
+        except TypeError:
+            warn(f'\'{value}\' is not a valid number! Corrected to 0 (auto).')
+            return 0
+
+    @property
+    def window_log(self) -> int:
+        """
+        :return: log2 of how far back zstd looks for matches, 0 lets the level decide
+        """
+        return self._window_log
+
+    def _setWindowLog(self, value) -> None:
+        """
+        Set window size as a power of 2 (same as '--long=N' of zstd CLI).
+        Restoring needs about that much memory, 27 (128 MiB)
+        is the largest other zstd decoders accept by default.
+
+        :param value: an integer between 10 and 31, 0 for auto
+        """
+        self._window_log = self._verifyLog('window_log', value, 10, 31)
+        debug(f'Window log: {self.window_log}')
+
+    @property
+    def long_distance_matching(self) -> bool:
+        """
+        :return: whether matches are searched across the whole window
+        """
+        return self._long_distance_matching
+
+    def _setLongDistanceMatching(self, value) -> None:
+        """
+        Find repeated data far apart (VM images, container layers...).
+        Best used with a large 'window_log'. 'enable_ldm' is accepted too.
+
+        :param value: True or False
+        """
+        try:
+            self._long_distance_matching = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._long_distance_matching = False
+
+        debug(f'Long distance matching: {self.long_distance_matching}')
+
+    @property
+    def ldm_hash_log(self) -> int:
+        """
+        :return: log2 of long distance matching's table size, 0 lets zstd decide
+        """
+        return self._ldm_hash_log
+
+    def _setLdmHashLog(self, value) -> None:
+        self._ldm_hash_log = self._verifyLog('ldm_hash_log', value, 6, 30)
+        debug(f'LDM hash log: {self.ldm_hash_log}')
+
+    @property
+    def strategy(self) -> int:
+        """
+        :return: index of strategy in STRATEGIES, 0 lets the level decide
+        """
+        return self._strategy
+
+    def _setStrategy(self, value) -> None:
+        """
+        Set how hard zstd searches for matches
+
+        :param value: one of STRATEGIES
+        """
+        fromfile: str = verify(value, str, 'auto').lower()
+
+        if fromfile not in STRATEGIES:
+            warn(f'Unknown strategy \'{fromfile}\'. Use default value: auto.')
+            fromfile = 'auto'
+
+        self._strategy = STRATEGIES.index(fromfile)
+        debug(f'Strategy: {fromfile}')
+
+    @property
+    def job_size(self) -> int:
+        """
+        :return: bytes each thread compresses at a time, 0 lets zstd decide
+        """
+        return self._job_size
+
+    def _setJobSize(self, value) -> None:
+        """
+        Set size of each job given to compression threads
+
+        :param value: an integer represents MiB, 0 for auto
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'arguments.job_size\' must be a positive number! Corrected to 0 (auto).')
+                fromfile = 0
+            elif fromfile > 1024:
+                warn(f'Maximum job size is 1024 MiB, got \'{fromfile}\'. Corrected to 1024')
+                fromfile = 1024
+
+            self._job_size = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'\'{value}\' is not a valid number! Corrected to 0 (auto).')
+            self._job_size = 0
+
+        debug(f'Job size: {self.job_size} bytes')
+
+    @property
+    def overlap_log(self) -> int:
+        """
+        :return: how much data threads share with previous job (1: none, 9: whole window), 0 lets zstd decide
+        """
+        return self._overlap_log
+
+    def _setOverlapLog(self, value) -> None:
+        self._overlap_log = self._verifyLog('overlap_log', value, 1, 9)
+        debug(f'Overlap log: {self.overlap_log}')
+
+    @property
+    def time_budget(self) -> int:
+        """
+        :return: seconds a backup may take, 0 if not set
+        """
+        return self._time_budget
+
+    def _setTimeBudget(self, value) -> None:
+        """
+        Set how long a backup may take. When set, 'level'
+        is ignored and picked for each backup instead.
+
+        :param value: an integer represents minutes, 0 to disable
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'arguments.time_budget\' must be a positive number! Corrected to 0 (disabled).')
+                fromfile = 0
+
+            self._time_budget = fromfile * 60
+
+        except TypeError:
+            warn(f'\'{value}\' is not a valid number! Corrected to 0 (disabled).')
+            self._time_budget = 0
+
+        debug(f'Time budget: {self.time_budget} seconds')
+
+    @property
+    def target_speed(self) -> int:
+        """
+        :return: bytes per second a backup must at least go at, 0 if not set
+        """
+        return self._target_speed
+
+    def _setTargetSpeed(self, value) -> None:
+        """
+        Set slowest acceptable speed. When set, 'level'
+        is ignored and picked for each backup instead.
+
+        :param value: an integer represents MiB/s, 0 to disable
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'arguments.target_speed\' must be a positive number! Corrected to 0 (disabled).')
+                fromfile = 0
+
+            self._target_speed = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'\'{value}\' is not a valid number! Corrected to 0 (disabled).')
+            self._target_speed = 0
+
+        debug(f'Target speed: {self.target_speed} bytes/s')
+
+    @property
+    def policy(self) -> CompressionPolicy:
+        """
+        :return: an instance of CompressionPolicy class.
+        """
+        return self._policy
+
+    def _setPolicy(self, value) -> None:
+        """
+        Convert a dictionary represents CompressionPolicy class.
+
+        :param value: a dict contains necessary properties to parse CompressionPolicy
+        """
+        fromfile: dict = verify(value, dict, {})
+        self._policy = CompressionPolicy(fromfile)
 
-    def __getitem__(self, item: str):
-        if not self.__exist__(item):
-            raise KeyError(f'\'{item}\' does NOT exist!')
-        return self._configuration[item]
+        debug(f'Compression policy: {str(self.policy)}')
 
     def __str__(self) -> str:
         return (
             'ZstdArgument('
             f'level={self.level}, '
-            f'threads={self.threads}'
+            f'threads={self.threads}, '
+            f'frame_size={self.frame_size}, '
+            f'checksum={self.checksum}, '
+            f'window_log={self.window_log}, '
+            f'long_distance_matching={self.long_distance_matching}, '
+            f'ldm_hash_log={self.ldm_hash_log}, '
+            f'strategy={STRATEGIES[self.strategy]}, '
+            f'job_size={self.job_size}, '
+            f'overlap_log={self.overlap_log}, '
+            f'time_budget={self.time_budget}, '
+            f'target_speed={self.target_speed}, '
+            f'policy={str(self.policy)}'
             ')'
         )
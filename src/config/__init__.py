@@ -2,14 +2,17 @@ from __future__ import annotations
 
 from logging import DEBUG, INFO, WARN, ERROR, FATAL
 
+from src.ignore import is_pattern
 from src.logger import warn, debug
 from src.utils.type import verify
+from .IncrementalSettings import IncrementalSettings
 from .OldBackupsSettings import OldBackupsSettings
+from .Section import Section
 from .ZstdArguments import ZstdArguments
 from .settings import Settings
 
 
-class Configuration:
+class Configuration(Section):
     _configuration: dict
 
     def __init__(self, configuration: dict) -> None:
@@ -37,14 +40,27 @@ class Configuration:
         #   Ignore paths
         #
         self._ignore_paths: set = set()
+        self._ignore_patterns: list = []
         self._setIgnorePaths(self['ignore'])
 
+        #
+        #   Per-folder ignore file
+        #
+        self._ignore_file: str
+        self._setIgnoreFile(self.get('ignore_file', '.backupignore'))
+
         #
         #   Old backups settings
         #
         self._old_backups_settings: OldBackupsSettings
         self._setOldBackupsSettings(self['old_backups'])
 
+        #
+        #   Incremental backups
+        #
+        self._incremental: IncrementalSettings
+        self._setIncremental(self.get('incremental', {}))
+
         #
         #   ZSTD arguments
         #
@@ -156,23 +172,61 @@ class Configuration:
         """
         return self._ignore_paths
 
+    @property
+    def ignore_patterns(self) -> list:
+        """
+        Glob patterns (e.g. '*.tmp', '**/node_modules', '!keep.log')
+        in the order they were written, later ones win.
+
+        :return: patterns that are not included with the compressed file
+        """
+        return self._ignore_patterns
+
     def _setIgnorePaths(self, value) -> None:
         """
         Add path(s) to collection of path should NOT
         be included in the compressed file.
+        Entries with glob characters or starting with '!'
+        are kept apart as patterns.
 
         :param value: a path or list of paths to be ignored
         """
         fromfile: str | list = verify(value, (list, str))
 
         if isinstance(fromfile, str):
-            # If provided value is a string, add it to set
-            self._ignore_paths.add(fromfile)
-        else:
-            # If provided value is a list, add all to set
-            self._ignore_paths.update(fromfile)
+            # If provided value is a string, turn it into a list
+            fromfile = [fromfile]
+
+        for rule in fromfile:
+            if is_pattern(rule):
+                self._ignore_patterns.append(rule)
+            else:
+                self._ignore_paths.add(rule)
 
         debug(f'Paths to ignore: {", ".join(self.ignore_paths)}')
+        debug(f'Patterns to ignore: {", ".join(self.ignore_patterns)}')
+
+    @property
+    def ignore_file(self) -> str:
+        """
+        :return: name of per-folder file with more ignore patterns, empty if disabled
+        """
+        return self._ignore_file
+
+    def _setIgnoreFile(self, value) -> None:
+        """
+        Set name of the file that holds ignore patterns
+        for the folder it's in (like .gitignore).
+
+        :param value: file name, empty string disables it
+        """
+        try:
+            self._ignore_file = verify(value, str)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: .backupignore.')
+            self._ignore_file = '.backupignore'
+
+        debug(f'Per-folder ignore file: \'{self.ignore_file}\'')
 
     @property
     def old_backups_settings(self) -> OldBackupsSettings:
@@ -193,6 +247,25 @@ class Configuration:
 
         debug(f'Old backups settings: {str(self.old_backups_settings)}')
 
+    @property
+    def incremental(self) -> IncrementalSettings:
+        """
+        :return: an instance of IncrementalSettings
+        """
+        return self._incremental
+
+    def _setIncremental(self, value) -> None:
+        """
+        Create an instance of IncrementalSettings from
+        provided dictionary.
+
+        :param value: dict contains keys of 'incremental' from config.yml
+        """
+        fromfile: dict = verify(value, dict)
+        self._incremental = IncrementalSettings(fromfile)
+
+        debug(f'Incremental settings: {str(self.incremental)}')
+
     @property
     def zstd_arguments(self) -> ZstdArguments:
         """
@@ -231,14 +304,6 @@ class Configuration:
 
         debug(f'Settings: {str(self.settings)}')
 
-    def __exist__(self, item: str) -> bool:
-        return item in self._configuration
-
-    def __getitem__(self, item: str):
-        if not self.__exist__(item):
-            raise KeyError(f'\'{item}\' does NOT exist!')
-        return self._configuration[item]
-
     def __str__(self) -> str:
         return (
             'Configuration('
@@ -246,7 +311,10 @@ class Configuration:
             f'include={str(self.include)}, '
             f'destination={self.destination}, '
             f'ignore={str(self.ignore_paths)}, '
+            f'ignore_patterns={str(self.ignore_patterns)}, '
+            f'ignore_file={self.ignore_file}, '
             f'OldBackupSettings={str(self.old_backups_settings)}, '
+            f'IncrementalSettings={str(self.incremental)}, '
             f'ZstdArguments={str(self.zstd_arguments)}'
             ')'
         )
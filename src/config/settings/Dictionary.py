@@ -0,0 +1,169 @@
+from src.logger import debug, warn
+from src.utils.type import verify
+from ..Section import Section
+
+
+class Dictionary(Section):
+    _configuration: dict
+
+    def __init__(self, configuration: dict) -> None:
+        self._configuration = configuration
+
+        #
+        #   On/Off
+        #
+        self._enabled: bool
+        self._setEnabled(self.get('enabled', False))
+
+        #
+        #   Dictionary size
+        #
+        self._size: int
+        self._setSize(self.get('size', 112))
+
+        #
+        #   Number of samples
+        #
+        self._samples: int
+        self._setSamples(self.get('samples', 1000))
+
+        #
+        #   Largest sample
+        #
+        self._sample_size: int
+        self._setSampleSize(self.get('sample_size', 128))
+
+        #
+        #   Retraining
+        #
+        self._retrain: int
+        self._setRetrain(self.get('retrain', 0))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :return: whether data is compressed with a dictionary trained on the source
+        """
+        return self._enabled
+
+    def _setEnabled(self, value) -> None:
+        try:
+            self._enabled = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._enabled = False
+
+        debug(f'Dictionary? {self.enabled}')
+
+    @property
+    def size(self) -> int:
+        """
+        :return: maximum size of a trained dictionary in bytes
+        """
+        return self._size
+
+    def _setSize(self, value) -> None:
+        """
+        Set size of trained dictionaries
+
+        :param value: an integer represents KiB
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'settings.dictionary.size\' must be greater than 0! Corrected to 112.')
+                fromfile = 112
+
+            self._size = fromfile * 1024
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 112.')
+            self._size = 112 * 1024
+
+        debug(f'Dictionary size: {self.size} bytes')
+
+    @property
+    def samples(self) -> int:
+        """
+        :return: maximum number of files a dictionary is trained on
+        """
+        return self._samples
+
+    def _setSamples(self, value) -> None:
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'settings.dictionary.samples\' must be greater than 0! Corrected to 1000.')
+                fromfile = 1000
+
+            self._samples = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 1000.')
+            self._samples = 1000
+
+        debug(f'Dictionary samples: {self.samples}')
+
+    @property
+    def sample_size(self) -> int:
+        """
+        :return: only files up to this many bytes are sampled
+        """
+        return self._sample_size
+
+    def _setSampleSize(self, value) -> None:
+        """
+        Set size of the largest file used as a sample
+
+        :param value: an integer represents KiB
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'settings.dictionary.sample_size\' must be greater than 0! Corrected to 128.')
+                fromfile = 128
+
+            self._sample_size = fromfile * 1024
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 128.')
+            self._sample_size = 128 * 1024
+
+        debug(f'Dictionary sample size: {self.sample_size} bytes')
+
+    @property
+    def retrain(self) -> int:
+        """
+        :return: days a dictionary is used before a new one is trained, 0 never trains again
+        """
+        return self._retrain
+
+    def _setRetrain(self, value) -> None:
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'settings.dictionary.retrain\' must be a positive number or 0! Corrected to 0.')
+                fromfile = 0
+
+            self._retrain = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 0.')
+            self._retrain = 0
+
+        debug(f'Dictionary retrain: {self.retrain} day(s)')
+
+    def __str__(self) -> str:
+        return (
+            'Dictionary('
+            f'enabled={self.enabled}, '
+            f'size={self.size}, '
+            f'samples={self.samples}, '
+            f'sample_size={self.sample_size}, '
+            f'retrain={self.retrain}'
+            ')'
+        )
@@ -1,8 +1,9 @@
 from src.logger import debug, warn
 from src.utils.type import verify
+from ..Section import Section
 
 
-class ProgressBar:
+class ProgressBar(Section):
     _configuration: dict
 
     def __init__(self, configuration: dict) -> None:
@@ -30,13 +31,5 @@ class ProgressBar:
 
         debug(f'Enable progress bar? {self.enabled}')
 
-    def __exist__(self, item: str) -> bool:
-        return item in self._configuration
-
-    def __getitem__(self, item: str):
-        if not self.__exist__(item):
-            raise KeyError(f'\'{item}\' does NOT exist!')
-        return self._configuration[item]
-
     def __str__(self) -> str:
         return f'ProgressBar(enabled={self.enabled})'
@@ -0,0 +1,134 @@
+from src.logger import debug, warn
+from src.utils.type import verify
+from ..Section import Section
+
+
+class ReadAhead(Section):
+    _configuration: dict
+
+    def __init__(self, configuration: dict) -> None:
+        self._configuration = configuration
+
+        #
+        #   On/Off
+        #
+        self._enabled: bool
+        self._setEnabled(self.get('enabled', False))
+
+        #
+        #   Reader threads
+        #
+        self._workers: int
+        self._setWorkers(self.get('workers', 4))
+
+        #
+        #   Queue depth
+        #
+        self._depth: int
+        self._setDepth(self.get('depth', 16))
+
+        #
+        #   Memory cap
+        #
+        self._memory: int
+        self._setMemory(self.get('memory', 64))
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :return: whether files are read ahead while compressing
+        """
+        return self._enabled
+
+    def _setEnabled(self, value) -> None:
+        try:
+            self._enabled = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._enabled = False
+
+        debug(f'Read ahead? {self.enabled}')
+
+    @property
+    def workers(self) -> int:
+        """
+        :return: number of threads reading files ahead
+        """
+        return self._workers
+
+    def _setWorkers(self, value) -> None:
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'settings.read_ahead.workers\' must be greater than 0! Corrected to 1.')
+                fromfile = 1
+
+            self._workers = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 4.')
+            self._workers = 4
+
+        debug(f'Read ahead workers: {self.workers}')
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: number of blocks read ahead of the compressor
+        """
+        return self._depth
+
+    def _setDepth(self, value) -> None:
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'settings.read_ahead.depth\' must be greater than 0! Corrected to 1.')
+                fromfile = 1
+
+            self._depth = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 16.')
+            self._depth = 16
+
+        debug(f'Read ahead depth: {self.depth} block(s)')
+
+    @property
+    def memory(self) -> int:
+        """
+        :return: bytes all read ahead buffers may use together
+        """
+        return self._memory
+
+    def _setMemory(self, value) -> None:
+        """
+        Set memory cap of read ahead buffers
+
+        :param value: an integer represents MiB
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 1:
+                warn(f'\'settings.read_ahead.memory\' must be greater than 0! Corrected to 1.')
+                fromfile = 1
+
+            self._memory = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 64.')
+            self._memory = 64 * 1024 * 1024
+
+        debug(f'Read ahead memory: {self.memory} bytes')
+
+    def __str__(self) -> str:
+        return (
+            'ReadAhead('
+            f'enabled={self.enabled}, '
+            f'workers={self.workers}, '
+            f'depth={self.depth}, '
+            f'memory={self.memory}'
+            ')'
+        )
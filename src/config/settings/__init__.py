@@ -1,9 +1,12 @@
 from src.logger import debug, warn
 from src.utils.type import verify
+from .Dictionary import Dictionary
 from .ProgressBar import ProgressBar
+from .ReadAhead import ReadAhead
+from ..Section import Section
 
 
-class Settings:
+class Settings(Section):
     _configuration: dict
 
     def __init__(self, configuration: dict) -> None:
@@ -15,16 +18,88 @@ class Settings:
         self._write_chunk: int
         self._setWriteChunk(self['write_chunk'])
 
+        #
+        #   Write chunk limits
+        #
+        self._write_chunk_limits: tuple
+        self._setWriteChunkLimits(self.get('write_chunk_limits', [64, 16384]))
+
         #
         #   Progress bar
         #
         self._progress_bar: ProgressBar
         self._setProgressBar(self['progress_bar'])
 
+        #
+        #   Scan workers
+        #
+        self._scan_workers: int
+        self._setScanWorkers(self.get('scan_workers', 0))
+
+        #
+        #   Backend
+        #
+        self._backend: str
+        self._setBackend(self.get('backend', 'tar'))
+
+        #
+        #   Verify
+        #
+        self._verify: bool
+        self._setVerify(self.get('verify', False))
+
+        #
+        #   Shards
+        #
+        self._shards: int
+        self._setShards(self.get('shards', 1))
+
+        #
+        #   Read ahead
+        #
+        self._read_ahead: ReadAhead
+        self._setReadAhead(self.get('read_ahead', {}))
+
+        #
+        #   Read order
+        #
+        self._read_order: str
+        self._setReadOrder(self.get('read_order', 'path'))
+
+        #
+        #   I/O strategy
+        #
+        self._io_strategy: str
+        self._setIoStrategy(self.get('io_strategy', 'readinto'))
+
+        #
+        #   I/O threshold
+        #
+        self._io_threshold: int
+        self._setIoThreshold(self.get('io_threshold', 16))
+
+        #
+        #   Dictionary
+        #
+        self._dictionary: Dictionary
+        self._setDictionary(self.get('dictionary', {}))
+
+        #
+        #   Reserved space
+        #
+        self._reserve_space: int
+        self._setReserveSpace(self.get('reserve_space', 64))
+
+        #
+        #   Checkpoint
+        #
+        self._checkpoint: int
+        self._setCheckpoint(self.get('checkpoint', 0))
+
     @property
     def write_chunk(self) -> int:
         """
-        :return: number of bytes program attempts to write each write cycle
+        :return: number of bytes program attempts to write each write cycle, 0 means auto
         """
         return self._write_chunk
 
@@ -34,23 +109,61 @@ class Settings:
         Higher number can cause I/O bottleneck.
         Default value is 1024 bytes.
 
-        :param value: an integer represents bytes
+        'auto' measures throughput during the first
+        seconds of a backup and keeps the fastest size
+        within 'write_chunk_limits' (stored as 0).
+
+        :param value: an integer represents bytes, or 'auto'
+        """
+        if isinstance(value, str) and value.lower() == 'auto':
+            self._write_chunk = 0
+        else:
+            try:
+                fromfile: int = verify(value, int)
+
+                if fromfile <= 0:
+                    warn(f'\'settings.write_chunk\' must be a positive number! '
+                         f'Corrected to 1024.')
+                    fromfile = 1024
+
+                self._write_chunk = fromfile
+
+            except TypeError:
+                warn(f'Unrecognized input \'{value}\'. Use default value: 1024.')
+                self._write_chunk = 1024
+
+        debug(f'Write chunk: {self.write_chunk} bytes' if self.write_chunk else 'Write chunk: auto')
+
+    @property
+    def write_chunk_limits(self) -> tuple:
+        """
+        :return: smallest and largest number of bytes 'auto' write chunk may pick
+        """
+        return self._write_chunk_limits
+
+    def _setWriteChunkLimits(self, value) -> None:
+        """
+        Set range 'auto' write chunk picks from.
+        Default is 64 KiB to 16 MiB.
+
+        :param value: a list of 2 integers represent KiB
         """
         try:
-            fromfile: int = verify(value, int)
+            fromfile: list = verify(value, list)
+            low, high = (verify(limit, int) for limit in fromfile)
 
-            if fromfile <= 0:
-                warn(f'\'settings.write_chunk\' must be a positive number! '
-                     f'Corrected to 1024.')
-                fromfile = 1024
+            if low <= 0 or high < low:
+                warn(f'\'settings.write_chunk_limits\' must be 2 positive numbers, smallest first! '
+                     f'Corrected to [64, 16384].')
+                low, high = 64, 16384
 
-            self._write_chunk = fromfile
+            self._write_chunk_limits = (low * 1024, high * 1024)
 
-        except TypeError:
-            warn(f'Unrecognized input \'{value}\'. Use default value: 1024.')
-            self._write_chunk = 1024
+        except (TypeError, ValueError):
+            warn(f'Unrecognized input \'{value}\'. Use default value: [64, 16384].')
+            self._write_chunk_limits = (64 * 1024, 16384 * 1024)
 
-        debug(f'Write chunk: {self.write_chunk} bytes')
+        debug(f'Write chunk limits: {self.write_chunk_limits} bytes')
 
     @property
     def progress_bar(self) -> ProgressBar:
@@ -70,18 +183,314 @@ class Settings:
 
         debug(f'Progress bar: {str(self.progress_bar)}')
 
-    def __exist__(self, item: str) -> bool:
-        return item in self._configuration
+    @property
+    def scan_workers(self) -> int:
+        """
+        :return: number of threads used to scan 'include' paths
+        """
+        return self._scan_workers
+
+    def _setScanWorkers(self, value) -> None:
+        """
+        Set number of threads that scan folders.
+        0 lets the program decide (also the default).
+
+        :param value: an integer represents threads
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'settings.scan_workers\' must be a positive number! '
+                     f'Corrected to 0 (auto).')
+                fromfile = 0
+
+            self._scan_workers = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 0.')
+            self._scan_workers = 0
+
+        debug(f'Scan workers: {self.scan_workers}')
+
+    @property
+    def backend(self) -> str:
+        """
+        'tar': each backup is a single .zstd file (tarball)
+        'chunks': files are split into chunks, stored once
+                  in a shared chunk store, each backup is a snapshot
+
+        :return: how backups are stored
+        """
+        return self._backend
+
+    def _setBackend(self, value) -> None:
+        """
+        Set how backups are stored
+
+        :param value: 'tar' or 'chunks'
+        """
+        fromfile: str = verify(value, str, 'tar').lower()
+
+        if fromfile not in ('tar', 'chunks'):
+            warn(f'Unknown backend \'{fromfile}\'. Use default value: tar.')
+            fromfile = 'tar'
+
+        self._backend = fromfile
+        debug(f'Backend: {self.backend}')
+
+    @property
+    def verify(self) -> bool:
+        """
+        :return: whether each backup is read back and checked once it's written
+        """
+        return self._verify
+
+    def _setVerify(self, value) -> None:
+        """
+        Hash every file while it's compressed, save hashes
+        in backup's manifest and check them against
+        the archive right after it's written.
+
+        :param value: True or False
+        """
+        try:
+            self._verify = verify(value, bool)
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: False.')
+            self._verify = False
+
+        debug(f'Verify backups: {self.verify}')
+
+    @property
+    def shards(self) -> int:
+        """
+        :return: number of processes compressing parts of the archive, 0 means one per CPU
+        """
+        return self._shards
+
+    def _setShards(self, value) -> None:
+        """
+        Set number of shards. Files are split into this many
+        parts of about the same size, each one is compressed
+        by its own process and the results are joined into
+        a single archive. 1 disables sharding (also the default).
+
+        :param value: an integer represents processes
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'settings.shards\' must be a positive number! '
+                     f'Corrected to 1 (no sharding).')
+                fromfile = 1
+
+            self._shards = fromfile
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 1.')
+            self._shards = 1
+
+        debug(f'Shards: {self.shards}')
+
+    @property
+    def read_ahead(self) -> ReadAhead:
+        """
+        :return: an instance of ReadAhead class.
+        """
+        return self._read_ahead
+
+    def _setReadAhead(self, value) -> None:
+        """
+        Convert a dictionary represents ReadAhead class.
+
+        :param value: a dict contains necessary properties to parse ReadAhead
+        """
+        fromfile: dict = verify(value, dict, {})
+        self._read_ahead = ReadAhead(fromfile)
+
+        debug(f'Read ahead: {str(self.read_ahead)}')
+
+    @property
+    def read_order(self) -> str:
+        """
+        'path': by path (default)
+        'inode': by inode number
+        'extent': by physical location on disk (Linux only)
+
+        :return: order files are read and archived in
+        """
+        return self._read_order
+
+    def _setReadOrder(self, value) -> None:
+        """
+        Set order files are read in
+
+        :param value: 'path', 'inode' or 'extent'
+        """
+        fromfile: str = verify(value, str, 'path').lower()
+
+        if fromfile not in ('path', 'inode', 'extent'):
+            warn(f'Unknown read order \'{fromfile}\'. Use default value: path.')
+            fromfile = 'path'
+
+        self._read_order = fromfile
+        debug(f'Read order: {self.read_order}')
+
+    @property
+    def io_strategy(self) -> str:
+        """
+        'read': a new buffer for every read
+        'readinto': one buffer, reused for every read (default)
+        'mmap': file is memory-mapped, nothing is copied
+
+        :return: how files of at least 'io_threshold' bytes are read
+        """
+        return self._io_strategy
+
+    def _setIoStrategy(self, value) -> None:
+        """
+        Set how large files are read
+
+        :param value: 'read', 'readinto' or 'mmap'
+        """
+        fromfile: str = verify(value, str, 'readinto').lower()
+
+        if fromfile not in ('read', 'readinto', 'mmap'):
+            warn(f'Unknown I/O strategy \'{fromfile}\'. Use default value: readinto.')
+            fromfile = 'readinto'
+
+        self._io_strategy = fromfile
+        debug(f'I/O strategy: {self.io_strategy}')
+
+    @property
+    def io_threshold(self) -> int:
+        """
+        :return: files of at least this many bytes are read with 'io_strategy'
+        """
+        return self._io_threshold
+
+    def _setIoThreshold(self, value) -> None:
+        """
+        Set size from which 'io_strategy' is used.
+        Smaller files are simply read.
+
+        :param value: an integer represents MiB
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'settings.io_threshold\' must be a positive number! Corrected to 0.')
+                fromfile = 0
+
+            self._io_threshold = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 16.')
+            self._io_threshold = 16 * 1024 * 1024
+
+        debug(f'I/O threshold: {self.io_threshold} bytes')
+
+    @property
+    def dictionary(self) -> Dictionary:
+        """
+        :return: an instance of Dictionary class.
+        """
+        return self._dictionary
+
+    def _setDictionary(self, value) -> None:
+        """
+        Convert a dictionary represents Dictionary class.
+
+        :param value: a dict contains necessary properties to parse Dictionary
+        """
+        fromfile: dict = verify(value, dict, {})
+        self._dictionary = Dictionary(fromfile)
+
+        debug(f'Dictionary: {str(self.dictionary)}')
+
+    @property
+    def reserve_space(self) -> int:
+        """
+        :return: bytes left free at destination, backup stops before going below
+        """
+        return self._reserve_space
+
+    def _setReserveSpace(self, value) -> None:
+        """
+        Set how much space must stay free at destination while
+        writing. Backup is aborted and its partial file removed
+        as soon as free space drops below it.
+
+        :param value: an integer represents MiB
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'settings.reserve_space\' must be a positive number! Corrected to 0.')
+                fromfile = 0
+
+            self._reserve_space = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 64.')
+            self._reserve_space = 64 * 1024 * 1024
+
+        debug(f'Reserved space: {self.reserve_space} bytes')
+
+    @property
+    def checkpoint(self) -> int:
+        """
+        :return: bytes of files between two checkpoints, 0 if off
+        """
+        return self._checkpoint
+
+    def _setCheckpoint(self, value) -> None:
+        """
+        Set how often an interrupted backup can be resumed from.
+        Every time this much data went in, the archive is flushed
+        to disk and how far it got is written next to it.
+
+        :param value: an integer represents MiB (1024 at most), 0 turns it off
+        """
+        try:
+            fromfile: int = verify(value, int)
+
+            if fromfile < 0:
+                warn(f'\'settings.checkpoint\' must be a positive number! Corrected to 0.')
+                fromfile = 0
+            elif fromfile > 1024:
+                " Data between checkpoints must fit the frames of a seek table "
+                warn(f'Maximum checkpoint interval is 1024 MiB, got \'{fromfile}\'. Corrected to 1024')
+                fromfile = 1024
+
+            self._checkpoint = fromfile * 1024 * 1024
+
+        except TypeError:
+            warn(f'Unrecognized input \'{value}\'. Use default value: 0.')
+            self._checkpoint = 0
 
-    def __getitem__(self, item: str):
-        if not self.__exist__(item):
-            raise KeyError(f'\'{item}\' does NOT exist!')
-        return self._configuration[item]
+        debug(f'Checkpoint: every {self.checkpoint} bytes')
 
     def __str__(self) -> str:
         return (
             'Settings('
-            f'write_chunk={self.write_chunk},'
-            f'progress_bar={str(self.progress_bar)}'
+            f'write_chunk={self.write_chunk}, '
+            f'write_chunk_limits={self.write_chunk_limits}, '
+            f'progress_bar={str(self.progress_bar)}, '
+            f'scan_workers={self.scan_workers}, '
+            f'backend={self.backend}, '
+            f'verify={self.verify}, '
+            f'shards={self.shards}, '
+            f'read_ahead={str(self.read_ahead)}, '
+            f'read_order={self.read_order}, '
+            f'io_strategy={self.io_strategy}, '
+            f'io_threshold={self.io_threshold}, '
+            f'dictionary={str(self.dictionary)}, '
+            f'reserve_space={self.reserve_space}, '
+            f'checkpoint={self.checkpoint}'
             ')'
         )
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from functools import cache
+from glob import escape, glob
+from time import time
+from typing import Optional
+
+import zstandard as zstd
+
+from src import dir, logger
+from src.backup import BackupProfile
+from src.config import Configuration
+
+" Trained dictionaries live in 'destination/dictionaries', named after their source "
+FOLDER: str = 'dictionaries'
+EXTENSION: str = '.dict'
+
+" zstd can't train on fewer samples than this "
+MIN_SAMPLES: int = 8
+
+" A dictionary helps the start of each frame, archives compressed with one are cut into frames this small "
+FRAME_SIZE: int = 16 * 1024
+
+" Longest possible frame header, dictionary id is in there "
+_HEADER_SIZE: int = 18
+
+
+def source_key(include: list) -> str:
+    """
+    :param include: paths being backed up
+    :return: start of names of dictionaries trained on these paths
+    """
+    paths: list = sorted(dir.abspath(path) for path in include)
+    return hashlib.blake2b('\n'.join(paths).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def sample(entries: list, count: int, max_size: int) -> list:
+    """
+    Read small files spread evenly over 'entries'
+
+    :param entries: list of FileEntry
+    :param count: maximum number of samples
+    :param max_size: larger files are not sampled
+    :return: content of each sampled file
+    """
+    small: list = [entry for entry in entries if entry.isreg and 0 < entry.size <= max_size]
+    step: float = max(1.0, len(small) / count)
+
+    samples: list = []
+    position: float = 0.0
+    while int(position) < len(small):
+        try:
+            with open(small[int(position)].path, 'rb') as file:
+                samples.append(file.read(max_size))
+        except OSError:
+            " File may have disappeared since the scan "
+            pass
+        position += step
+
+    return samples
+
+
+def load(path: str) -> zstd.ZstdCompressionDict:
+    with open(path, 'rb') as file:
+        return zstd.ZstdCompressionDict(file.read())
+
+
+def _trained(folder: str, key: str) -> list:
+    """
+    :return: paths to dictionaries of source 'key', newest first
+    """
+    found: list = glob(os.path.join(escape(folder), key + '*' + EXTENSION))
+    return sorted(found, key=os.path.getmtime, reverse=True)
+
+
+def _train(profile: BackupProfile, config: Configuration, folder: str, key: str) -> Optional[zstd.ZstdCompressionDict]:
+    """
+    Train a dictionary on files of 'profile' and save it
+    in 'folder' under a name no other dictionary has.
+
+    :return: None if training failed
+    """
+    settings = config.settings.dictionary
+    samples: list = sample(profile.entries(), settings.samples, settings.sample_size)
+    if len(samples) < MIN_SAMPLES:
+        logger.warn(f'Only {len(samples)} small file(s) found, dictionary needs {MIN_SAMPLES}! Skipping...')
+        return None
+
+    try:
+        dict_data: zstd.ZstdCompressionDict = zstd.train_dictionary(settings.size, samples,
+                                                                    level=config.zstd_arguments.level)
+    except zstd.ZstdError as e:
+        logger.warn('Error while training dictionary! Skipping...')
+        logger.exception(e)
+        return None
+
+    path: str = os.path.join(folder, f'{key}-{dict_data.dict_id()}{EXTENSION}')
+    os.makedirs(folder, exist_ok=True)
+    temp: str = f'{path}.tmp'
+    with open(temp, 'wb') as file:
+        file.write(dict_data.as_bytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+    logger.info(f'Trained dictionary {dict_data.dict_id()} on {len(samples)} file(s), saved to {path}')
+    return dict_data
+
+
+def prepare(profile: BackupProfile, config: Configuration) -> Optional[zstd.ZstdCompressionDict]:
+    """
+    Dictionary of this source. Trained on files of 'profile'
+    the first time, then loaded from the destination, so
+    every backup of the same source shares it.
+
+    Once it's older than 'retrain' days, a new one is trained
+    and saved next to it. Older dictionaries are only deleted
+    when no backup needs them anymore (see 'prune').
+
+    :return: None if dictionaries are off or training failed
+    """
+    settings = config.settings.dictionary
+    if not settings.enabled:
+        return None
+
+    folder: str = os.path.join(profile.destination, FOLDER)
+    key: str = source_key(config.include)
+    existing: list = _trained(folder, key)
+
+    dict_data: Optional[zstd.ZstdCompressionDict] = None
+    if existing and settings.retrain and time() - os.path.getmtime(existing[0]) >= settings.retrain * 86400:
+        logger.info(f'{existing[0]} is older than {settings.retrain} day(s), training a new dictionary')
+        dict_data = _train(profile, config, folder, key)
+    elif not existing:
+        dict_data = _train(profile, config, folder, key)
+
+    " Training again failed, current one is still good "
+    if dict_data is None and existing:
+        dict_data = load(existing[0])
+        logger.info(f'Using dictionary {dict_data.dict_id()} from {existing[0]}')
+
+    if dict_data is not None:
+        prune(profile.destination, key, dict_data.dict_id())
+    return dict_data
+
+
+def prune(destination: str, key: str, current: int) -> None:
+    """
+    Delete dictionaries of source 'key' that no backup in
+    'destination' was compressed with, except 'current'.
+
+    Chunks can't tell their dictionary without being read,
+    so nothing is deleted next to a chunk store.
+
+    :param current: id of the dictionary in use
+    """
+    if os.path.isdir(os.path.join(destination, 'chunks')):
+        return
+
+    used: set = {current}
+    for archive in dir.scan_4_backup(destination):
+        with open(archive, 'rb') as file:
+            used.add(dict_id_of(file.read(_HEADER_SIZE)))
+
+    for path in _trained(os.path.join(destination, FOLDER), key):
+        if load(path).dict_id() not in used:
+            logger.info(f'No backup uses {path} anymore')
+            dir.delete(path)
+
+
+@cache
+def find(destination: str, dict_id: int) -> zstd.ZstdCompressionDict:
+    """
+    :param destination: folder holding backups
+    :param dict_id: id written in frame headers
+    :raise FileNotFoundError: if no dictionary in 'destination' has this id
+    """
+    folder: str = os.path.join(destination, FOLDER)
+    if os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(EXTENSION):
+                dict_data: zstd.ZstdCompressionDict = load(os.path.join(folder, name))
+                if dict_data.dict_id() == dict_id:
+                    return dict_data
+
+    raise FileNotFoundError(f'Dictionary {dict_id} not found in {folder}')
+
+
+def dict_id_of(data: bytes) -> int:
+    """
+    :param data: start of a zstd frame
+    :return: id of the dictionary it was compressed with, 0 if none
+    """
+    try:
+        return zstd.get_frame_parameters(data[:_HEADER_SIZE]).dict_id
+    except zstd.ZstdError:
+        return 0
+
+
+def for_archive(file) -> Optional[zstd.ZstdCompressionDict]:
+    """
+    Dictionary needed to decompress an archive, taken
+    from the header of its first frame.
+
+    :param file: archive opened in binary mode
+    :return: None if archive was compressed without one
+    :raise FileNotFoundError: if dictionary is missing from archive's folder
+    """
+    file.seek(0)
+    dict_id: int = dict_id_of(file.read(_HEADER_SIZE))
+    file.seek(0)
+    if not dict_id:
+        return None
+    return find(os.path.dirname(os.path.abspath(file.name)), dict_id)
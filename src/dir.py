@@ -1,13 +1,20 @@
 import ctypes
 import os
+from contextlib import contextmanager
 from enum import Enum
 from pathlib import Path
 from platform import system
 from re import match
 from shutil import rmtree
+from typing import Iterator
 
 from src import PROJECT_DIR, logger
 
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
 
 class ReturnCode(Enum):
     NOT_EXIST = 0
@@ -31,7 +38,8 @@ def folder_exist(path: str) -> ReturnCode:
 def scan_4_backup(destination: str) -> list:
     """
     Scan provided path, parse any file that matches
-    compressed file's format. Add it to a list and return
+    compressed file's (or chunk store snapshot's) format.
+    Add it to a list and return
     :param destination: directory to scan
     :return: a list of files matched format
     """
@@ -40,7 +48,7 @@ def scan_4_backup(destination: str) -> list:
         logger.warn(f'{destination} is not a directory!')
         return results
 
-    filepattern: str = r'\d{4}-\w{3}-\d{2} \d{2}-\d{2}-\d{6}.zstd'
+    filepattern: str = r'\d{4}-\w{3}-\d{2} \d{2}-\d{2}-\d{6}\.(zstd|snapshot)$'
     for file in os.listdir(destination):
         if match(filepattern, file):
             results.append(os.path.join(destination, file))
@@ -124,3 +132,70 @@ def abspath(path: str) -> str:
 
 def basename(path: str) -> str:
     return os.path.basename(path)
+
+
+def commit(temp: str, path: str) -> None:
+    """
+    Move a finished file over 'path' in one step, so
+    'path' is either missing or complete, never partial.
+    Directory entry is flushed too when the system allows.
+
+    :param temp: fully written (and synced) file, same folder as 'path'
+    :param path: final name
+    """
+    os.replace(temp, path)
+    if system() == 'Windows':
+        return
+
+    fd: int = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def lock(fd: int, wait: bool = True) -> bool:
+    """
+    Lock an open file against other processes,
+    until 'unlock' or the file is closed.
+
+    :param fd: file descriptor, positioned at its start on Windows
+    :param wait: wait for another process to release it, or give up at once
+    :return: whether the lock is held
+    """
+    try:
+        if os.name == 'nt':
+            msvcrt.locking(fd, msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        if wait:
+            raise
+        return False
+
+    return True
+
+
+def unlock(fd: int) -> None:
+    if os.name == 'nt':
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    Hold the lock of 'path' (created if missing), other processes wait.
+
+    :param path: a file of its own, never replaced or deleted
+    """
+    fd: int = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        lock(fd)
+        try:
+            yield
+        finally:
+            unlock(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,414 @@
+from __future__ import annotations
+
+import json
+import struct
+import tarfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import zstandard as zstd
+
+" https://github.com/facebook/zstd/blob/dev/contrib/seekable_format/zstd_seekable_compression_format.md "
+SEEK_TABLE_MAGIC: int = 0x184D2A5E
+SEEKABLE_MAGIC: int = 0x8F92EAB1
+" Skippable frame holding this program's metadata (member index, etc.) "
+METADATA_MAGIC: int = 0x184D2A5B
+METADATA_FOOTER: bytes = b'ZBKM'
+
+" Seek table keeps sizes as 32-bit numbers, frames of a seekable archive stay well below "
+MAX_FRAME_SIZE: int = 1 << 30
+
+" Largest window zstd allows, archives written with 'window_log' above 27 need it "
+MAX_WINDOW_SIZE: int = 1 << 31
+
+" Frame of stored data: no checksum nor content size, 128 KiB window, the largest block zstd allows "
+_STORED_HEADER: bytes = struct.pack('<IBB', 0xFD2FB528, 0, 7 << 3)
+_STORED_BLOCK: int = 128 * 1024
+
+_SKIPPABLE_HEADER = struct.Struct('<II')
+_SEEK_ENTRY = struct.Struct('<II')
+_SEEK_FOOTER = struct.Struct('<IBI')
+_METADATA_FOOTER = struct.Struct('<I4s')
+
+
+class Frame(NamedTuple):
+    """
+    Position of a zstd frame in both compressed
+    file and decompressed stream.
+    """
+    offset: int
+    size: int
+    data_offset: int
+    data_size: int
+
+
+class FrameWriter:
+    """
+    Sits between tar and zstd compressor.
+    Ends the current zstd frame every time 'frame_size'
+    bytes of data went through it, so each frame can be
+    decompressed on its own. Position of every frame
+    is kept to build a seek table afterward.
+    """
+
+    def __init__(self, cctx: zstd.ZstdCompressor, file, frame_size: int = 0) -> None:
+        """
+        :param cctx: compressor used for every frame
+        :param file: binary file to write compressed data into
+        :param frame_size: bytes of data per frame, 0 writes a single frame
+        """
+        self._file = file
+        self._cctx: zstd.ZstdCompressor = cctx
+        self._writer = cctx.stream_writer(file, closefd=False)
+        self.frame_size: int = frame_size
+        self.frames: list = []
+        " Compressed bytes written by previous compressors "
+        self._base: int = 0
+        self._frame_start: int = 0
+        self._data_start: int = 0
+        self._data: int = 0
+
+    def write(self, data) -> int:
+        self._writer.write(data)
+        self._data += len(data)
+
+        if self.frame_size and self._data - self._data_start >= self.frame_size:
+            self.end_frame()
+
+        return len(data)
+
+    def end_frame(self) -> None:
+        """
+        Finish current frame. Nothing happens if it's empty.
+        """
+        if self._data == self._data_start:
+            return
+
+        self._writer.flush(zstd.FLUSH_FRAME)
+        end: int = self._base + self._writer.tell()
+        self.frames.append(Frame(self._frame_start, end - self._frame_start, self._data_start, self._data - self._data_start))
+
+        self._frame_start = end
+        self._data_start = self._data
+
+    def use(self, cctx: zstd.ZstdCompressor) -> None:
+        """
+        Compress upcoming data with 'cctx' (another level, for instance).
+        Current frame is finished first, a frame has a single compressor.
+        """
+        if cctx is self._cctx:
+            return
+
+        self.end_frame()
+        self._base = self._frame_start
+        self._cctx = cctx
+        self._writer = cctx.stream_writer(self._file, closefd=False)
+
+    def resume(self, frames: list, size: int, data: int) -> None:
+        """
+        Carry on after 'frames' that were written by an earlier,
+        interrupted run. File must be positioned at 'size'.
+
+        :param frames: list of Frame already in the file
+        :param size: compressed bytes they take
+        :param data: (uncompressed) bytes they hold
+        """
+        self.frames = list(frames)
+        self._base = self._frame_start = size
+        self._data_start = self._data = data
+
+    def flush(self, flush_mode: int = zstd.FLUSH_BLOCK) -> None:
+        if flush_mode == zstd.FLUSH_FRAME:
+            self.end_frame()
+        else:
+            self._writer.flush(flush_mode)
+
+    def tell(self) -> int:
+        """
+        :return: number of (uncompressed) bytes written so far
+        """
+        return self._data
+
+
+class _StoredWriter:
+    """
+    Same interface as zstd's stream writer. Each frame is
+    a header followed by raw blocks, data as it is.
+    """
+
+    def __init__(self, file) -> None:
+        self._file = file
+        self._block: bytearray = bytearray()
+        self._started: bool = False
+        self._written: int = 0
+
+    def _out(self, data) -> None:
+        self._file.write(data)
+        self._written += len(data)
+
+    def _out_block(self, last: bool) -> None:
+        self._out((len(self._block) << 3 | last).to_bytes(3, 'little'))
+        self._out(self._block)
+        self._block = bytearray()
+
+    def write(self, data) -> int:
+        if not self._started:
+            self._out(_STORED_HEADER)
+            self._started = True
+
+        view = memoryview(data).cast('B')
+        while view:
+            " Last block of a frame is flagged, so a full block waits for the next byte or the end of frame "
+            if len(self._block) == _STORED_BLOCK:
+                self._out_block(False)
+            taken: int = _STORED_BLOCK - len(self._block)
+            self._block += view[:taken]
+            view = view[taken:]
+        return len(data)
+
+    def flush(self, flush_mode: int = zstd.FLUSH_BLOCK) -> None:
+        if not self._started:
+            return
+
+        if flush_mode == zstd.FLUSH_FRAME:
+            self._out_block(True)
+            self._started = False
+        elif self._block:
+            self._out_block(False)
+
+    def tell(self) -> int:
+        """
+        :return: number of (compressed) bytes written so far
+        """
+        return self._written
+
+
+class StoredFrames:
+    """
+    Stands in for a compressor (see 'FrameWriter.use') where
+    data is stored: frames of raw blocks, no time is spent
+    compressing and any zstd decoder reads them.
+    """
+
+    def stream_writer(self, file, closefd: bool = False) -> _StoredWriter:
+        return _StoredWriter(file)
+
+
+def _write_skippable(file, magic: int, payload: bytes) -> None:
+    file.write(_SKIPPABLE_HEADER.pack(magic, len(payload)))
+    file.write(payload)
+
+
+def write_seek_table(file, frames: list) -> None:
+    """
+    Append a seek table (zstd seekable format, without checksums)
+    so readers can find any frame without decompressing others.
+
+    :param file: binary file, positioned after the last frame
+    :param frames: list of Frame from FrameWriter
+    """
+    entries: bytes = b''.join(_SEEK_ENTRY.pack(frame.size, frame.data_size) for frame in frames)
+    _write_skippable(file, SEEK_TABLE_MAGIC, entries + _SEEK_FOOTER.pack(len(frames), 0, SEEKABLE_MAGIC))
+
+
+def read_seek_table(file) -> Optional[list]:
+    """
+    :param file: seekable binary file
+    :return: list of Frame or None if file has no seek table
+    """
+    file.seek(0, 2)
+    end: int = file.tell()
+    if end < _SEEK_FOOTER.size:
+        return None
+
+    file.seek(end - _SEEK_FOOTER.size)
+    count, descriptor, magic = _SEEK_FOOTER.unpack(file.read(_SEEK_FOOTER.size))
+    if magic != SEEKABLE_MAGIC:
+        return None
+
+    " Bit 7 of descriptor tells whether each entry has a 4-byte checksum "
+    entry_size: int = _SEEK_ENTRY.size + (4 if descriptor & 0x80 else 0)
+    file.seek(end - _SEEK_FOOTER.size - count * entry_size)
+    table: bytes = file.read(count * entry_size)
+
+    frames: list = []
+    offset: int = 0
+    data_offset: int = 0
+    for i in range(count):
+        size, data_size = _SEEK_ENTRY.unpack_from(table, i * entry_size)
+        frames.append(Frame(offset, size, data_offset, data_size))
+        offset += size
+        data_offset += data_size
+
+    return frames
+
+
+def _seek_table_start(file) -> int:
+    """
+    :return: offset where the seek table frame starts, or file's size without one
+    """
+    frames: Optional[list] = read_seek_table(file)
+    file.seek(0, 2)
+    end: int = file.tell()
+    if frames is None:
+        return end
+
+    entry_size: int = _SEEK_ENTRY.size
+    file.seek(end - _SEEK_FOOTER.size)
+    count, descriptor, magic = _SEEK_FOOTER.unpack(file.read(_SEEK_FOOTER.size))
+    if descriptor & 0x80:
+        entry_size += 4
+
+    return end - _SEEK_FOOTER.size - count * entry_size - _SKIPPABLE_HEADER.size
+
+
+def write_metadata(file, metadata: dict) -> None:
+    """
+    Append a skippable frame holding 'metadata' as compressed JSON.
+    zstd (and tar) ignore it, this program finds it from the end
+    of the file (before the seek table, if any).
+
+    :param file: binary file, positioned after the last frame
+    :param metadata: anything JSON can store
+    """
+    data: bytes = zstd.ZstdCompressor().compress(json.dumps(metadata).encode('utf-8'))
+    _write_skippable(file, METADATA_MAGIC, data + _METADATA_FOOTER.pack(len(data), METADATA_FOOTER))
+
+
+def read_metadata(file) -> dict:
+    """
+    :param file: seekable binary file
+    :return: metadata written by 'write_metadata', empty if there's none
+    """
+    end: int = _seek_table_start(file)
+    if end < _METADATA_FOOTER.size:
+        return {}
+
+    file.seek(end - _METADATA_FOOTER.size)
+    size, footer = _METADATA_FOOTER.unpack(file.read(_METADATA_FOOTER.size))
+    if footer != METADATA_FOOTER:
+        return {}
+
+    file.seek(end - _METADATA_FOOTER.size - size)
+    return json.loads(zstd.ZstdDecompressor().decompress(file.read(size)))
+
+
+class FrameReader:
+    """
+    Readable stream of decompressed data starting at any
+    offset. Only frames from that offset onward are read.
+
+    With more than 1 worker, upcoming frames are decompressed
+    in parallel. At most 2 frames per worker are held in memory.
+    """
+
+    def __init__(self, file, frames: list, offset: int = 0, workers: int = 1,
+                 dict_data: Optional[zstd.ZstdCompressionDict] = None) -> None:
+        """
+        :param file: seekable binary file
+        :param frames: seek table of 'file'
+        :param offset: position in decompressed stream to start from
+        :param workers: number of threads decompressing frames
+        :param dict_data: dictionary frames were compressed with
+        """
+        self._file = file
+        self._frames: list = frames
+        self._dict_data: Optional[zstd.ZstdCompressionDict] = dict_data
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: deque = deque()
+        self._window: int = 2 * workers
+        if workers > 1:
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix='frames')
+
+        self._buffer: memoryview = memoryview(b'')
+        self.decompressed: int = 0
+
+        " Skip frames that end before 'offset' "
+        self._index: int = 0
+        while self._index < len(frames) and frames[self._index].data_offset + frames[self._index].data_size <= offset:
+            self._index += 1
+        if self._index < len(frames):
+            skip: int = offset - frames[self._index].data_offset
+            self._next_frame()
+            self._buffer = self._buffer[skip:]
+
+    def _load(self, frame: Frame) -> bytes:
+        " Decompressor objects can't be shared between threads "
+        dctx: Optional[zstd.ZstdDecompressor] = getattr(self._local, 'dctx', None)
+        if dctx is None:
+            dctx = self._local.dctx = zstd.ZstdDecompressor(dict_data=self._dict_data, max_window_size=MAX_WINDOW_SIZE)
+
+        with self._lock:
+            self._file.seek(frame.offset)
+            data: bytes = self._file.read(frame.size)
+
+        data = dctx.decompress(data, max_output_size=frame.data_size)
+        if len(data) != frame.data_size:
+            raise zstd.ZstdError(f'Frame at {frame.offset} has {len(data)} bytes, seek table says {frame.data_size}')
+        return data
+
+    def _next_frame(self) -> bool:
+        if self._executor is None:
+            if self._index >= len(self._frames):
+                return False
+            self._buffer = memoryview(self._load(self._frames[self._index]))
+            self._index += 1
+        else:
+            while len(self._pending) < self._window and self._index < len(self._frames):
+                self._pending.append(self._executor.submit(self._load, self._frames[self._index]))
+                self._index += 1
+            if not self._pending:
+                return False
+            self._buffer = memoryview(self._pending.popleft().result())
+
+        self.decompressed += 1
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        chunks: list = []
+        while size != 0:
+            if not self._buffer and not self._next_frame():
+                break
+
+            taken: memoryview = self._buffer if size < 0 else self._buffer[:size]
+            self._buffer = self._buffer[len(taken):]
+            chunks.append(bytes(taken))
+            if size > 0:
+                size -= len(taken)
+
+        return b''.join(chunks)
+
+    def close(self) -> None:
+        """
+        Stop decompressing frames that were read ahead
+        """
+        if self._executor is not None:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown()
+            self._pending.clear()
+
+    def __enter__(self) -> FrameReader:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def open_member(file, frames: list, offset: int, dict_data: Optional[zstd.ZstdCompressionDict] = None) -> tuple:
+    """
+    Read a single tar member without touching frames before it.
+
+    :param file: seekable binary file of the archive
+    :param frames: seek table of 'file'
+    :param offset: where member's header starts in decompressed stream
+    :param dict_data: dictionary frames were compressed with
+    :return: TarInfo of the member and a readable stream of its data
+    """
+    tar: tarfile.TarFile = tarfile.open(fileobj=FrameReader(file, frames, offset, 1, dict_data), mode='r|')
+    member: tarfile.TarInfo = tar.next()
+    return member, tar.extractfile(member)
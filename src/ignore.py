@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import os
+import re
+from copy import copy
+from typing import Iterable, NamedTuple, Optional
+
+from src import dir, logger
+
+" Marks the last component of an ignored path "
+_END: str = ''
+
+
+def _split(path: str) -> list:
+    """
+    :param path: absolute path
+    :return: components of normalized path, e.g. ['/', 'a', 'b']
+    """
+    drive, tail = os.path.splitdrive(os.path.normpath(path))
+    return [drive + os.sep] + [part for part in tail.split(os.sep) if part]
+
+
+class PathTrie:
+    """
+    Ignored paths stored as a tree of path components.
+    Lookup cost depends on the depth of the path,
+    not on how many paths are ignored.
+
+    Matching is done per component, so ignoring
+    '/a/b' ignores '/a/b/c' but not '/a/bc'.
+    """
+
+    def __init__(self, paths: Iterable[str] = ()) -> None:
+        self._root: dict = {}
+        for path in paths:
+            self.add(path)
+
+    def add(self, path: str) -> None:
+        """
+        :param path: absolute path to ignore (with everything inside)
+        """
+        node: dict = self._root
+        for part in _split(path):
+            node = node.setdefault(part, {})
+        node[_END] = {}
+
+    def match(self, path: str) -> bool:
+        """
+        :param path: absolute path to file or folder
+        :return: True if 'path' or one of its parents is ignored
+        """
+        node: dict = self._root
+        for part in _split(path):
+            if _END in node:
+                return True
+            node = node.get(part)
+            if node is None:
+                return False
+
+        return _END in node
+
+    def __len__(self) -> int:
+        def _count(node: dict) -> int:
+            return sum(1 if key == _END else _count(child) for key, child in node.items())
+
+        return _count(self._root)
+
+
+class _Rule(NamedTuple):
+    regex: str
+    negate: bool
+    dir_only: bool
+
+
+def is_pattern(rule: str) -> bool:
+    """
+    :param rule: an entry of 'ignore' from config.yml
+    :return: True if 'rule' is a glob pattern rather than a literal path
+    """
+    return rule.startswith('!') or any(c in rule for c in '*?[')
+
+
+def translate(glob: str) -> str:
+    """
+    Convert a gitignore-style glob into a regular expression.
+
+    '*' and '?' never match '/', '**/' matches any
+    number of folders and a trailing '**' matches everything.
+
+    :param glob: pattern with '/' as separator
+    :return: regular expression (without anchors)
+    """
+    i: int = 0
+    result: list = []
+
+    while i < len(glob):
+        c: str = glob[i]
+
+        if glob.startswith('**/', i):
+            result.append('(?:.*/)?')
+            i += 3
+            continue
+        elif glob.startswith('**', i):
+            result.append('.*')
+            i += 2
+            continue
+        elif c == '*':
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[' and glob.find(']', i + 2) != -1:
+            " ']' right after '[' (or '[!') is part of the set "
+            end: int = glob.find(']', i + 2)
+            body: str = glob[i + 1:end]
+            if body[0] in '!^':
+                body = '^' + body[1:]
+            result.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+            continue
+        elif c == '\\' and i + 1 < len(glob):
+            result.append(re.escape(glob[i + 1]))
+            i += 2
+            continue
+        else:
+            result.append(re.escape(c))
+
+        i += 1
+
+    return ''.join(result)
+
+
+def _parse(pattern: str, base: str) -> _Rule:
+    """
+    :param pattern: gitignore-style pattern
+    :param base:
+        Folder (with '/' as separator) that anchored patterns
+        are relative to. Empty string for config.yml patterns,
+        which are only anchored when written as absolute paths.
+    :return: parsed rule
+    """
+    negate: bool = pattern.startswith('!')
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith('\\!') or pattern.startswith('\\#'):
+        pattern = pattern[1:]
+
+    dir_only: bool = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+
+    if not base and (os.path.isabs(pattern) or pattern.startswith('~/') or pattern.startswith('./')):
+        " Absolute pattern from config.yml, anchored at filesystem's root "
+        prefix: str = ''
+        pattern = dir.abspath(pattern).replace(os.sep, '/')
+    elif base and '/' in pattern:
+        " Pattern with a slash only matches relative to its .backupignore "
+        prefix: str = re.escape(base.rstrip('/') + '/')
+        pattern = pattern.lstrip('/')
+    else:
+        " Pattern without a slash matches at any depth "
+        prefix: str = (re.escape(base.rstrip('/') + '/') if base else '') + '(?:.*/)?'
+        pattern = pattern.lstrip('/')
+
+    return _Rule(prefix + translate(pattern), negate, dir_only)
+
+
+def _compile(rules: list) -> Optional[re.Pattern]:
+    """
+    Combine rules into a single regular expression.
+    Rules are joined in reverse, so the first alternative
+    that matches is the last rule written (gitignore semantic).
+
+    :param rules: list of _Rule
+    :return: compiled expression, each rule is a capturing group
+    """
+    if not rules:
+        return None
+    return re.compile('|'.join(f'({rule.regex})' for rule in reversed(rules)))
+
+
+class IgnoreMatcher:
+    """
+    Decides whether a path is skipped by the scanner.
+
+    Literal paths are stored in a PathTrie, glob patterns
+    from config.yml and from per-folder ignore files are
+    compiled into one regular expression per folder
+    that has its own ignore file.
+    """
+
+    def __init__(self, paths: Iterable[str] = (), patterns: Iterable[str] = (), ignore_file: str = '') -> None:
+        self.ignore_file: str = ignore_file
+        self._trie: PathTrie = PathTrie(paths)
+        self._rules: list = [_parse(pattern, '') for pattern in patterns]
+        self._build()
+
+    def _build(self) -> None:
+        " Directories are matched by every rule, files skip the ones ending with '/' "
+        self._dirs: Optional[re.Pattern] = _compile(self._rules)
+        self._dir_rules: list = list(reversed(self._rules))
+
+        file_rules: list = [rule for rule in self._rules if not rule.dir_only]
+        self._files: Optional[re.Pattern] = _compile(file_rules)
+        self._file_rules: list = list(reversed(file_rules))
+
+    def match(self, path: str, is_dir: bool = False) -> bool:
+        """
+        :param path: absolute path to file or folder
+        :param is_dir: whether 'path' is a folder
+        :return: True if 'path' must be skipped
+        """
+        if self._trie.match(path):
+            return True
+
+        regex, rules = (self._dirs, self._dir_rules) if is_dir else (self._files, self._file_rules)
+        if regex is None:
+            return False
+
+        found: Optional[re.Match] = regex.fullmatch(path.replace(os.sep, '/'))
+        return found is not None and not rules[found.lastindex - 1].negate
+
+    def enter(self, path: str, entries: list) -> IgnoreMatcher:
+        """
+        Called by the scanner before it looks at 'entries'.
+        If the folder has an ignore file, its rules are added
+        on top of the current ones for this folder and below.
+
+        :param path: absolute path to the folder
+        :param entries: os.DirEntry of everything inside the folder
+        :return: matcher to use inside this folder
+        """
+        if not self.ignore_file:
+            return self
+
+        for entry in entries:
+            if entry.name == self.ignore_file and entry.is_file():
+                return self._extend(path, entry.path)
+
+        return self
+
+    def _extend(self, folder: str, filepath: str) -> IgnoreMatcher:
+        try:
+            with open(filepath, 'r', encoding='utf-8') as file:
+                lines: list = file.read().splitlines()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warn(f'Error while reading {filepath}! Skipping...')
+            logger.exception(e)
+            return self
+
+        base: str = folder.replace(os.sep, '/')
+        rules: list = [_parse(line.strip(), base) for line in lines if line.strip() and not line.startswith('#')]
+        logger.debug(f'Loaded {len(rules)} rule(s) from {filepath}')
+
+        matcher: IgnoreMatcher = copy(self)
+        matcher._rules = self._rules + rules
+        matcher._build()
+        return matcher
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+from typing import Optional
+
+import zstandard as zstd
+
+from src import logger
+from src.scanner import FileEntry
+
+" Backup of 'YYYY-Mon-DD HH-MM-ffffff.zstd' has its manifest saved as 'YYYY-Mon-DD HH-MM-ffffff.manifest' "
+EXTENSION: str = '.manifest'
+
+FULL: str = 'full'
+INCREMENTAL: str = 'incremental'
+
+
+class Manifest:
+    """
+    State of every file at the time a backup was made.
+
+    Saved next to the backup as zstd compressed JSON lines.
+    First line is the header (kind, base and deleted paths),
+    every following line is '[path, size, mtime, inode, hash]'.
+    """
+
+    def __init__(self, kind: str = FULL, base: str = '', files: dict = None, deleted: list = None) -> None:
+        """
+        :param kind: FULL or INCREMENTAL
+        :param base: file name of the backup this one builds upon, empty for full backups
+        :param files: path -> [size, mtime, inode, hash] of every file, archived or not
+        :param deleted: paths that existed in 'base' but no longer exist
+        """
+        self.kind: str = kind
+        self.base: str = base
+        self.files: dict = {} if files is None else files
+        self.deleted: list = [] if deleted is None else deleted
+
+    def changed(self, entries: dict) -> set:
+        """
+        :param entries: path -> FileEntry from the scanner
+        :return: paths that are new or whose size, mtime or inode differ
+        """
+        result = set()
+        for path, entry in entries.items():
+            known: Optional[list] = self.files.get(path)
+            if known is None or known[:3] != [entry.size, entry.mtime, entry.inode]:
+                result.add(path)
+
+        return result
+
+    def removed(self, entries: dict) -> list:
+        """
+        :param entries: path -> FileEntry from the scanner
+        :return: paths known by this manifest that are gone
+        """
+        return [path for path in self.files if path not in entries]
+
+    def save(self, archive: str) -> None:
+        """
+        Write this manifest next to 'archive'.
+        Data goes to a temporary file first, so a crash
+        never leaves a truncated manifest behind.
+
+        :param archive: path to the backup this manifest describes
+        """
+        filepath: str = path_of(archive)
+        temp: str = f'{filepath}.tmp'
+
+        with open(temp, 'wb') as file:
+            with zstd.ZstdCompressor().stream_writer(file) as writer:
+                text = io.TextIOWrapper(writer, encoding='utf-8')
+                header: dict = {'kind': self.kind, 'base': self.base, 'deleted': self.deleted}
+                text.write(json.dumps(header) + '\n')
+                for path, info in self.files.items():
+                    text.write(json.dumps([path, *info]) + '\n')
+                text.flush()
+
+        os.replace(temp, filepath)
+        logger.debug(f'Saved manifest of {len(self.files)} file(s) to {filepath}')
+
+    @classmethod
+    def load(cls, archive: str, header_only: bool = False) -> Optional[Manifest]:
+        """
+        :param archive: path to a backup
+        :param header_only: skip reading files (much faster for large backups)
+        :return: manifest of 'archive' or None if it has none
+        """
+        filepath: str = path_of(archive)
+        if not os.path.isfile(filepath):
+            return None
+
+        try:
+            with open(filepath, 'rb') as file:
+                reader = zstd.ZstdDecompressor().stream_reader(file)
+                text = io.TextIOWrapper(reader, encoding='utf-8')
+
+                header: dict = json.loads(text.readline())
+                manifest = cls(header['kind'], header['base'], deleted=header['deleted'])
+                if not header_only:
+                    for line in text:
+                        path, *info = json.loads(line)
+                        manifest.files[path] = info
+
+                return manifest
+        except (OSError, ValueError, KeyError, zstd.ZstdError) as e:
+            logger.warn(f'Error while reading {filepath}! Skipping...')
+            logger.exception(e)
+            return None
+
+
+def path_of(archive: str) -> str:
+    """
+    :param archive: path to a backup
+    :return: path to its manifest
+    """
+    return os.path.splitext(archive)[0] + EXTENSION
+
+
+def entry_info(entry: FileEntry, digest: Optional[str]) -> list:
+    """
+    :param entry: file from the scanner
+    :param digest: hash of file's content
+    :return: what a manifest stores about 'entry'
+    """
+    return [entry.size, entry.mtime, entry.inode, digest]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import os
+import struct
+import sys
+
+from src import logger
+from src.scanner import FileEntry
+
+ORDERS: tuple = ('path', 'inode', 'extent')
+
+" Linux ioctl returning physical location of a file's extents (linux/fiemap.h) "
+_FS_IOC_FIEMAP: int = 0xC020660B
+" struct fiemap (32 bytes) followed by one struct fiemap_extent (56 bytes) "
+_FIEMAP = struct.Struct('=QQIIII')
+_EXTENT = struct.Struct('=QQQ16xI12x')
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def physical_offset(entry: FileEntry) -> int:
+    """
+    :param entry: regular file
+    :return: where the file's first extent starts on disk, -1 if unknown
+    """
+    if fcntl is None or not sys.platform.startswith('linux') or not entry.isreg or not entry.size:
+        return -1
+
+    request: bytearray = bytearray(_FIEMAP.pack(0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0) + bytes(_EXTENT.size))
+    try:
+        fd: int = os.open(entry.path, os.O_RDONLY)
+        try:
+            fcntl.ioctl(fd, _FS_IOC_FIEMAP, request)
+        finally:
+            os.close(fd)
+    except OSError:
+        " File system without FIEMAP (tmpfs, network shares...) "
+        return -1
+
+    if not _FIEMAP.unpack_from(request)[3]:
+        return -1
+    return _EXTENT.unpack_from(request, _FIEMAP.size)[1]
+
+
+def order(entries: list, how: str = 'path') -> list:
+    """
+    Sort entries in the order they will be read.
+
+    'path': by path, every folder's files stay together
+    'inode': by device and inode, close to creation order on most file systems
+    'extent': by physical location on disk (Linux FIEMAP),
+              files without known location keep inode order
+
+    :param entries: list of FileEntry sorted by path
+    :param how: one of ORDERS
+    :return: sorted entries
+    """
+    if how == 'inode':
+        return sorted(entries, key=lambda x: (x.dev, x.inode))
+
+    if how == 'extent':
+        keys: dict = {entry.path: physical_offset(entry) for entry in entries}
+        known: int = sum(1 for offset in keys.values() if offset >= 0)
+        logger.debug(f'Physical location of {known} out of {len(entries)} file(s) found')
+        return sorted(entries, key=lambda x: (x.dev, keys[x.path] < 0, keys[x.path], x.inode))
+
+    return entries
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import math
+import os
+from collections import Counter
+from typing import Callable, Union
+
+import zstandard as zstd
+
+from src import logger
+from src.config.CompressionPolicy import CompressionPolicy
+from src.frames import StoredFrames
+from src.scanner import FileEntry
+
+" Not a zstd level, files are stored as they are (see 'frames.StoredFrames') "
+STORE: int = -(1 << 17)
+
+" Bytes read from the start of a file to guess its type "
+SAMPLE_SIZE: int = 4 * 1024
+" Smaller files are not sampled, they cost little to compress anyway "
+SNIFF_MIN: int = 64 * 1024
+
+" Signatures (offset, bytes) of formats that are compressed already "
+_MAGIC: tuple = (
+    (0, b'\xff\xd8\xff'),               # JPEG
+    (0, b'\x89PNG\r\n\x1a\n'),          # PNG
+    (0, b'GIF8'),                       # GIF
+    (8, b'WEBP'),                       # WebP
+    (4, b'ftyp'),                       # MP4, MOV, HEIC, AVIF
+    (0, b'\x1a\x45\xdf\xa3'),           # Matroska, WebM
+    (0, b'ID3'),                        # MP3
+    (0, b'OggS'),                       # Ogg
+    (0, b'fLaC'),                       # FLAC
+    (0, b'PK\x03\x04'),                 # ZIP, JAR, Office documents
+    (0, b'\x1f\x8b'),                   # gzip
+    (0, b'\x28\xb5\x2f\xfd'),           # zstd
+    (0, b'\xfd7zXZ\x00'),               # xz
+    (0, b'BZh'),                        # bzip2
+    (0, b'7z\xbc\xaf\x27\x1c'),         # 7-Zip
+    (0, b'Rar!\x1a\x07'),               # RAR
+    (0, b'\x04\x22\x4d\x18'),           # LZ4
+)
+
+
+def entropy(data: bytes) -> float:
+    """
+    :return: Shannon entropy of 'data' in bits per byte (0 to 8)
+    """
+    if not data:
+        return 0.0
+
+    total: int = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def is_compressed(data: bytes) -> bool:
+    """
+    :param data: first bytes of a file
+    :return: True if they start like a compressed format
+    """
+    return any(data[offset:offset + len(magic)] == magic for offset, magic in _MAGIC)
+
+
+class Policy:
+    """
+    Picks the compression level of each file.
+
+    In order: level set for its extension, stored if its
+    extension is known to be compressed, stored if its first
+    bytes look like a compressed format or are too random.
+    Everything else gets the default level.
+
+    Levels can only change between zstd frames, so files are
+    grouped by level and each group is compressed on its own.
+    """
+
+    def __init__(self, settings: CompressionPolicy, level: int,
+                 new_compressor: Callable[[int], zstd.ZstdCompressor]) -> None:
+        """
+        :param settings: policy from 'arguments.policy'
+        :param level: default level
+        :param new_compressor: builds a compressor of the given level
+        """
+        self.settings: CompressionPolicy = settings
+        self.level: int = level
+        self._new_compressor: Callable[[int], zstd.ZstdCompressor] = new_compressor
+        self._compressors: dict = {}
+        self._levels: dict = {}
+
+    def _sniff(self, entry: FileEntry) -> int:
+        try:
+            with open(entry.path, 'rb') as file:
+                data: bytes = file.read(SAMPLE_SIZE)
+        except OSError:
+            " Reported later, when the file is archived "
+            return self.level
+
+        if is_compressed(data) or entropy(data) >= self.settings.entropy:
+            return STORE
+        return self.level
+
+    def level_of(self, entry: FileEntry) -> int:
+        """
+        :return: compression level of 'entry', STORE for no compression
+        """
+        level = self._levels.get(entry.path)
+        if level is not None:
+            return level
+
+        ext: str = os.path.splitext(entry.path)[1].lower().lstrip('.')
+        if ext in self.settings.levels:
+            level = self.settings.levels[ext]
+            level = STORE if level == 'store' else level
+        elif ext in self.settings.store:
+            level = STORE
+        elif self.settings.sniff and entry.isreg and entry.size >= SNIFF_MIN:
+            level = self._sniff(entry)
+        else:
+            level = self.level
+
+        self._levels[entry.path] = level
+        return level
+
+    def group(self, entries: list) -> list:
+        """
+        :param entries: list of FileEntry
+        :return: same entries, files of a level next to each other,
+                 order within each level is kept
+        """
+        groups: dict = {}
+        for entry in entries:
+            groups.setdefault(self.level_of(entry), []).append(entry)
+
+        for level, files in groups.items():
+            name: str = 'store' if level == STORE else f'level {level}'
+            logger.debug(f'{len(files)} file(s) at {name}, {sum(entry.size for entry in files)} bytes')
+
+        return [entry for files in groups.values() for entry in files]
+
+    def compressor(self, entry: FileEntry) -> Union[zstd.ZstdCompressor, StoredFrames]:
+        """
+        :return: compressor of the level picked for 'entry', one per level
+        """
+        level: int = self.level_of(entry)
+        if level not in self._compressors:
+            self._compressors[level] = StoredFrames() if level == STORE else self._new_compressor(level)
+        return self._compressors[level]
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+
+from src.scanner import FileEntry
+
+" Blocks smaller than this cost more in overhead than they save "
+MIN_BLOCK: int = 64 * 1024
+
+
+class _Part(NamedTuple):
+    """
+    A piece of a file and where it goes in a block
+    """
+    entry: FileEntry
+    offset: int
+    length: int
+    position: int
+
+
+def _plan(entries: list, block_size: int) -> Iterator[list]:
+    """
+    Split files into blocks. Files smaller than a block
+    are packed together, so a single task reads all of them.
+
+    :return: parts of each block
+    """
+    batch: list = []
+    used: int = 0
+
+    for entry in entries:
+        if not entry.isreg or not entry.size:
+            continue
+
+        if entry.size < block_size:
+            if used + entry.size > block_size:
+                yield batch
+                batch, used = [], 0
+            batch.append(_Part(entry, 0, entry.size, used))
+            used += entry.size
+            continue
+
+        " Keep order, small files read so far go first "
+        if batch:
+            yield batch
+            batch, used = [], 0
+
+        for offset in range(0, entry.size, block_size):
+            yield [_Part(entry, offset, min(block_size, entry.size - offset), 0)]
+
+    if batch:
+        yield batch
+
+
+def _read_part(part: _Part, view: memoryview) -> None:
+    with open(part.entry.path, 'rb', buffering=0) as file:
+        file.seek(part.offset)
+        read: int = 0
+        while read < part.length:
+            n: int = file.readinto(view[read:])
+            if not n:
+                " Same error 'tar.addfile' raises "
+                raise OSError(f'unexpected end of data: {part.entry.path}')
+            read += n
+
+
+def _read_block(parts: list, buffer: bytearray) -> dict:
+    """
+    Fill 'buffer' with every part of a block.
+    Runs in a reader thread.
+
+    :return: index of part -> error, for parts that couldn't be read
+    """
+    errors: dict = {}
+    view: memoryview = memoryview(buffer)
+
+    for i, part in enumerate(parts):
+        try:
+            _read_part(part, view[part.position:part.position + part.length])
+        except OSError as e:
+            errors[i] = e
+
+    return errors
+
+
+class Prefetcher:
+    """
+    Reads files ahead of the compressor.
+
+    Regular files are split into blocks (small files share one),
+    reader threads fill blocks of upcoming files while the
+    compressor consumes the current one. Blocks live in a fixed
+    pool of 'depth' + 1 buffers that are reused, so memory use
+    never exceeds 'memory' no matter how large the files are.
+    """
+
+    def __init__(self, entries: list, workers: int = 4, depth: int = 16, memory: int = 64 * 1024 * 1024) -> None:
+        """
+        :param entries: list of FileEntry, in the order they're consumed
+        :param workers: number of reader threads
+        :param depth: number of blocks read ahead
+        :param memory: bytes of all buffers together
+        """
+        self.block_size: int = max(MIN_BLOCK, memory // (depth + 1))
+        self._depth: int = depth
+        self._tasks: Iterator[list] = _plan(entries, self.block_size)
+        " One buffer more than blocks in flight, held by the compressor "
+        self._free: list = [bytearray(self.block_size) for _ in range(depth + 1)]
+        self._pending: deque = deque()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='prefetch')
+
+        " Block being consumed "
+        self._buffer: Optional[bytearray] = None
+        self._parts: deque = deque()
+        self._errors: dict = {}
+        self._index: int = 0
+        self._unfinished: int = 0
+
+        self._fill()
+
+    def _fill(self) -> None:
+        while len(self._pending) < self._depth and self._free:
+            parts: Optional[list] = next(self._tasks, None)
+            if parts is None:
+                break
+
+            buffer: bytearray = self._free.pop()
+            self._pending.append((parts, buffer, self._executor.submit(_read_block, parts, buffer)))
+
+    def next_part(self, entry: FileEntry) -> memoryview:
+        """
+        :param entry: file being read, parts must be requested in order
+        :return: data of the next part of 'entry'
+        """
+        if not self._parts:
+            parts, self._buffer, future = self._pending.popleft()
+            self._parts = deque(parts)
+            self._unfinished = len(parts)
+            self._index = 0
+            self._errors = future.result()
+
+        part: _Part = self._parts.popleft()
+        assert part.entry is entry, f'{entry.path} was read out of order'
+
+        error: Optional[OSError] = self._errors.get(self._index)
+        self._index += 1
+        if error is not None:
+            self.done_part()
+            raise error
+
+        return memoryview(self._buffer)[part.position:part.position + part.length]
+
+    def done_part(self) -> None:
+        """
+        Part returned by 'next_part' is no longer used.
+        Block goes back to the pool once all of its parts are done.
+        """
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._free.append(self._buffer)
+            self._buffer = None
+            self._fill()
+
+    def open(self, entry: FileEntry) -> PrefetchedFile:
+        """
+        :param entry: next regular file in line
+        :return: readable file served from prefetched blocks
+        """
+        return PrefetchedFile(self, entry)
+
+    def close(self) -> None:
+        for _, _, future in self._pending:
+            future.cancel()
+        self._executor.shutdown()
+        self._pending.clear()
+
+    def __enter__(self) -> Prefetcher:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class PrefetchedFile:
+    """
+    Readable file whose data comes from a Prefetcher.
+    Each part is handed back once it's fully read.
+    """
+
+    def __init__(self, prefetcher: Prefetcher, entry: FileEntry) -> None:
+        self._prefetcher: Prefetcher = prefetcher
+        self._entry: FileEntry = entry
+        self._parts: int = -(-entry.size // prefetcher.block_size)
+        self._holding: bool = False
+        self._view: memoryview = memoryview(b'')
+
+    def _next(self) -> bool:
+        self._drop()
+        if not self._parts:
+            return False
+
+        self._parts -= 1
+        self._view = self._prefetcher.next_part(self._entry)
+        self._holding = True
+        return True
+
+    def _drop(self) -> None:
+        if self._holding:
+            self._prefetcher.done_part()
+            self._holding = False
+            self._view = memoryview(b'')
+
+    def read(self, size: int = -1) -> bytes:
+        chunks: list = []
+        while size != 0:
+            if not self._view and not self._next():
+                break
+
+            taken: memoryview = self._view if size < 0 else self._view[:size]
+            chunks.append(bytes(taken))
+            self._view = self._view[len(taken):]
+            if size > 0:
+                size -= len(taken)
+
+        return b''.join(chunks)
+
+    def readinto(self, b) -> int:
+        if not self._view and not self._next():
+            return 0
+
+        n: int = min(len(b), len(self._view))
+        b[:n] = self._view[:n]
+        self._view = self._view[n:]
+        return n
+
+    def close(self) -> None:
+        """
+        Skip unread parts, next file's parts come right after them
+        """
+        while self._parts:
+            try:
+                self._next()
+            except OSError:
+                " Already reported by the read that failed "
+                pass
+        self._drop()
+
+    def __enter__(self) -> PrefetchedFile:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
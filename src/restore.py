@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import os
+import re
+import stat
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+import zstandard as zstd
+
+from src import dictionary, dir, logger
+from src.archive import read_chunks, sparse_map
+from src.catalog import Catalog
+from src.chunkstore import EXTENSION as SNAPSHOT_EXTENSION, ChunkStore, chunk_id, chunk_ids, load_snapshot
+from src.compress import arcname, new_digest
+from src.frames import MAX_WINDOW_SIZE, FrameReader, read_metadata, read_seek_table
+from src.ignore import translate
+from src.manifest import Manifest
+
+
+def _tar_filter(member: tarfile.TarInfo, path: str) -> tarfile.TarInfo:
+    """
+    Checks of tarfile's 'tar' filter (nothing lands outside 'path',
+    symlinks on the way included), but modes are kept as backed up.
+    """
+    return tarfile.tar_filter(member, path).replace(mode=member.mode, deep=False)
+
+
+" Python 3.12+ (and security backports) filter members on extraction "
+_EXTRACT_ARGS: dict = {'filter': _tar_filter} if hasattr(tarfile, 'tar_filter') else {}
+
+
+def compile_patterns(patterns: list) -> Callable[[str], bool]:
+    """
+    Build a filter for member names.
+
+    Patterns are gitignore-style globs matched against
+    the stored path (no leading slash). A pattern without
+    a slash matches at any depth, a folder selects
+    everything inside it.
+
+    :param patterns: list of glob patterns, empty selects everything
+    :return: function telling whether a member is selected
+    """
+    if not patterns:
+        return lambda name: True
+
+    regexes: list = []
+    for pattern in patterns:
+        pattern = pattern.replace(os.sep, '/').strip('/')
+        prefix: str = '' if '/' in pattern else '(?:.*/)?'
+        regexes.append(prefix + translate(pattern) + '(?:/.*)?')
+
+    regex: re.Pattern = re.compile('|'.join(f'(?:{r})' for r in regexes))
+    return lambda name: regex.fullmatch(name.rstrip('/')) is not None
+
+
+def _inside(target: str, name: str) -> bool:
+    """
+    :param target: folder to restore into
+    :param name: relative path in it
+    :return: False if 'name' would be written outside of 'target',
+             because of '..' or a symlink in a folder on its way
+    """
+    name = name.replace('\\', '/')
+    if name.startswith('/') or '..' in name.split('/') or os.path.splitdrive(name)[0]:
+        return False
+
+    root: str = os.path.realpath(target)
+    parent: str = os.path.realpath(os.path.join(target, os.path.dirname(name)))
+    return os.path.commonpath([root, parent]) == root
+
+
+def _is_safe(member: tarfile.TarInfo, target: str) -> bool:
+    """
+    :return: False if member would be written (or linked to) outside of 'target'
+    """
+    return _inside(target, member.name) and (not member.islnk() or _inside(target, member.linkname))
+
+
+def _open_stream(file, workers: int):
+    """
+    :param file: archive opened in binary mode
+    :param workers: threads decompressing frames of seekable archives
+    :return: readable stream of the whole tarball
+    """
+    dict_data: Optional[zstd.ZstdCompressionDict] = dictionary.for_archive(file)
+    frames: Optional[list] = read_seek_table(file)
+    if frames is None:
+        file.seek(0)
+        dctx = zstd.ZstdDecompressor(dict_data=dict_data, max_window_size=MAX_WINDOW_SIZE)
+        return dctx.stream_reader(file, read_across_frames=True)
+
+    return FrameReader(file, frames, 0, workers, dict_data)
+
+
+def members(archive: str, workers: int = 0) -> Iterator[tarfile.TarInfo]:
+    """
+    List every member of an archive in the order they were written
+
+    :param archive: path to a .zstd backup
+    :param workers: threads decompressing frames, 0 lets Python decide
+    """
+    with open(archive, 'rb') as file:
+        stream = _open_stream(file, workers or os.cpu_count() or 1)
+        with stream, tarfile.open(fileobj=stream, mode='r|') as tar:
+            yield from tar
+
+
+def _extract(tar: tarfile.TarFile, member: tarfile.TarInfo, target: str) -> bool:
+    if not _is_safe(member, target):
+        logger.warn(f'{member.name} points outside of target folder! Skipping...')
+        return False
+
+    if member.islnk():
+        " Restored file takes the place of whatever is there, like 'tar' does "
+        if not os.path.exists(os.path.join(target, member.linkname)):
+            logger.warn(f'{member.name} is a hard link to {member.linkname}, which is not restored! Skipping...')
+            return False
+        if os.path.lexists(os.path.join(target, member.name)):
+            os.remove(os.path.join(target, member.name))
+
+    try:
+        tar.extract(member, target, **_EXTRACT_ARGS)
+        return True
+    except (OSError, tarfile.TarError) as e:
+        logger.warn(f'Error while extracting {member.name}! Skipping...')
+        logger.exception(e)
+        return False
+
+
+def _runs(index: dict, selected: Callable[[str], bool]) -> list:
+    """
+    Group selected members that sit next to each other in the tarball,
+    each group is read as a single stream.
+
+    :param index: member name -> [start, end], in tarball order
+    :return: list of (offset, number of members)
+    """
+    result: list = []
+    end: int = -1
+
+    for name, (start, stop) in index.items():
+        if not selected(name):
+            continue
+        if start == end:
+            offset, count = result[-1]
+            result[-1] = (offset, count + 1)
+        else:
+            result.append((start, 1))
+        end = stop
+
+    return result
+
+
+def extract_archive(archive: str, target: str, selected: Callable[[str], bool], workers: int = 0) -> list:
+    """
+    Write members of a .zstd backup into 'target'.
+
+    Data is streamed straight from the decompressor to the disk.
+    Seekable archives only decompress frames holding selected
+    members, with 'workers' frames decompressed in parallel.
+    Files that selected hard links point to are restored too.
+
+    :param archive: path to a .zstd backup
+    :param target: folder to restore into
+    :param selected: tells whether a member is restored
+    :param workers: threads decompressing frames, 0 lets Python decide
+    :return: names of restored members
+    """
+    workers = workers or os.cpu_count() or 1
+    restored: list = []
+
+    with open(archive, 'rb') as file:
+        frames: Optional[list] = read_seek_table(file)
+        metadata: dict = read_metadata(file)
+        index: Optional[dict] = None if frames is None else metadata.get('members')
+
+        links: dict = metadata.get('links', {})
+        targets: set = {target for name, target in links.items() if selected(name)}
+
+        def _selected(name: str) -> bool:
+            return selected(name) or name in targets
+
+        if index is None:
+            " No member index: read everything, keep what's selected "
+            with _open_stream(file, workers) as stream, tarfile.open(fileobj=stream, mode='r|') as tar:
+                for member in tar:
+                    if _selected(member.name) and _extract(tar, member, target):
+                        restored.append(member.name)
+            return restored
+
+        dict_data: Optional[zstd.ZstdCompressionDict] = dictionary.for_archive(file)
+        for offset, count in _runs(index, _selected):
+            with FrameReader(file, frames, offset, workers, dict_data) as reader:
+                tar: tarfile.TarFile = tarfile.open(fileobj=reader, mode='r|')
+                for _ in range(count):
+                    member: Optional[tarfile.TarInfo] = tar.next()
+                    if member is None:
+                        break
+                    if _extract(tar, member, target):
+                        restored.append(member.name)
+
+    return restored
+
+
+def extract_snapshot(snapshot: str, target: str, selected: Callable[[str], bool]) -> list:
+    """
+    Rebuild files of a snapshot from the chunk store next to it.
+    Files are written one chunk at a time, holes are skipped.
+    Hard links are linked again if the file they point to is restored.
+
+    :param snapshot: path to a .snapshot backup
+    :param target: folder to restore into
+    :param selected: tells whether a file is restored
+    :return: names of restored files
+    """
+    store = ChunkStore(os.path.dirname(snapshot))
+    restored: list = []
+    " Path in snapshot -> where it was restored "
+    written: dict = {}
+
+    for path, size, mtime, mode, inode, link, ids, hard_link in load_snapshot(snapshot):
+        name: str = arcname(path)
+        if not selected(name):
+            continue
+
+        if not _inside(target, name):
+            logger.warn(f'{name} points outside of target folder! Skipping...')
+            continue
+
+        filepath: str = os.path.join(target, name)
+        try:
+            if stat.S_ISDIR(mode):
+                os.makedirs(filepath, exist_ok=True)
+                os.chmod(filepath, mode & 0o7777)
+                restored.append(name)
+                continue
+
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            if os.path.lexists(filepath):
+                os.remove(filepath)
+
+            if link:
+                os.symlink(link, filepath)
+                restored.append(name)
+                continue
+
+            if hard_link in written:
+                os.link(written[hard_link], filepath)
+                restored.append(name)
+                continue
+
+            with open(filepath, 'wb') as file:
+                for cid in ids:
+                    if isinstance(cid, int):
+                        file.seek(cid, os.SEEK_CUR)
+                    else:
+                        file.write(store.get(cid))
+                " File may end with a hole "
+                file.truncate()
+            os.chmod(filepath, mode & 0o7777)
+            os.utime(filepath, (mtime, mtime))
+            restored.append(name)
+            written[path] = filepath
+        except (OSError, KeyError) as e:
+            logger.warn(f'Error while restoring {name}! Skipping...')
+            logger.exception(e)
+
+    return restored
+
+
+def chain_of(archive: str) -> list:
+    """
+    :param archive: path to a backup
+    :return: backups needed to restore 'archive', oldest first
+    """
+    archive = os.path.abspath(archive)
+    catalog = Catalog.load(os.path.dirname(archive))
+    names: list = [name for name in catalog.records if not name.endswith(SNAPSHOT_EXTENSION)]
+
+    for chain in catalog.chains(names):
+        if archive in chain:
+            return chain[:chain.index(archive) + 1]
+
+    return [archive]
+
+
+def restore(archive: str, target: str, patterns: list = None, workers: int = 0) -> list:
+    """
+    Restore a backup into 'target'.
+
+    Incremental backups are restored together with the
+    backups they build upon, newest first, so every file
+    is written once, from the most recent backup holding it.
+    Files deleted before 'archive' was made are not restored.
+
+    :param archive: path to a .zstd or .snapshot backup
+    :param target: folder to restore into
+    :param patterns: only restore members matching these globs
+    :param workers: threads decompressing frames, 0 lets Python decide
+    :return: names of restored members
+    """
+    selected: Callable[[str], bool] = compile_patterns(patterns or [])
+    os.makedirs(target, exist_ok=True)
+
+    if archive.endswith(SNAPSHOT_EXTENSION):
+        return extract_snapshot(archive, target, selected)
+
+    chain: list = chain_of(archive)
+    if len(chain) == 1:
+        return extract_archive(archive, target, selected, workers)
+
+    " Only files present when 'archive' was made "
+    latest: Optional[Manifest] = Manifest.load(archive)
+    wanted: Optional[set] = None if latest is None else {arcname(path) for path in latest.files}
+
+    restored: list = []
+    claimed: set = set()
+    for backup in reversed(chain):
+        logger.info(f'Restoring from {dir.basename(backup)}...')
+
+        def _select(name: str) -> bool:
+            if name in claimed:
+                return False
+            if wanted is not None and name not in wanted:
+                return False
+            return selected(name)
+
+        names: list = extract_archive(backup, target, _select, workers)
+        claimed.update(names)
+        restored.extend(names)
+
+    return restored
+
+
+def verify(archive: str, workers: int = 0) -> bool:
+    """
+    Decompress a backup and read every member, nothing is written.
+
+    zstd checks each frame against its checksum (if it has one),
+    members with a hash in backup's manifest are hashed and compared.
+    Neither source files nor temporary space are needed.
+
+    :param archive: path to a .zstd or .snapshot backup
+    :param workers: threads decompressing frames, 0 lets Python decide
+    :return: True if the whole backup could be read back
+    """
+    try:
+        if archive.endswith(SNAPSHOT_EXTENSION):
+            store = ChunkStore(os.path.dirname(archive))
+            for item in load_snapshot(archive):
+                for cid in chunk_ids(item):
+                    if chunk_id(store.get(cid)) != cid:
+                        raise ValueError(f'Chunk {cid} of {item[0]} is damaged')
+            return True
+
+        manifest: Optional[Manifest] = Manifest.load(archive)
+        hashes: dict = {}
+        if manifest is not None:
+            hashes = {arcname(path): info[3] for path, info in manifest.files.items() if info[3]}
+
+        with open(archive, 'rb') as file:
+            stream = _open_stream(file, workers or os.cpu_count() or 1)
+            with stream, tarfile.open(fileobj=stream, mode='r|') as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+
+                    digest = new_digest()
+                    if member.sparse is not None:
+                        " Hashed like it was written: data stored back to back (holes aren't), then where it goes "
+                        tar.fileobj.seek(member.offset_data)
+                        stored: int = sum(length for _, length in member.sparse)
+                        for chunk in read_chunks(tar.fileobj, stored, 1024 * 1024):
+                            digest.update(chunk)
+                        digest.update(sparse_map(member.sparse))
+                    else:
+                        data = tar.extractfile(member)
+                        while chunk := data.read(1024 * 1024):
+                            digest.update(chunk)
+
+                    expected: Optional[str] = hashes.get(member.name)
+                    if expected is not None and expected != digest.hexdigest():
+                        raise ValueError(f'{member.name} does not match its hash')
+        return True
+    except (OSError, EOFError, KeyError, ValueError, tarfile.TarError, zstd.ZstdError) as e:
+        logger.error(f'{archive} is damaged!')
+        logger.exception(e)
+        return False
+
+
+def verify_all(archives: list, workers: int = 0) -> list:
+    """
+    Verify several backups at once. Threads are shared
+    between backups, and between frames of each backup.
+
+    :param archives: paths to .zstd or .snapshot backups
+    :param workers: number of threads, 0 lets Python decide
+    :return: backups that failed verification
+    """
+    workers = workers or os.cpu_count() or 1
+    parallel: int = max(1, min(len(archives), workers))
+    per_archive: int = max(1, workers // parallel)
+
+    with ThreadPoolExecutor(parallel, thread_name_prefix='verify') as executor:
+        results: list = list(executor.map(lambda archive: verify(archive, per_archive), archives))
+
+    return [archive for archive, ok in zip(archives, results) if not ok]
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from src import today, dir, logger
+from src.backup import chains, delete_backup
+from src.catalog import Catalog
+from src.converter import size_converter
+from src.manifest import path_of as manifest_path
+from src.parser import parse_date
+
+" Why a chain is deleted "
+EXPIRED: str = 'expired'
+OVER_KEEP: str = 'over keep'
+FOR_SPACE: str = 'for space'
+NOT_IN_TIERS: str = 'not in tiers'
+
+" Tier -> bucket a date falls into, a backup is kept per bucket "
+TIERS: dict = {
+    'daily': lambda date: date.date(),
+    'weekly': lambda date: date.isocalendar()[:2],
+    'monthly': lambda date: (date.year, date.month),
+    'yearly': lambda date: date.year
+}
+
+
+class Chain(NamedTuple):
+    """
+    A full backup and the incremental backups built on top of it
+    (or the first part of them)
+    """
+    paths: tuple
+    " Date of each backup "
+    dates: tuple
+    " Bytes each backup takes, manifests included "
+    sizes: tuple
+
+    @property
+    def date(self) -> datetime:
+        """
+        :return: date of its newest backup
+        """
+        return self.dates[-1]
+
+    @property
+    def size(self) -> int:
+        """
+        :return: bytes freed by deleting it
+        """
+        return sum(self.sizes)
+
+    def split(self, count: int) -> tuple:
+        """
+        :return: Chain of first 'count' backups and Chain of the rest
+        """
+        return (
+            Chain(self.paths[:count], self.dates[:count], self.sizes[:count]),
+            Chain(self.paths[count:], self.dates[count:], self.sizes[count:])
+        )
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def load(backups: list, catalog: Optional[Catalog] = None) -> list:
+    """
+    Parse, group and sort backups once.
+
+    :param backups: paths to backups, from 'dir.scan_4_backup'
+    :param catalog: if given, chains and sizes come from it, no file is read or stat-ed
+    :return: list of Chain, oldest first
+    """
+    if catalog is None:
+        grouped: list = chains(backups)
+    else:
+        grouped: list = catalog.chains(map(dir.basename, backups))
+
+    result: list = []
+    for paths in grouped:
+        if catalog is None:
+            sizes: tuple = tuple(_size(path) + _size(manifest_path(path)) for path in paths)
+        else:
+            sizes: tuple = tuple(catalog.records[dir.basename(path)].get('size', 0) for path in paths)
+
+        result.append(Chain(tuple(paths), tuple(parse_date(dir.basename(path)) for path in paths), sizes))
+    return result
+
+
+class Plan:
+    """
+    Every chain to delete and why, worked out before
+    anything is deleted. Chains are only ever deleted
+    whole, incremental backups need their base.
+    """
+
+    def __init__(self, needed: int = 0, free: int = 0) -> None:
+        """
+        :param needed: bytes the new backup needs
+        :param free: bytes free at destination before deleting anything
+        """
+        self.needed: int = needed
+        self.free: int = free
+        " Chain -> reason "
+        self.deletions: dict = {}
+        " Bytes deleting every planned chain gives back "
+        self.freed: int = 0
+
+    def add(self, chain: Chain, reason: str) -> None:
+        """
+        Plan deletion of 'chain'
+        """
+        self.deletions[chain] = reason
+        self.freed += chain.size
+
+    @property
+    def enough(self) -> bool:
+        """
+        :return: whether the new backup fits once planned chains are deleted
+        """
+        return self.needed <= self.free + self.freed
+
+    def chains(self) -> list:
+        """
+        :return: Chain to delete, oldest first
+        """
+        return sorted(self.deletions, key=lambda x: x.date)
+
+    def backups(self, reason: Optional[str] = None) -> list:
+        """
+        :param reason: only chains deleted for this reason, all of them if None
+        :return: paths to backups to delete, oldest first
+        """
+        return [path for chain in self.chains() if reason in (None, self.deletions[chain]) for path in chain.paths]
+
+    def report(self) -> list:
+        """
+        :return: a line for every backup to delete, then a summary
+        """
+        lines: list = [
+            f'{dir.basename(path)} ({self.deletions[chain]})' for chain in self.chains() for path in chain.paths
+        ]
+        lines.append(f'{len(lines)} backup(s) in {len(self.deletions)} chain(s), '
+                     f'{size_converter(self.freed)} freed')
+        return lines
+
+    def execute(self, catalog: Optional[Catalog] = None) -> None:
+        """
+        Delete every planned backup along with its manifest
+
+        :param catalog: if given, deleted backups are removed from it
+        """
+        deleted: list = []
+        try:
+            for path in self.backups():
+                delete_backup(path)
+                deleted.append(path)
+        finally:
+            if catalog is not None:
+                catalog.remove(deleted)
+
+
+def select(dates: list, tiers: dict) -> set:
+    """
+    Grandfather-father-son selection: for each tier, keep the
+    newest backup of each of its most recent buckets
+    (days, weeks...) holding a backup.
+
+    :param dates: date of every backup, newest first
+    :param tiers: tier (see 'TIERS') -> number of buckets to keep
+    :return: indexes (in 'dates') of backups to keep
+    """
+    kept: set = set()
+    for tier, count in tiers.items():
+        bucket_of = TIERS[tier]
+        last = None
+        for index, date in enumerate(dates):
+            if not count:
+                break
+
+            bucket = bucket_of(date)
+            if bucket != last:
+                kept.add(index)
+                last = bucket
+                count -= 1
+
+    return kept
+
+
+def plan(backups: list, keep: int = 0, retention: int = 0, needed: int = 0, free: int = 0,
+         for_space: bool = False, aggressive: bool = False, protect: set = frozenset(),
+         tiers: Optional[dict] = None, catalog: Optional[Catalog] = None) -> Plan:
+    """
+    Work out which chains to delete, in order:
+    ones whose newest backup is older than 'retention' days,
+    oldest ones until at most 'keep' - 1 backups remain,
+    then, if 'for_space', oldest ones until 'needed' bytes are free.
+    The most recent chain only goes when it's expired or for
+    space when 'aggressive'. Chains holding 'protect' never go.
+
+    With 'tiers', backups 'select' doesn't pick go instead of
+    expired ones and ones over 'keep'. Incremental backups
+    need the ones before them, so only the part of a chain
+    after its last picked backup goes.
+
+    :param backups: paths to backups, from 'dir.scan_4_backup'
+    :param keep: number of backups to keep, new one included, 0 keeps all
+    :param retention: days a chain is kept, 0 keeps all
+    :param needed: bytes the new backup needs
+    :param free: bytes free at destination
+    :param for_space: delete old chains until 'needed' fits in free space
+    :param aggressive: most recent chain may be deleted for space too
+    :param protect: names of backups the new backup builds upon
+    :param tiers: tier -> number of buckets to keep (see 'select'), None or all 0 to not use them
+    :param catalog: catalog of the destination, if loaded already (see 'load')
+    :return: a Plan, nothing is deleted yet
+    """
+    result = Plan(needed, free)
+    loaded: list = load(backups, catalog)
+
+    def _protected(chain: Chain) -> bool:
+        return any(dir.basename(path) in protect for path in chain.paths)
+
+    remaining: list = []
+    if tiers and any(tiers.values()):
+        " Newest first, like buckets are filled "
+        paths: list = [path for chain in reversed(loaded) for path in reversed(chain.paths)]
+        dates: list = [date for chain in reversed(loaded) for date in reversed(chain.dates)]
+        kept: set = {paths[index] for index in select(dates, tiers)}
+
+        for chain in loaded:
+            wanted: list = [i for i, path in enumerate(chain.paths) if path in kept or dir.basename(path) in protect]
+            head, tail = chain.split(wanted[-1] + 1 if wanted else 0)
+            if tail.paths:
+                result.add(tail, NOT_IN_TIERS)
+            if head.paths:
+                remaining.append(head)
+
+    else:
+        for chain in loaded:
+            if retention and today - chain.date > timedelta(days=retention) and not _protected(chain):
+                result.add(chain, EXPIRED)
+            else:
+                remaining.append(chain)
+
+        count: int = sum(len(chain.paths) for chain in remaining)
+        " Most recent chain is never deleted to keep the count "
+        for chain in remaining[:-1]:
+            if not keep or count <= keep - 1:
+                break
+            if _protected(chain):
+                continue
+
+            result.add(chain, OVER_KEEP)
+            count -= len(chain.paths)
+
+    if for_space and not result.enough:
+        candidates: list = remaining if aggressive else remaining[:-1]
+        for chain in candidates:
+            if result.enough:
+                break
+            if chain in result.deletions or _protected(chain):
+                continue
+            result.add(chain, FOR_SPACE)
+
+    logger.debug(f'Retention plan: {len(result.deletions)} of {len(loaded)} chain(s) to delete')
+    return result
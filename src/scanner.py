@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import NamedTuple
+
+from src import logger
+from src.ignore import IgnoreMatcher
+
+
+class FileEntry(NamedTuple):
+    """
+    Everything the program needs to know about a file,
+    collected with a single stat call during the scan.
+    """
+    path: str
+    size: int
+    mtime: float
+    mode: int
+    inode: int
+    dev: int
+    uid: int
+    gid: int
+    " Number of paths sharing this inode "
+    nlink: int = 1
+    " 512-byte blocks allocated, -1 when the system doesn't tell "
+    blocks: int = -1
+
+    @classmethod
+    def from_stat(cls, path: str, st: os.stat_result) -> FileEntry:
+        """
+        Build an entry from 'lstat' result.
+        Only regular files have their size counted.
+
+        :param path: absolute path of the file
+        :param st: result of os.lstat() or DirEntry.stat(follow_symlinks=False)
+        :return: entry of this file
+        """
+        size: int = st.st_size if stat.S_ISREG(st.st_mode) else 0
+        return cls(path, size, st.st_mtime, st.st_mode, st.st_ino, st.st_dev, st.st_uid, st.st_gid,
+                   st.st_nlink, getattr(st, 'st_blocks', -1))
+
+    @property
+    def isreg(self) -> bool:
+        return stat.S_ISREG(self.mode)
+
+    @property
+    def isdir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+
+    @property
+    def sparse(self) -> bool:
+        """
+        :return: whether fewer bytes are allocated than the file holds,
+                 it probably has holes (see 'archive.sparse_regions')
+        """
+        return self.isreg and 0 <= self.blocks * 512 < self.size
+
+
+def _scan_dir(path: str, matcher: IgnoreMatcher) -> tuple:
+    """
+    List a single directory with os.scandir.
+    Each file is stat-ed exactly once, sub-folders
+    are returned to be scanned separately.
+    Ignored sub-folders are dropped here, so they are never listed.
+
+    :param path: absolute path to directory
+    :param matcher: decides which paths are skipped
+    :return: list of FileEntry (the folder itself if nothing
+             inside it is kept) and list of (sub-folder, matcher)
+    """
+    files: list = []
+    subdirs: list = []
+
+    try:
+        with os.scandir(path) as it:
+            entries: list = list(it)
+
+        " Rules from this folder's ignore file apply to everything inside it "
+        matcher = matcher.enter(path, entries)
+
+        for entry in entries:
+            " Same as os.walk: symlinks to directories are not followed, they're kept as links "
+            is_dir: bool = entry.is_dir(follow_symlinks=False)
+
+            if matcher.match(entry.path, is_dir):
+                logger.debug(f'Ignore {entry.path}!')
+                continue
+
+            if is_dir:
+                subdirs.append((entry.path, matcher))
+                continue
+
+            try:
+                files.append(FileEntry.from_stat(entry.path, entry.stat(follow_symlinks=False)))
+            except OSError as e:
+                logger.warn(f'Error while reading {entry.path}! Skipping...')
+                logger.exception(e)
+
+        " Empty folders are kept too, others are restored along with their content "
+        if not files and not subdirs:
+            files.append(FileEntry.from_stat(path, os.lstat(path)))
+    except OSError as e:
+        logger.warn(f'Error while scanning {path}! Skipping...')
+        logger.exception(e)
+
+    return files, subdirs
+
+
+def scan(paths: set, matcher: IgnoreMatcher, workers: int = 1) -> dict:
+    """
+    Scan every path in 'paths' and collect path, size,
+    mtime, mode and inode of every file (and empty folder) in one pass.
+
+    With more than 1 worker, every directory (include roots
+    and all of their sub-folders) is listed as a separate
+    task, so large trees are split across threads.
+    Result is sorted by path regardless of 'workers'.
+
+    :param paths: absolute paths to files or folders
+    :param matcher: decides which paths are skipped
+    :param workers: number of threads, 0 lets Python decide
+    :return: a dictionary of path -> FileEntry
+    """
+    manifest: dict = {}
+    roots: list = []
+
+    for path in sorted(paths):
+        if not os.path.exists(path):
+            " If path doesn't exist, skip next step "
+            logger.warn(f'{path} does not exist! Skipping...')
+            continue
+
+        if matcher.match(path, os.path.isdir(path)):
+            logger.debug(f'Ignore {path}!')
+        elif os.path.isdir(path):
+            roots.append((path, matcher))
+        else:
+            manifest[path] = FileEntry.from_stat(path, os.lstat(path))
+
+    def _merge(files: list) -> None:
+        for entry in files:
+            manifest[entry.path] = entry
+
+    if workers == 1:
+        while roots:
+            files, subdirs = _scan_dir(*roots.pop())
+            _merge(files)
+            roots.extend(subdirs)
+    else:
+        with ThreadPoolExecutor(workers or None, thread_name_prefix='scanner') as executor:
+            pending: set = {executor.submit(_scan_dir, *root) for root in roots}
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    _merge(files)
+                    pending.update(executor.submit(_scan_dir, *subdir) for subdir in subdirs)
+
+    logger.debug(f'Scanned {len(manifest)} file(s)')
+    " Sort by path so the order never depends on thread timing "
+    return dict(sorted(manifest.items()))
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import errno
+import os
+from typing import Callable, Optional
+
+import zstandard as zstd
+
+from src import autolevel, dir, logger
+from src.catalog import Catalog
+from src.converter import size_converter
+from src.frames import read_metadata
+from src.manifest import FULL
+
+" Predicted size is multiplied by this, data differs from sample and last backup "
+MARGIN: float = 1.25
+" Sample compressed to guess ratio when no previous backup tells it "
+SAMPLE_SIZE: int = 4 * 1024 * 1024
+" Ratio of a smaller source says little about the next backup "
+MIN_SOURCE: int = 256 * 1024
+" Free space is checked every time this many bytes were written "
+CHECK_EVERY: int = 64 * 1024 * 1024
+
+
+class NoSpaceError(OSError):
+    """
+    Destination ran out of (reserved) space while writing
+    """
+
+    def __init__(self, path: str, free: int) -> None:
+        super().__init__(errno.ENOSPC, f'Only {size_converter(free)} left', path)
+        self.free: int = free
+
+    def __reduce__(self) -> tuple:
+        " Raised in shard workers, must survive pickling "
+        return NoSpaceError, (self.filename, self.free)
+
+
+def _telling(kind: Optional[str], source_size: Optional[int]) -> bool:
+    """
+    :return: whether a backup's ratio predicts the next one. An incremental
+             backup only holds changed files, which compress differently
+    """
+    return (kind or FULL) == FULL and (source_size or 0) >= MIN_SOURCE
+
+
+def previous_ratio(backups: list, catalog: Optional[Catalog] = None) -> Optional[float]:
+    """
+    :param backups: paths to backups, from 'dir.scan_4_backup'
+    :param catalog: if given, ratio is taken from it, no archive is opened
+    :return: compressed / uncompressed size of the most recent full
+             archive of at least 'MIN_SOURCE' bytes, None if there's none
+    """
+    if catalog is not None:
+        for record in reversed(catalog.records.values()):
+            if record.get('ratio') is not None and _telling(record.get('kind'), record.get('source_size')):
+                return record['ratio']
+        return None
+
+    archives: list = sorted((path for path in backups if path.endswith('.zstd')), key=dir.basename)
+
+    for archive in reversed(archives):
+        try:
+            with open(archive, 'rb') as file:
+                metadata: dict = read_metadata(file)
+                compressed: int = file.seek(0, os.SEEK_END)
+        except (OSError, ValueError, zstd.ZstdError):
+            continue
+
+        source_size: int = metadata.get('source_size', 0)
+        if _telling(metadata.get('kind'), source_size):
+            logger.debug(f'{dir.basename(archive)} was {compressed / source_size:.2%} of its source')
+            return compressed / source_size
+
+    return None
+
+
+def sample_ratio(entries: list, new_compressor: Callable[[int], zstd.ZstdCompressor], level: int) -> float:
+    """
+    :param entries: list of FileEntry to be backed up
+    :param new_compressor: builds a compressor of the given level
+    :param level: compression level
+    :return: compressed / uncompressed size of a sample of 'entries', 1 without data
+    """
+    sample, _ = autolevel.read_sample(entries, SAMPLE_SIZE)
+    if not sample:
+        return 1.0
+
+    _, compressed = autolevel.trial(sample, level, new_compressor)
+    logger.debug(f'Sample of {size_converter(len(sample))} compressed to {compressed / len(sample):.2%}')
+    return min(1.0, compressed / len(sample))
+
+
+def estimate(total_size: int, entries: list, backups: list,
+             new_compressor: Callable[[int], zstd.ZstdCompressor], level: int,
+             catalog: Optional[Catalog] = None) -> int:
+    """
+    Predict how many bytes the archive will take. Ratio of
+    the last full backup is used if known, otherwise a sample
+    of 'entries' is compressed. 'MARGIN' is added on top.
+
+    :param total_size: bytes to back up
+    :param entries: list of FileEntry to be backed up
+    :param backups: paths to previous backups
+    :param new_compressor: builds a compressor of the given level
+    :param level: compression level
+    :param catalog: catalog of the destination, if loaded already
+    :return: predicted size in bytes, never more than 'total_size' plus margin
+    """
+    ratio: Optional[float] = previous_ratio(backups, catalog)
+    if ratio is None:
+        ratio = sample_ratio(entries, new_compressor, level)
+
+    result: int = int(total_size * min(1.0, ratio) * MARGIN)
+    logger.debug(f'Predicted size: {size_converter(result)} for {size_converter(total_size)} of data')
+    return result
+
+
+class SpaceGuard:
+    """
+    Sits between compressor and the archive file. Free space of
+    the destination is checked every 'CHECK_EVERY' bytes, writing
+    stops with NoSpaceError once it drops below 'reserve'.
+    Running out of space entirely raises NoSpaceError too.
+    """
+
+    def __init__(self, file, reserve: int, every: int = CHECK_EVERY, digest=None) -> None:
+        """
+        :param file: binary file opened for writing
+        :param reserve: bytes that must stay free
+        :param every: bytes written between two checks
+        :param digest: if given, a hash object updated with everything written
+        """
+        self._file = file
+        self.digest = digest
+        self.reserve: int = reserve
+        self.every: int = every
+        " First write is checked too "
+        self._unchecked: int = every
+
+    def _check(self) -> None:
+        free: int = dir.get_free_space(os.path.dirname(os.path.abspath(self._file.name)))
+        if free < self.reserve:
+            raise NoSpaceError(self._file.name, free)
+
+    def write(self, data) -> int:
+        if self._unchecked >= self.every:
+            self._check()
+            self._unchecked = 0
+
+        try:
+            written: int = self._file.write(data)
+        except OSError as e:
+            if e.errno != errno.ENOSPC:
+                raise
+            raise NoSpaceError(self._file.name, 0) from e
+
+        if self.digest is not None:
+            self.digest.update(data)
+        self._unchecked += len(data)
+        return written
+
+    def __getattr__(self, item: str):
+        return getattr(self._file, item)
+
+    def __enter__(self) -> SpaceGuard:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._file.close()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from src import logger
+from src.converter import size_converter
+
+
+class ChunkTuner:
+    """
+    Picks 'write_chunk' while the backup runs.
+
+    Block sizes from 'min_size' to 'max_size' (each 4 times
+    the previous one) are tried in turn for 'trial' seconds.
+    Time of each block covers reading it and compressing it.
+    Once every size was tried, the fastest one is kept
+    for the rest of the backup.
+    """
+
+    def __init__(self, min_size: int, max_size: int, trial: float = 0.5) -> None:
+        """
+        :param min_size: smallest block size in bytes
+        :param max_size: largest block size in bytes
+        :param trial: seconds spent measuring each size
+        """
+        self.candidates: list = []
+        size: int = min_size
+        while size < max_size:
+            self.candidates.append(size)
+            size *= 4
+        self.candidates.append(max_size)
+
+        self.trial: float = trial
+        self.results: dict = {}
+        self.chunk_size: int = self.candidates[0]
+        self.done: bool = len(self.candidates) == 1
+
+        self._index: int = 0
+        self._bytes: int = 0
+        self._seconds: float = 0.0
+
+    def record(self, size: int, seconds: float) -> None:
+        """
+        :param size: bytes of a block that was just read and compressed
+        :param seconds: time it took
+        """
+        if self.done:
+            return
+
+        self._bytes += size
+        self._seconds += seconds
+        if self._seconds >= self.trial:
+            self._next()
+
+    def _next(self) -> None:
+        self.results[self.chunk_size] = self._bytes / self._seconds if self._seconds else 0.0
+        self._bytes, self._seconds = 0, 0.0
+
+        self._index += 1
+        if self._index < len(self.candidates):
+            self.chunk_size = self.candidates[self._index]
+        else:
+            self.finish()
+
+    def finish(self) -> None:
+        """
+        Stop measuring and keep the fastest size so far
+        """
+        if self.done:
+            return
+        if self._seconds:
+            self.results[self.chunk_size] = self._bytes / self._seconds
+
+        self.done = True
+        if self.results:
+            self.chunk_size = max(self.results, key=self.results.get)
+            speed: str = size_converter(int(self.results[self.chunk_size]))
+            logger.info(f'Auto write_chunk: {size_converter(self.chunk_size)} ({speed}/s)')
+
+        for size, speed in self.results.items():
+            logger.debug(f'write_chunk {size_converter(size)}: {size_converter(int(speed))}/s')
+
+    def __call__(self) -> int:
+        return self.chunk_size
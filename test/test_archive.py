@@ -0,0 +1,157 @@
+import os
+import shutil
+import tarfile
+import unittest
+from io import BytesIO
+
+from src.archive import STRATEGIES, TarWriter, read_chunks, sparse_map, sparse_regions
+from test import TEST_DIR
+
+
+class ReadChunksTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'archive')
+    filepath: str = os.path.join(path, 'data.bin')
+    data: bytes = os.urandom(100 * 1024 + 7)
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.path, exist_ok=True)
+        with open(cls.filepath, 'wb') as file:
+            file.write(cls.data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def test_strategies(self):
+        """
+        Every strategy reads the same bytes
+        """
+        for strategy in STRATEGIES:
+            with open(self.filepath, 'rb') as file:
+                chunks: list = [bytes(chunk) for chunk in read_chunks(file, len(self.data), 4096, strategy)]
+            self.assertEqual(self.data, b''.join(chunks), strategy)
+            self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+
+    def test_changing_chunk_size(self):
+        """
+        Size given by a function is asked again before every chunk
+        """
+        for strategy in STRATEGIES:
+            sizes: list = [1000, 4096] * 100
+            with open(self.filepath, 'rb') as file:
+                chunks: list = [bytes(chunk) for chunk in read_chunks(file, len(self.data), lambda: sizes.pop(0), strategy)]
+            self.assertEqual(self.data, b''.join(chunks), strategy)
+            self.assertEqual([1000, 4096, 1000], [len(chunk) for chunk in chunks[:3]], strategy)
+
+    def test_fallback(self):
+        """
+        Streams without a file descriptor are still read
+        """
+        for strategy in STRATEGIES:
+            chunks: list = [bytes(chunk) for chunk in read_chunks(BytesIO(self.data), len(self.data), 4096, strategy)]
+            self.assertEqual(self.data, b''.join(chunks), strategy)
+
+    def test_shorter_file(self):
+        for strategy in STRATEGIES:
+            with self.assertRaises(OSError), open(self.filepath, 'rb') as file:
+                for _ in read_chunks(file, len(self.data) + 1, 4096, strategy):
+                    pass
+
+
+class TarWriterTest(unittest.TestCase):
+
+    def test_same_as_tarfile(self):
+        """
+        Output is byte for byte what 'tarfile' writes
+        """
+        members: list = []
+        for name, size in [('a.txt', 0), ('b.bin', 513), ('c/d.bin', 4096)]:
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = size
+            tarinfo.mtime = 1700000000
+            members.append((tarinfo, os.urandom(size)))
+
+        expected = BytesIO()
+        with tarfile.open(fileobj=expected, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for tarinfo, data in members:
+                tar.addfile(tarinfo, BytesIO(data))
+
+        written = BytesIO()
+        writer = TarWriter(written)
+        for tarinfo, data in members:
+            writer.addfile(tarinfo, BytesIO(data), 100, 'readinto')
+        writer.close()
+
+        self.assertEqual(expected.getvalue(), written.getvalue())
+        self.assertEqual(len(written.getvalue()), writer.offset)
+
+
+class SparseTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'sparse.img')
+
+    def setUp(self):
+        " 16 MiB with data at 4 MiB and a hole at the end "
+        with open(self.path, 'wb') as file:
+            file.truncate(16 << 20)
+            file.seek(4 << 20)
+            file.write(b'data' * 2048)
+
+        with open(self.path, 'rb') as file:
+            self.regions = sparse_regions(file, 16 << 20)
+        if self.regions is None:
+            self.skipTest('File system does not report holes')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_regions(self):
+        """
+        Only data is listed, file's end closes the map
+        """
+        self.assertEqual((16 << 20, 0), self.regions[-1])
+        self.assertLess(sum(length for _, length in self.regions), 1 << 20)
+        self.assertTrue(any(offset <= 4 << 20 < offset + length for offset, length in self.regions))
+        self.assertTrue(sparse_map([(0, 5), (10, 0)]).startswith(b'2\n0\n5\n10\n0\n'))
+        self.assertEqual(0, len(sparse_map([(0, 5)])) % tarfile.BLOCKSIZE)
+
+        with open(__file__, 'rb') as file:
+            self.assertIsNone(sparse_regions(file, os.path.getsize(__file__)))
+
+    def test_limit(self):
+        """
+        Too much data for a sparse member: stored whole, with a warning naming the file
+        """
+        with open(self.path, 'rb') as file, self.assertLogs(level='WARNING') as logs:
+            self.assertIsNone(sparse_regions(file, 16 << 20, 1024))
+        self.assertIn(self.path, logs.output[0])
+
+        with open(self.path, 'rb') as file:
+            self.assertEqual(self.regions, sparse_regions(file, 16 << 20, None))
+
+    def test_tarfile(self):
+        """
+        'tarfile' reads the member back whole, with its real name and size
+        """
+        tarinfo = tarfile.TarInfo('images/sparse.img')
+        tarinfo.size = 16 << 20
+        tarinfo.mtime = 1700000000
+
+        written = BytesIO()
+        writer = TarWriter(written)
+        with open(self.path, 'rb') as file:
+            writer.addsparse(tarinfo, file, self.regions)
+        writer.close()
+        self.assertLess(len(written.getvalue()), 1 << 20)
+
+        written.seek(0)
+        with tarfile.open(fileobj=written, mode='r|') as tar, open(self.path, 'rb') as file:
+            member: tarfile.TarInfo = tar.next()
+            self.assertEqual('images/sparse.img', member.name)
+            self.assertEqual(16 << 20, member.size)
+            self.assertIsNotNone(member.sparse)
+            self.assertEqual(file.read(), tar.extractfile(member).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
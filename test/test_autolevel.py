@@ -0,0 +1,86 @@
+import os
+import shutil
+import unittest
+
+import zstandard as zstd
+
+from src import autolevel, backup, config
+from src.compress import zstd_compress
+from src.frames import read_metadata
+from src.ignore import IgnoreMatcher
+from src.restore import verify
+from src.scanner import scan
+from test import valid_config, TEST_DIR
+
+
+class AutoLevelTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'autolevel_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'autolevel_backups')
+    entries: list
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for name in range(20):
+            with open(os.path.join(cls.incl_dir, f'{name}.txt'), 'wb') as file:
+                file.write(b' '.join(str(i * name).encode() for i in range(2000 * (name + 1))))
+
+        cls.entries = list(scan({cls.incl_dir}, IgnoreMatcher()).values())
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in [cls.incl_dir, cls.dest_dir]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_budget_of(self):
+        """
+        Stricter of time budget and target speed wins
+        """
+        self.assertEqual(0, autolevel.budget_of(0, 0, 1 << 30))
+        self.assertEqual(600, autolevel.budget_of(600, 0, 1 << 30))
+        self.assertEqual(64, autolevel.budget_of(0, 16 << 20, 1 << 30))
+        self.assertEqual(64, autolevel.budget_of(600, 16 << 20, 1 << 30))
+
+    def test_read_sample(self):
+        """
+        Sample is never much larger than requested
+        """
+        total: int = sum(entry.size for entry in self.entries)
+        sample, speed = autolevel.read_sample(self.entries, total)
+        self.assertEqual(total, len(sample))
+        self.assertGreater(speed, 0)
+
+        sample, _ = autolevel.read_sample(self.entries, total // 4, 16 * 1024)
+        self.assertLessEqual(len(sample), total // 4 + 16 * 1024)
+        self.assertGreater(len(sample), 0)
+
+    def test_pick_level(self):
+        def _compressor(level: int) -> zstd.ZstdCompressor:
+            return zstd.ZstdCompressor(level=level)
+
+        " Plenty of time: every level is tried, best ratio wins "
+        level, predicted, trials = autolevel.pick_level(self.entries, 1 << 20, 1e9, _compressor)
+        self.assertEqual(list(autolevel.LEVELS), [trial.level for trial in trials])
+        self.assertEqual(max(trials, key=lambda x: x.ratio).level, level)
+
+        " No time at all: fastest level, nothing else is tried "
+        level, predicted, trials = autolevel.pick_level(self.entries, 1 << 40, 1e-9, _compressor)
+        self.assertEqual(autolevel.LEVELS[0], level)
+        self.assertEqual(1, len(trials))
+
+    def test_recorded_in_archive(self):
+        level_config: dict = valid_config.copy()
+        level_config['include'] = [self.incl_dir]
+        level_config['destination'] = self.dest_dir
+        level_config['arguments'] = {'level': 3, 'threads': 0, 'time_budget': 60}
+        configuration = config.Configuration(level_config)
+
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        archive: str = os.path.join(self.dest_dir, profile.filename)
+
+        with open(archive, 'rb') as file:
+            picked: dict = read_metadata(file)['auto_level']
+        self.assertIn(picked['level'], autolevel.LEVELS)
+        self.assertEqual(3600, picked['budget'])
+        self.assertTrue(verify(archive))
@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from src import backup, catalog, config, retention, time_format, today
+from src.compress import new_digest, zstd_compress
+from src.dir import scan_4_backup
+from src.manifest import FULL, INCREMENTAL, Manifest
+from test import valid_config, TEST_DIR
+
+
+class CatalogTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'catalog')
+    names: list
+
+    def setUp(self):
+        """
+        A single backup, then a chain of 3
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        self.names = []
+        for day in [10, 3, 2, 1]:
+            name: str = f'{(today - timedelta(days=day)).strftime(time_format)}.zstd'
+            with open(os.path.join(self.path, name), 'wb') as file:
+                file.write(bytes(100))
+            self.names.append(name)
+
+        Manifest(FULL).save(os.path.join(self.path, self.names[1]))
+        Manifest(INCREMENTAL, self.names[1]).save(os.path.join(self.path, self.names[2]))
+        Manifest(INCREMENTAL, self.names[2]).save(os.path.join(self.path, self.names[3]))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_rebuild(self):
+        """
+        Without a file, backups in the destination are described, nothing is written
+        """
+        loaded = catalog.Catalog.load(self.path)
+        self.assertEqual(self.names, list(loaded.records))
+        self.assertEqual(backup.chains(scan_4_backup(self.path)), loaded.chains())
+        self.assertEqual(INCREMENTAL, loaded.records[self.names[3]]['kind'])
+        self.assertFalse(os.path.exists(loaded.path))
+
+    def test_add_and_remove(self):
+        loaded = catalog.Catalog.load(self.path)
+        record: dict = catalog.record_of(os.path.join(self.path, self.names[3]), INCREMENTAL, self.names[2],
+                                         source_size=1000, files=2)
+        self.assertEqual(0.1, record['ratio'])
+        loaded.add(record)
+
+        " First change writes every backup known "
+        self.assertEqual(self.names, list(catalog.Catalog.load(self.path).records))
+        self.assertEqual(2, catalog.Catalog.load(self.path).records[self.names[3]]['files'])
+
+        os.remove(os.path.join(self.path, self.names[0]))
+        loaded.remove([os.path.join(self.path, self.names[0])])
+        with open(loaded.path) as file:
+            self.assertEqual({'name': self.names[0], 'deleted': True}, json.loads(file.readlines()[-1]))
+        self.assertEqual(self.names[1:], list(catalog.Catalog.load(self.path).records))
+
+        " Lines that no longer describe a backup are dropped once there are too many "
+        for name in self.names[1:3]:
+            os.remove(os.path.join(self.path, name))
+        loaded.remove([os.path.join(self.path, name) for name in self.names[1:3]])
+        with open(loaded.path) as file:
+            self.assertEqual(1, len(file.readlines()))
+        self.assertEqual(self.names[3:], list(catalog.Catalog.load(self.path).records))
+
+    def test_reconcile(self):
+        """
+        Backups deleted or copied in behind catalog's back are noticed
+        """
+        catalog.Catalog.load(self.path).compact()
+        os.remove(os.path.join(self.path, self.names[0]))
+        name: str = f'{today.strftime(time_format)}.zstd'
+        with open(os.path.join(self.path, name), 'wb') as file:
+            file.write(bytes(100))
+
+        loaded = catalog.Catalog.load(self.path)
+        self.assertEqual(self.names[1:] + [name], list(loaded.records))
+
+        loaded.compact()
+        self.assertEqual(self.names[1:] + [name], list(catalog.Catalog.load(self.path).records))
+
+    def test_listed_once(self):
+        """
+        Destination is listed again only after it changed
+        """
+        loaded = catalog.Catalog.load(self.path)
+        loaded.compact()
+        " Files' clock ticks slowly, without this both could have changed at the same time "
+        written: int = os.stat(loaded.path).st_mtime_ns
+        os.utime(self.path, ns=(written, written - 1_000_000_000))
+
+        with mock.patch('src.dir.scan_4_backup', wraps=scan_4_backup) as scanned:
+            catalog.Catalog.load(self.path)
+            self.assertEqual(0, scanned.call_count)
+
+            os.remove(os.path.join(self.path, self.names[0]))
+            self.assertEqual(self.names[1:], list(catalog.Catalog.load(self.path).records))
+            self.assertEqual(1, scanned.call_count)
+
+    def test_copied_before_write(self):
+        """
+        A backup copied in before another process writes
+        the catalog is still known afterward
+        """
+        loaded = catalog.Catalog.load(self.path)
+        loaded.compact()
+
+        copied: str = f'{today.strftime(time_format)}.zstd'
+        with open(os.path.join(self.path, copied), 'wb') as file:
+            file.write(bytes(100))
+        name: str = f'{(today + timedelta(minutes=1)).strftime(time_format)}.zstd'
+        with open(os.path.join(self.path, name), 'wb') as file:
+            file.write(bytes(100))
+        loaded.add(catalog.record_of(os.path.join(self.path, name)))
+
+        self.assertEqual(self.names + [copied, name], list(catalog.Catalog.load(self.path).records))
+
+    def test_merge(self):
+        """
+        Compaction keeps what another process wrote since the catalog was read
+        """
+        first = catalog.Catalog.load(self.path)
+        first.compact()
+        second = catalog.Catalog.load(self.path)
+
+        name: str = f'{today.strftime(time_format)}.zstd'
+        with open(os.path.join(self.path, name), 'wb') as file:
+            file.write(bytes(100))
+        first.add(catalog.record_of(os.path.join(self.path, name)))
+
+        os.remove(os.path.join(self.path, self.names[0]))
+        second.remove([self.names[0]])
+        second.compact()
+
+        self.assertEqual(self.names[1:] + [name], list(second.records))
+        self.assertEqual(self.names[1:] + [name], list(catalog.Catalog.load(self.path).records))
+
+    def test_damaged_line(self):
+        """
+        A line cut by a crash is skipped
+        """
+        loaded = catalog.Catalog.load(self.path)
+        loaded.compact()
+        with open(loaded.path, 'a') as file:
+            file.write('{"name": "2099-Jan-01 00-00')
+
+        self.assertEqual(self.names, list(catalog.Catalog.load(self.path).records))
+
+    def test_retention(self):
+        """
+        Same plan from the catalog, without reading any backup
+        """
+        loaded = catalog.Catalog.load(self.path)
+        for kwargs in [{'keep': 2}, {'retention': 5}, {'tiers': {'daily': 2}}]:
+            expected: retention.Plan = retention.plan(scan_4_backup(self.path), **kwargs)
+            plan: retention.Plan = retention.plan(loaded.paths(), catalog=loaded, **kwargs)
+            self.assertEqual(expected.backups(), plan.backups())
+
+        plan.execute(loaded)
+        self.assertEqual(self.names[1:], list(catalog.Catalog.load(self.path).records))
+
+
+class CompressCatalogTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'catalog_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'catalog_backups')
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for name in range(3):
+            with open(os.path.join(cls.incl_dir, f'{name}.txt'), 'wb') as file:
+                file.write(b'catalog\n' * 1000)
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in [cls.incl_dir, cls.dest_dir]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_record(self):
+        """
+        Every backup made is added with its size, ratio and checksum
+        """
+        catalog_config: dict = valid_config.copy()
+        catalog_config['include'] = [self.incl_dir]
+        catalog_config['destination'] = self.dest_dir
+        catalog_config['arguments'] = {'level': 3, 'threads': 0}
+        catalog_config['settings'] = {**valid_config['settings'], 'shards': 1}
+        configuration = config.Configuration(catalog_config)
+
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        archive: str = os.path.join(self.dest_dir, profile.filename)
+
+        record: dict = catalog.Catalog.load(self.dest_dir).records[profile.filename]
+        self.assertEqual(FULL, record['kind'])
+        self.assertEqual(os.path.getsize(archive), record['size'])
+        self.assertEqual(len(profile), record['source_size'])
+        self.assertEqual(3, record['files'])
+        self.assertEqual([self.incl_dir], record['roots'])
+
+        digest = new_digest()
+        with open(archive, 'rb') as file:
+            digest.update(file.read())
+        self.assertEqual(digest.hexdigest(), record['checksum'])
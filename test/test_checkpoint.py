@@ -0,0 +1,195 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from src import backup, checkpoint, config
+from src.compress import zstd_compress
+from src.frames import read_seek_table
+from src.restore import members, verify
+from test import valid_config, TEST_DIR
+
+
+class Interrupted(Exception):
+    pass
+
+
+class CheckpointTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'checkpoint_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'checkpoint_backups')
+
+    def setUp(self):
+        os.makedirs(self.incl_dir, exist_ok=True)
+        for name in range(6):
+            with open(os.path.join(self.incl_dir, f'{name}.bin'), 'wb') as file:
+                file.write(os.urandom(1 << 20))
+
+    def tearDown(self):
+        shutil.rmtree(self.incl_dir, ignore_errors=True)
+        shutil.rmtree(self.dest_dir, ignore_errors=True)
+
+    def _configuration(self, interval: int = 1, include: str = None) -> config.Configuration:
+        checkpoint_config: dict = valid_config.copy()
+        checkpoint_config['include'] = [include or self.incl_dir]
+        checkpoint_config['destination'] = self.dest_dir
+        checkpoint_config['arguments'] = {'level': 1, 'threads': 0}
+        checkpoint_config['settings'] = {
+            **valid_config['settings'],
+            'shards': 1,
+            'reserve_space': 0,
+            'checkpoint': interval
+        }
+        return config.Configuration(checkpoint_config)
+
+    def _interrupt(self, after: int) -> str:
+        """
+        Run a backup that stops after 'after' checkpoints
+
+        :return: name of the unfinished archive
+        """
+        configuration = self._configuration()
+        profile = backup.BackupProfile(configuration)
+        save = checkpoint.Checkpointer.save
+        saved: list = []
+
+        def _save(checkpointer: checkpoint.Checkpointer) -> None:
+            save(checkpointer)
+            saved.append(checkpointer.done)
+            if len(saved) == after:
+                raise Interrupted()
+
+        checkpoint.Checkpointer.save = _save
+        try:
+            with self.assertRaises(Interrupted):
+                zstd_compress(profile, configuration)
+        finally:
+            checkpoint.Checkpointer.save = save
+
+        return profile.filename
+
+    def test_atomic(self):
+        """
+        Unfinished archive never takes the final name
+        """
+        filename: str = self._interrupt(2)
+        archive: str = os.path.join(self.dest_dir, filename)
+
+        self.assertFalse(os.path.exists(archive))
+        self.assertTrue(os.path.isfile(checkpoint.partial_of(archive)))
+        self.assertTrue(os.path.isfile(checkpoint.log_of(archive)))
+
+    def test_resume(self):
+        """
+        Next backup carries on with the unfinished archive,
+        which ends up the same as one made in a single run
+        """
+        filename: str = self._interrupt(3)
+
+        configuration = self._configuration()
+        profile = backup.BackupProfile(configuration)
+        profile.filename = '2000-Jan-01 00-00-000000.zstd'
+        zstd_compress(profile, configuration)
+        self.assertEqual(filename, profile.filename)
+
+        archive: str = os.path.join(self.dest_dir, filename)
+        self.assertTrue(verify(archive))
+        self.assertEqual(sorted(f'{name}.bin' for name in range(6)),
+                         sorted(os.path.basename(member.name) for member in members(archive)))
+        self.assertFalse(any(name.startswith('.') for name in os.listdir(self.dest_dir)))
+
+        with open(archive, 'rb') as file:
+            resumed: bytes = file.read()
+        os.remove(archive)
+
+        profile = backup.BackupProfile(configuration)
+        profile.filename = filename
+        zstd_compress(profile, configuration)
+        with open(archive, 'rb') as file:
+            self.assertEqual(file.read(), resumed)
+
+    def test_changed(self):
+        """
+        An archive whose written files changed since is started over
+        """
+        filename: str = self._interrupt(3)
+        with open(os.path.join(self.incl_dir, '0.bin'), 'ab') as file:
+            file.write(b'more')
+
+        configuration = self._configuration()
+        profile = backup.BackupProfile(configuration)
+        profile.filename = '2000-Jan-01 00-00-000000.zstd'
+        zstd_compress(profile, configuration)
+
+        self.assertNotEqual(filename, profile.filename)
+        self.assertTrue(verify(os.path.join(self.dest_dir, profile.filename)))
+        self.assertFalse(any(name.startswith('.') for name in os.listdir(self.dest_dir)))
+
+    def test_disabled(self):
+        """
+        Without checkpoints, leftovers are deleted by the next backup
+        """
+        filename: str = self._interrupt(3)
+
+        configuration = self._configuration(0)
+        profile = backup.BackupProfile(configuration)
+        profile.filename = '2000-Jan-01 00-00-000000.zstd'
+        zstd_compress(profile, configuration)
+
+        self.assertNotIn(filename, os.listdir(self.dest_dir))
+        self.assertFalse(any(name.startswith('.') for name in os.listdir(self.dest_dir)))
+
+    def test_other_sources(self):
+        """
+        Leftovers of a backup of other sources are not deleted
+        """
+        filename: str = self._interrupt(3)
+        archive: str = os.path.join(self.dest_dir, filename)
+
+        other: str = os.path.join(TEST_DIR, 'checkpoint_other')
+        os.makedirs(other, exist_ok=True)
+        self.addCleanup(shutil.rmtree, other, ignore_errors=True)
+        with open(os.path.join(other, 'other.bin'), 'wb') as file:
+            file.write(os.urandom(1024))
+
+        configuration = self._configuration(include=other)
+        profile = backup.BackupProfile(configuration)
+        profile.filename = '2000-Jan-01 00-00-000000.zstd'
+        zstd_compress(profile, configuration)
+
+        self.assertEqual('2000-Jan-01 00-00-000000.zstd', profile.filename)
+        self.assertTrue(os.path.isfile(checkpoint.partial_of(archive)))
+        self.assertTrue(os.path.isfile(checkpoint.log_of(archive)))
+
+    def test_running(self):
+        """
+        An archive another process is writing is not deleted
+        """
+        filename: str = self._interrupt(3)
+        archive: str = os.path.join(self.dest_dir, filename)
+
+        configuration = self._configuration(0)
+        profile = backup.BackupProfile(configuration)
+        profile.filename = '2000-Jan-01 00-00-000000.zstd'
+        with checkpoint.hold(archive):
+            zstd_compress(profile, configuration)
+
+        self.assertTrue(os.path.isfile(checkpoint.partial_of(archive)))
+        self.assertTrue(os.path.isfile(checkpoint.log_of(archive)))
+
+    def test_frame_size(self):
+        """
+        Without 'frame_size', frames stay small enough
+        for the seek table, even when checkpoints are far apart.
+        """
+        configuration = self._configuration(1024)
+        profile = backup.BackupProfile(configuration)
+        limit: int = 1 << 20
+        with mock.patch('src.compress.MAX_FRAME_SIZE', limit):
+            zstd_compress(profile, configuration)
+
+        with open(os.path.join(self.dest_dir, profile.filename), 'rb') as file:
+            frames: list = read_seek_table(file)
+        self.assertGreater(len(frames), 1)
+        " A frame ends after the write that reaches the limit "
+        for frame in frames:
+            self.assertLessEqual(frame.data_size, limit + configuration.settings.write_chunk + 1024)
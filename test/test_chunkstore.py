@@ -0,0 +1,183 @@
+import os
+import random
+import shutil
+import unittest
+from datetime import timedelta
+from io import BytesIO
+
+from src import backup, config, time_format, today
+from src.chunkstore import ChunkStore, chunk_backup, chunks, load_snapshot, snapshots
+from test import valid_config, TEST_DIR
+
+
+class ChunkerTest(unittest.TestCase):
+    data: bytes = random.Random(7).randbytes(200 * 1024)
+
+    def _chunks(self, data: bytes) -> list:
+        return list(chunks(BytesIO(data), 1024, 4096, 16384))
+
+    def test_lossless(self):
+        """
+        Chunks put back together must be the original data
+        """
+        self.assertEqual(self.data, b''.join(self._chunks(self.data)))
+
+    def test_sizes(self):
+        result: list = self._chunks(self.data)
+        self.assertGreater(len(result), 1)
+        for chunk in result[:-1]:
+            self.assertGreaterEqual(len(chunk), 1024)
+            self.assertLessEqual(len(chunk), 16384)
+
+    def test_insert_keeps_boundaries(self):
+        """
+        Inserting bytes at the start must only change the first chunks
+        """
+        original: set = set(self._chunks(self.data))
+        edited: list = self._chunks(b'inserted' + self.data)
+
+        shared: int = sum(1 for chunk in edited if chunk in original)
+        self.assertGreaterEqual(shared, len(edited) - 2)
+
+    def test_low_entropy(self):
+        """
+        Data made of 2 byte values is cut as well as random data
+        """
+        data: bytes = bytes(random.Random(5).choices(b'ab', k=200 * 1024))
+        original: list = self._chunks(data)
+        self.assertGreater(len(original), 20)
+        self.assertLess(max(len(chunk) for chunk in original), 16384)
+
+        edited: list = self._chunks(b'inserted' + data)
+        shared: int = sum(1 for chunk in edited if chunk in set(original))
+        self.assertGreaterEqual(shared, len(edited) - 2)
+
+    def test_zeros(self):
+        """
+        Zeros have no boundary, they're cut at max size
+        into identical chunks, stored only once
+        """
+        result: list = self._chunks(bytes(100 * 1024))
+        self.assertEqual([16384] * 6, [len(chunk) for chunk in result[:-1]])
+        self.assertEqual(1, len(set(result[:-1])))
+
+    def test_size(self):
+        file = BytesIO(self.data)
+        file.seek(1000)
+        self.assertEqual(self.data[1000:6000], b''.join(chunks(file, 1024, 4096, 16384, 5000)))
+
+
+class ChunkStoreTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'chunkstore')
+
+    def setUp(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_put_and_get(self):
+        store = ChunkStore(self.path)
+        first: str = store.put(b'hello' * 100)
+        second: str = store.put(b'hello' * 100)
+        self.assertEqual(first, second)
+        store.flush()
+
+        " Index survives a new instance "
+        reopened = ChunkStore(self.path)
+        self.assertIn(first, reopened)
+        self.assertEqual(1, len(reopened.index))
+        self.assertEqual(b'hello' * 100, reopened.get(first))
+
+    def test_gc(self):
+        store = ChunkStore(self.path)
+        kept: str = store.put(b'kept')
+        store.flush()
+        store.put(b'dropped')
+        store.flush()
+
+        store.gc({kept})
+        self.assertEqual({kept}, set(store.index))
+        self.assertEqual(1, len(os.listdir(os.path.join(self.path, 'chunks', 'packs'))))
+
+    def test_gc_unindexed(self):
+        """
+        A pack left by an interrupted backup is dropped
+        """
+        store = ChunkStore(self.path)
+        kept: str = store.put(b'kept')
+        store.flush()
+        store.put(b'never indexed')
+        store._close_pack()
+
+        store.gc({kept})
+        self.assertEqual({kept}, set(ChunkStore(self.path).index))
+        self.assertEqual(1, len(os.listdir(os.path.join(self.path, 'chunks', 'packs'))))
+
+    def test_gc_busy(self):
+        """
+        Nothing is deleted while another backup uses the store
+        """
+        store = ChunkStore(self.path)
+        store.put(b'dropped')
+        store.flush()
+
+        other = ChunkStore(self.path)
+        with other.writing():
+            store.gc(set())
+            self.assertEqual(1, len(ChunkStore(self.path).index))
+
+        store.gc(set())
+        self.assertEqual(0, len(ChunkStore(self.path).index))
+        self.assertEqual([], os.listdir(os.path.join(self.path, 'chunks', 'writers')))
+
+
+class ChunkBackupTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'chunk_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'chunk_backups')
+    configuration: config.Configuration
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        data: bytes = random.Random(3).randbytes(64 * 1024)
+
+        " Two files with the same content "
+        for name in ['a.bin', 'b.bin']:
+            with open(os.path.join(cls.incl_dir, name), 'wb') as file:
+                file.write(data)
+
+        chunk_config: dict = valid_config.copy()
+        chunk_config['include'] = [cls.incl_dir]
+        chunk_config['destination'] = cls.dest_dir
+        cls.configuration = config.Configuration(chunk_config)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.incl_dir)
+        shutil.rmtree(cls.dest_dir)
+
+    def _backup(self, when: int) -> None:
+        profile = backup.BackupProfile(self.configuration)
+        profile.filename = f'{(today + timedelta(minutes=when)).strftime(time_format)}.zstd'
+        chunk_backup(profile, self.configuration)
+
+    def test_deduplicated(self):
+        self._backup(0)
+        store = ChunkStore(self.dest_dir)
+        " Identical files share their only chunk "
+        self.assertEqual(1, len(store.index))
+
+        self._backup(1)
+        self.assertEqual(1, len(ChunkStore(self.dest_dir).index))
+
+        found: list = snapshots(self.dest_dir)
+        self.assertEqual(2, len(found))
+        for item in load_snapshot(found[-1]):
+            path, ids = item[0], item[6]
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), b''.join(store.get(cid) for cid in ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
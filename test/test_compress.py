@@ -0,0 +1,322 @@
+import os
+import shutil
+import stat
+import tarfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+import zstandard as zstd
+
+from src import backup, config
+from src.archive import STRATEGIES
+from src.compress import _compress_shard, compress, memory_estimate, split_shards, zstd_compress
+from src.config.settings import ReadAhead
+from src.frames import read_metadata
+from src.ignore import IgnoreMatcher
+from src.restore import restore, verify
+from src.scanner import scan
+from src.tuner import ChunkTuner
+from test import valid_config, TEST_DIR
+
+
+class CompressTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'compress')
+    entries: list
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.path, exist_ok=True)
+
+        " Files are a few times larger than chunk size used below "
+        for name in range(5):
+            filepath: str = os.path.join(cls.path, f'{name}.txt')
+            with open(filepath, 'wb') as file:
+                file.write(os.urandom(1000 + name))
+
+        cls.entries = list(scan({cls.path}, IgnoreMatcher()).values())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def _compress(self, epb: bool, read_ahead: ReadAhead = None) -> tarfile.TarFile:
+        """
+        Compress 'entries' into memory and return
+        the archive opened for reading.
+        """
+        buffer = BytesIO()
+        writer = zstd.ZstdCompressor().stream_writer(buffer, closefd=False)
+        compress(self.entries, writer, epb, 64, 5010, read_ahead=read_ahead)
+
+        data: bytes = zstd.ZstdDecompressor().decompress(buffer.getvalue(), max_output_size=1 << 20)
+        return tarfile.open(fileobj=BytesIO(data), mode='r:')
+
+    def test_one_member_per_file(self):
+        """
+        Progress bar mode must store each file as a single
+        member, not one member per chunk.
+        """
+        with self._compress(True) as tar:
+            members = tar.getmembers()
+            self.assertEqual(len(self.entries), len(members))
+
+            for member in members:
+                filepath: str = os.path.join(os.sep, member.name)
+                with open(filepath, 'rb') as file:
+                    self.assertEqual(file.read(), tar.extractfile(member).read())
+
+    def test_read_ahead(self):
+        """
+        Files read ahead end up in the same archive
+        """
+        read_ahead = ReadAhead({'enabled': True, 'workers': 2, 'depth': 2})
+        with self._compress(False) as expected, self._compress(False, read_ahead) as tar:
+            for member in expected.getmembers():
+                self.assertEqual(expected.extractfile(member).read(), tar.extractfile(member.name).read())
+
+    def test_io_strategies(self):
+        """
+        Every strategy writes the same archive
+        """
+        expected = BytesIO()
+        compress(self.entries, zstd.ZstdCompressor().stream_writer(expected, closefd=False), False, 64)
+
+        for strategy in STRATEGIES:
+            buffer = BytesIO()
+            writer = zstd.ZstdCompressor().stream_writer(buffer, closefd=False)
+            compress(self.entries, writer, False, 64, io_strategy=strategy, io_threshold=1001)
+            self.assertEqual(expected.getvalue(), buffer.getvalue(), strategy)
+
+    def test_auto_chunk(self):
+        """
+        Tuned chunk size writes the same archive
+        """
+        expected = BytesIO()
+        compress(self.entries, zstd.ZstdCompressor().stream_writer(expected, closefd=False), False, 64)
+
+        tuner = ChunkTuner(16, 4096, trial=0.0)
+        buffer = BytesIO()
+        writer = zstd.ZstdCompressor().stream_writer(buffer, closefd=False)
+        compress(self.entries, writer, False, 64, tuner=tuner)
+
+        self.assertEqual(expected.getvalue(), buffer.getvalue())
+        self.assertTrue(tuner.done)
+        self.assertIn(tuner.chunk_size, tuner.candidates)
+
+    def test_same_as_tar_add(self):
+        """
+        Headers built from the scan must match
+        the ones 'tar.add' creates from a fresh stat.
+        """
+        reference = tarfile.open(fileobj=BytesIO(), mode='w')
+        with self._compress(True) as tar:
+            for member in tar.getmembers():
+                expected: tarfile.TarInfo = reference.gettarinfo(os.path.join(os.sep, member.name))
+                self.assertEqual(expected.name, member.name)
+                self.assertEqual(expected.size, member.size)
+                self.assertEqual(stat.S_IMODE(expected.mode), member.mode)
+                self.assertEqual(int(expected.mtime), int(member.mtime))
+
+
+class ShardTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'shard_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'shard_backups')
+    target: str = os.path.join(TEST_DIR, 'shard_restored')
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for name in range(10):
+            with open(os.path.join(cls.incl_dir, f'{name}.bin'), 'wb') as file:
+                file.write(os.urandom(2000 * (name + 1)))
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in [cls.incl_dir, cls.dest_dir, cls.target]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_split_shards(self):
+        """
+        Shards are about the same size and keep path order
+        """
+        entries: list = list(scan({self.incl_dir}, IgnoreMatcher()).values())
+        shards: list = split_shards(entries, 3)
+
+        self.assertEqual(3, len(shards))
+        self.assertEqual(sorted(entries), sorted(entry for shard in shards for entry in shard))
+        sizes: list = [sum(entry.size for entry in shard) for shard in shards]
+        self.assertLessEqual(max(sizes) - min(sizes), 20000)
+        for shard in shards:
+            self.assertEqual(sorted(shard), shard)
+
+        self.assertEqual(1, len(split_shards(entries[:1], 4)))
+
+    def test_sharded_archive(self):
+        """
+        Joined shards form a single archive, readable by
+        any zstd decoder and restorable member by member.
+        """
+        shard_config: dict = valid_config.copy()
+        shard_config['include'] = [self.incl_dir]
+        shard_config['destination'] = self.dest_dir
+        shard_config['arguments'] = {'level': 1, 'threads': 0}
+        shard_config['settings'] = {**valid_config['settings'], 'shards': 3, 'verify': True}
+        configuration = config.Configuration(shard_config)
+
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        archive: str = os.path.join(self.dest_dir, profile.filename)
+
+        with open(archive, 'rb') as file:
+            self.assertEqual(3, len(read_metadata(file)['shards']))
+            file.seek(0)
+            reader = zstd.ZstdDecompressor().stream_reader(file, read_across_frames=True)
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                self.assertEqual(10, len(tar.getmembers()))
+
+        self.assertTrue(verify(archive))
+        restored: list = restore(archive, self.target, ['5.bin'])
+        self.assertEqual(1, len(restored))
+        with open(os.path.join(self.incl_dir, '5.bin'), 'rb') as original:
+            with open(os.path.join(self.target, restored[0]), 'rb') as file:
+                self.assertEqual(original.read(), file.read())
+
+
+    def test_shard_frame_size(self):
+        """
+        Without 'frame_size', a shard is still cut into frames
+        a seek table can describe (at most MAX_FRAME_SIZE each).
+        """
+        shard_config: dict = valid_config.copy()
+        shard_config['arguments'] = {'level': 1, 'threads': 0}
+        configuration = config.Configuration(shard_config)
+        entries: list = list(scan({self.incl_dir}, IgnoreMatcher()).values())
+        os.makedirs(self.dest_dir, exist_ok=True)
+        filepath: str = os.path.join(self.dest_dir, 'shard.tmp')
+
+        limit: int = 16 * 1024
+        with mock.patch('src.compress.MAX_FRAME_SIZE', limit):
+            _, _, frames, size, _ = _compress_shard(
+                entries, filepath, configuration.zstd_arguments, 1, False, configuration.settings
+            )
+        os.remove(filepath)
+
+        self.assertGreater(len(frames), 1)
+        self.assertEqual(size, sum(frame.data_size for frame in frames))
+        " A frame ends after the write that reaches the limit, files are written whole here "
+        largest: int = max(entry.size for entry in entries) + 3 * tarfile.BLOCKSIZE
+        for frame in frames:
+            self.assertLessEqual(frame.data_size, limit + largest)
+
+
+class PolicyCompressTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'policy_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'policy_backups')
+    target: str = os.path.join(TEST_DIR, 'policy_restored')
+
+    @classmethod
+    def setUpClass(cls):
+        " Stored and compressed files take turns in path order "
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for name in range(6):
+            ext: str = 'jpg' if name % 2 else 'txt'
+            with open(os.path.join(cls.incl_dir, f'{name}.{ext}'), 'wb') as file:
+                file.write(os.urandom(3000) if name % 2 else b'text' * 3000)
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in [cls.incl_dir, cls.dest_dir, cls.target]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_policy(self):
+        """
+        Files are grouped by level, one frame per group,
+        and the archive restores as usual (sharded or not)
+        """
+        for shards in (1, 2):
+            policy_config: dict = valid_config.copy()
+            policy_config['include'] = [self.incl_dir]
+            policy_config['destination'] = self.dest_dir
+            policy_config['arguments'] = {'level': 3, 'threads': 0, 'policy': {'enabled': True}}
+            policy_config['settings'] = {**valid_config['settings'], 'shards': shards, 'verify': True}
+            configuration = config.Configuration(policy_config)
+
+            profile = backup.BackupProfile(configuration)
+            zstd_compress(profile, configuration)
+            archive: str = os.path.join(self.dest_dir, profile.filename)
+
+            if shards == 1:
+                with open(archive, 'rb') as file:
+                    data: bytes = file.read()
+                frames: int = 0
+                while data:
+                    dobj = zstd.ZstdDecompressor().decompressobj()
+                    dobj.decompress(data)
+                    data = dobj.unused_data
+                    frames += 1
+                " A frame per level, then the metadata frame "
+                self.assertEqual(3, frames)
+
+            self.assertTrue(verify(archive))
+            self.assertEqual(6, len(restore(archive, self.target)))
+            shutil.rmtree(self.dest_dir)
+
+
+class AdvancedParametersTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'advanced_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'advanced_backups')
+    target: str = os.path.join(TEST_DIR, 'advanced_restored')
+
+    @classmethod
+    def setUpClass(cls):
+        " Same random block in several files, like layers of images "
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        block: bytes = os.urandom(256 * 1024)
+        for name in range(3):
+            with open(os.path.join(cls.incl_dir, f'{name}.img'), 'wb') as file:
+                file.write(block)
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in [cls.incl_dir, cls.dest_dir, cls.target]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _arguments(self, **arguments) -> config.ZstdArguments:
+        return config.ZstdArguments({'level': 3, 'threads': 0, **arguments})
+
+    def test_memory_estimate(self):
+        compress_memory, decompress_memory = memory_estimate(self._arguments())
+        self.assertEqual(1 << 21, decompress_memory)
+
+        larger, decompress_memory = memory_estimate(self._arguments(window_log=27, long_distance_matching=True))
+        self.assertEqual(1 << 27, decompress_memory)
+        self.assertGreater(larger, compress_memory)
+
+    def test_long_window(self):
+        """
+        Windows beyond what decoders accept by default still restore
+        """
+        advanced_config: dict = valid_config.copy()
+        advanced_config['include'] = [self.incl_dir]
+        advanced_config['destination'] = self.dest_dir
+        advanced_config['arguments'] = {'level': 3, 'threads': 0, 'window_log': 28, 'enable_ldm': True,
+                                        'strategy': 'lazy2'}
+        advanced_config['settings'] = {**valid_config['settings'], 'verify': True}
+        configuration = config.Configuration(advanced_config)
+
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        archive: str = os.path.join(self.dest_dir, profile.filename)
+
+        " Repeated blocks are stored once "
+        self.assertLess(os.path.getsize(archive), 2 * 256 * 1024)
+        with open(archive, 'rb') as file:
+            self.assertEqual(1 << 28, zstd.get_frame_parameters(file.read(18)).window_size)
+
+        self.assertTrue(verify(archive))
+        self.assertEqual(3, len(restore(archive, self.target)))
+
+
+if __name__ == '__main__':
+    unittest.main()
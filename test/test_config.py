@@ -2,7 +2,8 @@ import unittest
 from logging import DEBUG
 from platform import system
 
-from src.config import OldBackupsSettings, ZstdArguments, Configuration
+from src.config import IncrementalSettings, OldBackupsSettings, ZstdArguments, Configuration
+from src.config.settings import Settings
 from test import valid_config
 
 
@@ -43,6 +44,26 @@ class OldBackupSettingsTest(unittest.TestCase):
         self.assertFalse(configuration.del_old_4_space)
         self.assertTrue(configuration.aggressive)
 
+    def test_gfs(self):
+        """
+        'gfs' is optional and off by default
+        """
+        values: dict = valid_config['old_backups'].copy()
+        self.assertFalse(OldBackupsSettings(values).gfs.enabled)
+
+        gfs = OldBackupsSettings({**values, 'gfs': {'daily': 7, 'weekly': 4, 'monthly': -1, 'yearly': 'all'}}).gfs
+        self.assertTrue(gfs.enabled)
+        self.assertEqual({'daily': 7, 'weekly': 4, 'monthly': 0, 'yearly': 0}, gfs.tiers)
+
+    def test_dry_run(self):
+        """
+        'dry_run' is optional and off by default
+        """
+        values: dict = valid_config['old_backups'].copy()
+        self.assertFalse(OldBackupsSettings(values).dry_run)
+        self.assertTrue(OldBackupsSettings({**values, 'dry_run': True}).dry_run)
+        self.assertFalse(OldBackupsSettings({**values, 'dry_run': 'yes'}).dry_run)
+
 
 class ZstdArgumentsTest(unittest.TestCase):
 
@@ -73,6 +94,103 @@ class ZstdArgumentsTest(unittest.TestCase):
         self.assertEqual(1, configuration.level)
         self.assertEqual(2, configuration.threads)
 
+    def test_frame_size(self):
+        """
+        'frame_size' is optional, given in MiB and capped at 1024
+        """
+        self.assertEqual(0, ZstdArguments({'level': 1, 'threads': 0}).frame_size)
+        self.assertEqual(32 << 20, ZstdArguments({'level': 1, 'threads': 0, 'frame_size': 32}).frame_size)
+        self.assertEqual(1024 << 20, ZstdArguments({'level': 1, 'threads': 0, 'frame_size': 4096}).frame_size)
+        self.assertEqual(0, ZstdArguments({'level': 1, 'threads': 0, 'frame_size': -1}).frame_size)
+
+    def test_checksum(self):
+        """
+        'checksum' is optional and on by default
+        """
+        self.assertTrue(ZstdArguments({'level': 1, 'threads': 0}).checksum)
+        self.assertTrue(ZstdArguments({'level': 1, 'threads': 0, 'checksum': 'no'}).checksum)
+        self.assertFalse(ZstdArguments({'level': 1, 'threads': 0, 'checksum': False}).checksum)
+
+    def test_advanced_parameters(self):
+        """
+        Advanced parameters are optional, 0 (auto) by default or when invalid
+        """
+        arguments = ZstdArguments({'level': 1, 'threads': 0})
+        self.assertEqual(0, arguments.window_log)
+        self.assertFalse(arguments.long_distance_matching)
+        self.assertEqual(0, arguments.ldm_hash_log)
+        self.assertEqual(0, arguments.strategy)
+        self.assertEqual(0, arguments.job_size)
+        self.assertEqual(0, arguments.overlap_log)
+
+        arguments = ZstdArguments({'level': 1, 'threads': 0, 'window_log': 27, 'enable_ldm': True, 'ldm_hash_log': 20,
+                                   'strategy': 'BTultra2', 'job_size': 8, 'overlap_log': 6})
+        self.assertEqual(27, arguments.window_log)
+        self.assertTrue(arguments.long_distance_matching)
+        self.assertEqual(20, arguments.ldm_hash_log)
+        self.assertEqual(9, arguments.strategy)
+        self.assertEqual(8 << 20, arguments.job_size)
+        self.assertEqual(6, arguments.overlap_log)
+
+        arguments = ZstdArguments({'level': 1, 'threads': 0, 'window_log': 40, 'strategy': 'best', 'overlap_log': 10})
+        self.assertEqual(0, arguments.window_log)
+        self.assertEqual(0, arguments.strategy)
+        self.assertEqual(0, arguments.overlap_log)
+
+    def test_time_budget(self):
+        """
+        'time_budget' is in minutes, 'target_speed' in MiB/s, both off by default
+        """
+        arguments = ZstdArguments({'level': 1, 'threads': 0})
+        self.assertEqual(0, arguments.time_budget)
+        self.assertEqual(0, arguments.target_speed)
+
+        arguments = ZstdArguments({'level': 1, 'threads': 0, 'time_budget': 30, 'target_speed': 50})
+        self.assertEqual(30 * 60, arguments.time_budget)
+        self.assertEqual(50 << 20, arguments.target_speed)
+
+        arguments = ZstdArguments({'level': 1, 'threads': 0, 'time_budget': -5, 'target_speed': 'fast'})
+        self.assertEqual(0, arguments.time_budget)
+        self.assertEqual(0, arguments.target_speed)
+
+    def test_policy(self):
+        """
+        'policy' is optional and off by default
+        """
+        policy = ZstdArguments({'level': 1, 'threads': 0}).policy
+        self.assertFalse(policy.enabled)
+        self.assertIn('zst', policy.store)
+        self.assertEqual({}, policy.levels)
+        self.assertTrue(policy.sniff)
+        self.assertEqual(7.5, policy.entropy)
+
+        values: dict = {'enabled': True, 'store': ['.MKV'], 'levels': {'.Log': 19, 'csv': 'store', 'txt': 'max'}, 'entropy': 9}
+        policy = ZstdArguments({'level': 1, 'threads': 0, 'policy': values}).policy
+        self.assertTrue(policy.enabled)
+        self.assertEqual({'mkv'}, policy.store)
+        self.assertEqual({'log': 19, 'csv': 'store'}, policy.levels)
+        self.assertEqual(7.5, policy.entropy)
+
+
+class IncrementalSettingsTest(unittest.TestCase):
+
+    def test_default_values(self):
+        """
+        Missing or invalid values fall back to defaults
+        """
+        configuration = IncrementalSettings({'enabled': 'yes', 'full_every': 0})
+        self.assertFalse(configuration.enabled)
+        self.assertEqual(1, configuration.full_every)
+
+        configuration = IncrementalSettings({})
+        self.assertFalse(configuration.enabled)
+        self.assertEqual(7, configuration.full_every)
+
+    def test_valid_values(self):
+        configuration = IncrementalSettings({'enabled': True, 'full_every': 4})
+        self.assertTrue(configuration.enabled)
+        self.assertEqual(4, configuration.full_every)
+
 
 class SettingsTest(unittest.TestCase):
     config: Configuration
@@ -84,9 +202,121 @@ class SettingsTest(unittest.TestCase):
     def test_write_chunk(self):
         self.assertEqual(1024, self.config.settings.write_chunk)
 
+    def test_auto_write_chunk(self):
+        """
+        'auto' is stored as 0, limits are optional (KiB)
+        """
+        settings = Settings({**valid_config['settings'], 'write_chunk': 'auto'})
+        self.assertEqual(0, settings.write_chunk)
+
+        " Only 'auto' means auto, 0 is as wrong as it always was "
+        settings = Settings({**valid_config['settings'], 'write_chunk': 0})
+        self.assertEqual(1024, settings.write_chunk)
+        self.assertEqual((64 << 10, 16 << 20), settings.write_chunk_limits)
+
+        settings = Settings({**valid_config['settings'], 'write_chunk_limits': [256, 1024]})
+        self.assertEqual((256 << 10, 1 << 20), settings.write_chunk_limits)
+
+        settings = Settings({**valid_config['settings'], 'write_chunk_limits': [1024, 256]})
+        self.assertEqual((64 << 10, 16 << 20), settings.write_chunk_limits)
+
     def test_progress_bar(self):
         self.assertTrue(self.config.settings.progress_bar.enabled)
 
+    def test_scan_workers(self):
+        self.assertEqual(2, Settings({**valid_config['settings'], 'scan_workers': 2}).scan_workers)
+
+    def test_optional_scan_workers(self):
+        """
+        Configs written before 'scan_workers' existed must still load
+        """
+        self.assertEqual(0, Settings(valid_config['settings'].copy()).scan_workers)
+
+    def test_reserve_space(self):
+        """
+        'reserve_space' is in MiB, 64 by default
+        """
+        settings: dict = valid_config['settings'].copy()
+        self.assertEqual(64 << 20, Settings(settings).reserve_space)
+        self.assertEqual(0, Settings({**settings, 'reserve_space': 0}).reserve_space)
+        self.assertEqual(0, Settings({**settings, 'reserve_space': -1}).reserve_space)
+        self.assertEqual(64 << 20, Settings({**settings, 'reserve_space': 'lots'}).reserve_space)
+
+    def test_checkpoint(self):
+        """
+        'checkpoint' is in MiB, off by default
+        """
+        settings: dict = valid_config['settings'].copy()
+        self.assertEqual(0, Settings(settings).checkpoint)
+        self.assertEqual(256 << 20, Settings({**settings, 'checkpoint': 256}).checkpoint)
+        self.assertEqual(0, Settings({**settings, 'checkpoint': -1}).checkpoint)
+        self.assertEqual(0, Settings({**settings, 'checkpoint': 'often'}).checkpoint)
+        self.assertEqual(1024 << 20, Settings({**settings, 'checkpoint': 4096}).checkpoint)
+
+    def test_verify(self):
+        """
+        'verify' is optional and off by default
+        """
+        self.assertFalse(Settings(valid_config['settings']).verify)
+        self.assertTrue(Settings({**valid_config['settings'], 'verify': True}).verify)
+
+    def test_shards(self):
+        """
+        'shards' is optional, 1 (no sharding) by default
+        """
+        self.assertEqual(1, Settings(valid_config['settings']).shards)
+        self.assertEqual(0, Settings({**valid_config['settings'], 'shards': 0}).shards)
+        self.assertEqual(1, Settings({**valid_config['settings'], 'shards': -2}).shards)
+
+    def test_read_ahead(self):
+        """
+        'read_ahead' is optional and off by default
+        """
+        read_ahead = Settings(valid_config['settings']).read_ahead
+        self.assertFalse(read_ahead.enabled)
+        self.assertEqual(4, read_ahead.workers)
+        self.assertEqual(16, read_ahead.depth)
+        self.assertEqual(64 << 20, read_ahead.memory)
+
+        settings: dict = {**valid_config['settings'], 'read_ahead': {'enabled': True, 'depth': 0, 'memory': 8}}
+        read_ahead = Settings(settings).read_ahead
+        self.assertTrue(read_ahead.enabled)
+        self.assertEqual(1, read_ahead.depth)
+        self.assertEqual(8 << 20, read_ahead.memory)
+
+    def test_read_order(self):
+        self.assertEqual('path', Settings(valid_config['settings']).read_order)
+        self.assertEqual('extent', Settings({**valid_config['settings'], 'read_order': 'Extent'}).read_order)
+        self.assertEqual('path', Settings({**valid_config['settings'], 'read_order': 'random'}).read_order)
+
+    def test_io_strategy(self):
+        settings = Settings(valid_config['settings'])
+        self.assertEqual('readinto', settings.io_strategy)
+        self.assertEqual(16 << 20, settings.io_threshold)
+
+        settings = Settings({**valid_config['settings'], 'io_strategy': 'mmap', 'io_threshold': 0})
+        self.assertEqual('mmap', settings.io_strategy)
+        self.assertEqual(0, settings.io_threshold)
+
+    def test_dictionary(self):
+        """
+        'dictionary' is optional and off by default
+        """
+        dictionary = Settings(valid_config['settings']).dictionary
+        self.assertFalse(dictionary.enabled)
+        self.assertEqual(112 << 10, dictionary.size)
+        self.assertEqual(1000, dictionary.samples)
+        self.assertEqual(128 << 10, dictionary.sample_size)
+        self.assertEqual(0, dictionary.retrain)
+
+        settings: dict = {**valid_config['settings'],
+                          'dictionary': {'enabled': True, 'size': 64, 'samples': 0, 'retrain': 30}}
+        dictionary = Settings(settings).dictionary
+        self.assertTrue(dictionary.enabled)
+        self.assertEqual(64 << 10, dictionary.size)
+        self.assertEqual(1000, dictionary.samples)
+        self.assertEqual(30, dictionary.retrain)
+
 
 class ConfigurationTest(unittest.TestCase):
     config: Configuration
@@ -144,6 +374,11 @@ class ConfigurationTest(unittest.TestCase):
         self.assertFalse(self.config.old_backups_settings.del_old_4_space)
         self.assertTrue(self.config.old_backups_settings.aggressive)
 
+    def test_incremental(self):
+        configuration = Configuration({**valid_config, 'incremental': {'enabled': False, 'full_every': 3}})
+        self.assertFalse(configuration.incremental.enabled)
+        self.assertEqual(3, configuration.incremental.full_every)
+
     def test_zstd_arguments(self):
         """
         Assert 'zstd_arguments' properties
@@ -193,6 +428,23 @@ class ConfigurationTest(unittest.TestCase):
         except TypeError:
             self.fail('"include" string was not parsed properly!')
 
+    def test_ignore_patterns(self):
+        """
+        Glob patterns are kept apart from literal paths, in order
+        """
+        patterns_ignore = valid_config.copy()
+        patterns_ignore['ignore'] = ['/ignore/this/path', '*.tmp', '**/node_modules', '!keep.tmp']
+        configuration: Configuration = Configuration(patterns_ignore)
+
+        self.assertEqual({'/ignore/this/path'}, configuration.ignore_paths)
+        self.assertEqual(['*.tmp', '**/node_modules', '!keep.tmp'], configuration.ignore_patterns)
+
+    def test_ignore_file(self):
+        """
+        'ignore_file' is optional and defaults to '.backupignore'
+        """
+        self.assertEqual('.backupignore', self.config.ignore_file)
+
     def test_acceptable_ignore(self):
         """
         'ignore' accepts string as valid value.
@@ -0,0 +1,166 @@
+import json
+import os
+import shutil
+import unittest
+
+import zstandard as zstd
+
+from src import backup, config, dictionary
+from src.chunkstore import ChunkStore, chunk_backup, snapshots
+from src.compress import new_compressor, zstd_compress
+from src.frames import read_metadata, read_seek_table
+from src.ignore import IgnoreMatcher
+from src.restore import restore, verify
+from src.scanner import scan
+from test import valid_config, TEST_DIR
+
+
+class DictionaryTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'dictionary_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'dictionary_backups')
+    target: str = os.path.join(TEST_DIR, 'dictionary_restored')
+
+    @classmethod
+    def setUpClass(cls):
+        " Many small files sharing most of their content "
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for i in range(200):
+            with open(os.path.join(cls.incl_dir, f'{i}.json'), 'w') as file:
+                json.dump({'id': i, 'name': f'service-{i % 13}', 'port': 8000 + i,
+                           'tags': ['backup', 'zstd', str(i % 7)], 'enabled': i % 2 == 0}, file)
+
+    @classmethod
+    def tearDownClass(cls):
+        for path in [cls.incl_dir, cls.dest_dir, cls.target]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def tearDown(self):
+        for path in [self.dest_dir, self.target]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _config(self, dictionary_settings: dict = None, **arguments) -> config.Configuration:
+        dict_config: dict = valid_config.copy()
+        dict_config['include'] = [self.incl_dir]
+        dict_config['destination'] = self.dest_dir
+        dict_config['arguments'] = {'level': 3, 'threads': 0, **arguments}
+        dict_config['settings'] = {**valid_config['settings'],
+                                   'dictionary': {'enabled': True, 'size': 4, **(dictionary_settings or {})}}
+        return config.Configuration(dict_config)
+
+    def test_sample(self):
+        entries: list = list(scan({self.incl_dir}, IgnoreMatcher()).values())
+        self.assertEqual(50, len(dictionary.sample(entries, 50, 1024)))
+        self.assertEqual(200, len(dictionary.sample(entries, 1000, 1024)))
+        self.assertEqual([], dictionary.sample(entries, 50, 10))
+
+    def test_source_key(self):
+        """
+        Same paths, in any order, share a dictionary
+        """
+        self.assertEqual(dictionary.source_key(['/a', '/b']), dictionary.source_key(['/b', '/a']))
+        self.assertNotEqual(dictionary.source_key(['/a']), dictionary.source_key(['/b']))
+
+    def test_reused(self):
+        """
+        Dictionary is trained once, later backups load it
+        """
+        configuration = self._config()
+        trained = dictionary.prepare(backup.BackupProfile(configuration), configuration)
+        self.assertIsNotNone(trained)
+        self.assertEqual(1, len(os.listdir(os.path.join(self.dest_dir, dictionary.FOLDER))))
+
+        loaded = dictionary.prepare(backup.BackupProfile(configuration), configuration)
+        self.assertEqual(trained.dict_id(), loaded.dict_id())
+
+    def test_retrain(self):
+        """
+        An old dictionary is replaced by a new one, but kept
+        until the last backup compressed with it is deleted
+        """
+        configuration = self._config({'retrain': 1})
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        archive: str = os.path.join(self.dest_dir, profile.filename)
+
+        folder: str = os.path.join(self.dest_dir, dictionary.FOLDER)
+        old: str = os.path.join(folder, os.listdir(folder)[0])
+        os.utime(old, (0, 0))
+
+        " A different size, so the new dictionary differs from the old one "
+        configuration = self._config({'retrain': 1, 'size': 8})
+        trained = dictionary.prepare(backup.BackupProfile(configuration), configuration)
+        self.assertEqual(2, len(os.listdir(folder)))
+        self.assertTrue(verify(archive))
+
+        os.remove(archive)
+        self.assertEqual(trained.dict_id(), dictionary.prepare(backup.BackupProfile(configuration), configuration).dict_id())
+        self.assertEqual([f'{os.path.basename(old)[:16]}-{trained.dict_id()}{dictionary.EXTENSION}'], os.listdir(folder))
+
+    def test_archive(self):
+        """
+        Archives restore without being told about the dictionary,
+        with or without 'frame_size' they're seekable
+        """
+        for frame_size in (0, 1):
+            configuration = self._config(frame_size=frame_size)
+            profile = backup.BackupProfile(configuration)
+            zstd_compress(profile, configuration)
+            archive: str = os.path.join(self.dest_dir, profile.filename)
+
+            with open(archive, 'rb') as file:
+                dict_data = dictionary.for_archive(file)
+                self.assertIsNotNone(dict_data)
+                self.assertEqual(dict_data.dict_id(), read_metadata(file)['dictionary'])
+                self.assertGreater(len(read_seek_table(file)), 1)
+
+            self.assertTrue(verify(archive))
+            self.assertEqual(200, len(restore(archive, self.target)))
+
+            " Archive is useless without its dictionary "
+            shutil.rmtree(os.path.join(self.dest_dir, dictionary.FOLDER))
+            dictionary.find.cache_clear()
+            self.assertFalse(verify(archive))
+            self.tearDown()
+
+    def test_smaller(self):
+        """
+        Frames are smaller than the same frames without the dictionary
+        """
+        configuration = self._config()
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+
+        cctx = new_compressor(configuration.zstd_arguments)
+        plain: int = 0
+        with open(os.path.join(self.dest_dir, profile.filename), 'rb') as file:
+            dctx = zstd.ZstdDecompressor(dict_data=dictionary.for_archive(file))
+            frames: list = read_seek_table(file)
+            for frame in frames:
+                file.seek(frame.offset)
+                data: bytes = dctx.decompress(file.read(frame.size), max_output_size=frame.data_size)
+                plain += len(cctx.compress(data))
+
+        self.assertLess(sum(frame.size for frame in frames), plain)
+
+    def test_chunk_store(self):
+        """
+        Chunks with and without a dictionary live in the same store
+        """
+        configuration = self._config()
+        dict_data = dictionary.prepare(backup.BackupProfile(configuration), configuration)
+
+        store = ChunkStore(self.dest_dir)
+        plain: str = store.put(b'no dictionary' * 100)
+        store.flush()
+        store = ChunkStore(self.dest_dir, 3, dict_data)
+        trained: str = store.put(b'{"id": 1, "name": "service-1"}')
+        store.flush()
+
+        store = ChunkStore(self.dest_dir)
+        self.assertEqual(b'no dictionary' * 100, store.get(plain))
+        self.assertEqual(b'{"id": 1, "name": "service-1"}', store.get(trained))
+
+    def test_chunk_backup(self):
+        configuration = self._config()
+        chunk_backup(backup.BackupProfile(configuration), configuration)
+        self.assertTrue(verify(snapshots(self.dest_dir)[-1]))
@@ -0,0 +1,168 @@
+import os
+import shutil
+import tarfile
+import unittest
+from io import BytesIO
+
+import zstandard as zstd
+
+from src.compress import compress
+from src.frames import FrameReader, FrameWriter, StoredFrames, open_member, read_metadata, read_seek_table, write_metadata, \
+    write_seek_table
+from src.ignore import IgnoreMatcher
+from src.scanner import scan
+from test import TEST_DIR
+
+
+class FramesTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'frames')
+    entries: list
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.path, exist_ok=True)
+
+        for name in range(8):
+            with open(os.path.join(cls.path, f'{name}.bin'), 'wb') as file:
+                file.write(os.urandom(3000 * (name + 1)))
+
+        cls.entries = list(scan({cls.path}, IgnoreMatcher()).values())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def _seekable(self, frame_size: int) -> tuple:
+        """
+        Compress 'entries' the same way 'zstd_compress' does
+        in seekable mode.
+
+        :return: archive and its member index
+        """
+        buffer = BytesIO()
+        members: dict = {}
+        writer = FrameWriter(zstd.ZstdCompressor(), buffer, frame_size)
+        compress(self.entries, writer, False, 1024, members=members)
+
+        write_metadata(buffer, {'members': members})
+        write_seek_table(buffer, writer.frames)
+        return buffer, members
+
+    def test_seek_table(self):
+        """
+        Frames are contiguous and cover the whole tarball
+        """
+        buffer, _ = self._seekable(10000)
+        frames: list = read_seek_table(buffer)
+        self.assertGreater(len(frames), 1)
+
+        offset: int = 0
+        data_offset: int = 0
+        for frame in frames:
+            self.assertEqual(offset, frame.offset)
+            self.assertEqual(data_offset, frame.data_offset)
+            offset += frame.size
+            data_offset += frame.data_size
+
+        data: bytes = FrameReader(buffer, frames).read()
+        self.assertEqual(data_offset, len(data))
+
+    def test_plain_zstd_can_read(self):
+        """
+        Seek table and metadata are skippable frames,
+        any zstd decoder reads the archive as usual.
+        """
+        buffer, _ = self._seekable(10000)
+        buffer.seek(0)
+        reader = zstd.ZstdDecompressor().stream_reader(buffer, read_across_frames=True)
+
+        with tarfile.open(fileobj=reader, mode='r|') as tar:
+            names: list = [member.name for member in tar]
+        self.assertEqual(len(self.entries), len(names))
+
+    def test_member_index(self):
+        """
+        Each file can be read from the frames it sits in
+        """
+        buffer, members = self._seekable(10000)
+        self.assertEqual(members, read_metadata(buffer)['members'])
+        frames: list = read_seek_table(buffer)
+
+        for entry in self.entries:
+            name: str = os.path.splitdrive(entry.path)[1].replace(os.sep, '/').lstrip('/')
+            start, end = members[name]
+
+            member, data = open_member(buffer, frames, start)
+            self.assertEqual(name, member.name)
+            with open(entry.path, 'rb') as file:
+                self.assertEqual(file.read(), data.read())
+
+    def test_only_needed_frames(self):
+        """
+        Reading from the middle of the stream
+        never decompresses earlier frames.
+        """
+        buffer, _ = self._seekable(4096)
+        frames: list = read_seek_table(buffer)
+        middle = frames[len(frames) // 2]
+
+        reader = FrameReader(buffer, frames, middle.data_offset + 1)
+        reader.read(middle.data_size - 1)
+        self.assertEqual(1, reader.decompressed)
+
+    def test_switch_compressor(self):
+        """
+        Frames of different compressors still form a valid seek table
+        """
+        buffer = BytesIO()
+        writer = FrameWriter(zstd.ZstdCompressor(level=1), buffer)
+        writer.write(b'a' * 5000)
+        writer.use(zstd.ZstdCompressor(level=19))
+        writer.write(b'b' * 5000)
+        writer.end_frame()
+        write_seek_table(buffer, writer.frames)
+
+        frames: list = read_seek_table(buffer)
+        self.assertEqual(2, len(frames))
+        self.assertEqual(frames[0].size, frames[1].offset)
+        self.assertEqual(b'a' * 5000 + b'b' * 5000, FrameReader(buffer, frames).read())
+
+    def test_stored(self):
+        """
+        Stored frames hold data as it is, zstd reads them like any other
+        """
+        data: bytes = os.urandom(300 * 1024)
+        buffer = BytesIO()
+        writer = FrameWriter(zstd.ZstdCompressor(level=1), buffer)
+        writer.write(b'a' * 5000)
+        writer.use(StoredFrames())
+        writer.write(data)
+        writer.write(b'')
+        writer.end_frame()
+        write_seek_table(buffer, writer.frames)
+
+        frames: list = read_seek_table(buffer)
+        self.assertEqual(2, len(frames))
+        " Header, then 3 blocks each with a 3-byte header "
+        self.assertEqual(6 + 3 * 3 + len(data), frames[1].size)
+        self.assertIn(data[:1000], buffer.getvalue())
+        self.assertEqual(b'a' * 5000 + data, FrameReader(buffer, frames).read())
+
+        buffer.seek(0)
+        reader = zstd.ZstdDecompressor().stream_reader(buffer, read_across_frames=True)
+        self.assertEqual(b'a' * 5000 + data, reader.read())
+
+    def test_single_frame(self):
+        """
+        Archive without seek table has no metadata either
+        """
+        buffer = BytesIO()
+        writer = zstd.ZstdCompressor().stream_writer(buffer, closefd=False)
+        compress(self.entries, writer, False, 1024)
+
+        self.assertIsNone(read_seek_table(buffer))
+        self.assertEqual({}, read_metadata(buffer))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import unittest
+
+from src.ignore import IgnoreMatcher, PathTrie, is_pattern
+
+
+class PathTrieTest(unittest.TestCase):
+    trie: PathTrie
+
+    @classmethod
+    def setUpClass(cls):
+        cls.trie = PathTrie([
+            os.path.join(os.sep, 'a', 'b'),
+            os.path.join(os.sep, 'x', 'y', 'z'),
+            os.path.join(os.sep, 'x', 'y', 'z', 'deeper')
+        ])
+
+    def test_exact_match(self):
+        self.assertTrue(self.trie.match(os.path.join(os.sep, 'a', 'b')))
+        self.assertTrue(self.trie.match(os.path.join(os.sep, 'x', 'y', 'z')))
+
+    def test_children_match(self):
+        """
+        Everything inside an ignored folder is ignored
+        """
+        self.assertTrue(self.trie.match(os.path.join(os.sep, 'a', 'b', 'c')))
+        self.assertTrue(self.trie.match(os.path.join(os.sep, 'x', 'y', 'z', 'file.txt')))
+
+    def test_sibling_prefix(self):
+        """
+        Ignoring '/a/b' must not ignore '/a/bc'
+        """
+        self.assertFalse(self.trie.match(os.path.join(os.sep, 'a', 'bc')))
+        self.assertFalse(self.trie.match(os.path.join(os.sep, 'a', 'bc', 'd')))
+
+    def test_parents_not_ignored(self):
+        self.assertFalse(self.trie.match(os.sep))
+        self.assertFalse(self.trie.match(os.path.join(os.sep, 'a')))
+        self.assertFalse(self.trie.match(os.path.join(os.sep, 'x', 'y')))
+
+    def test_normalized(self):
+        """
+        Trailing and doubled separators don't matter
+        """
+        self.assertTrue(self.trie.match(os.path.join(os.sep, 'a', 'b') + os.sep))
+        self.assertTrue(self.trie.match(os.sep + os.sep + os.path.join('a', 'b', 'c')))
+
+    def test_length(self):
+        self.assertEqual(3, len(self.trie))
+
+
+class IgnoreMatcherTest(unittest.TestCase):
+
+    def test_is_pattern(self):
+        for rule in ['*.tmp', '**/node_modules', '!keep.log', 'file?.txt', 'log[0-9]']:
+            self.assertTrue(is_pattern(rule), rule)
+        for rule in ['/path/to/ignore', './relative/path', '~/home/path']:
+            self.assertFalse(is_pattern(rule), rule)
+
+    def test_basename_pattern(self):
+        """
+        Pattern without a slash matches at any depth
+        """
+        matcher = IgnoreMatcher(patterns=['*.tmp'])
+        self.assertTrue(matcher.match('/a/b/file.tmp'))
+        self.assertTrue(matcher.match('/file.tmp'))
+        self.assertFalse(matcher.match('/a/b/file.tmp.txt'))
+
+    def test_double_star(self):
+        matcher = IgnoreMatcher(patterns=['**/node_modules', '/srv/**/cache'])
+        self.assertTrue(matcher.match('/a/node_modules', True))
+        self.assertTrue(matcher.match('/a/b/c/node_modules', True))
+        self.assertTrue(matcher.match('/srv/cache', True))
+        self.assertTrue(matcher.match('/srv/x/y/cache', True))
+        self.assertFalse(matcher.match('/opt/x/cache', True))
+
+    def test_negation(self):
+        """
+        Later rules win over earlier ones
+        """
+        matcher = IgnoreMatcher(patterns=['*.log', '!keep.log'])
+        self.assertTrue(matcher.match('/var/other.log'))
+        self.assertFalse(matcher.match('/var/keep.log'))
+
+        matcher = IgnoreMatcher(patterns=['!keep.log', '*.log'])
+        self.assertTrue(matcher.match('/var/keep.log'))
+
+    def test_directory_only(self):
+        matcher = IgnoreMatcher(patterns=['build*/'])
+        self.assertTrue(matcher.match('/src/build', True))
+        self.assertFalse(matcher.match('/src/build'))
+
+    def test_character_class(self):
+        matcher = IgnoreMatcher(patterns=['log[0-9].txt', 'tmp[!a].txt'])
+        self.assertTrue(matcher.match('/log1.txt'))
+        self.assertFalse(matcher.match('/logx.txt'))
+        self.assertTrue(matcher.match('/tmpb.txt'))
+        self.assertFalse(matcher.match('/tmpa.txt'))
+
+    def test_literal_paths(self):
+        """
+        Literal paths and patterns work together
+        """
+        matcher = IgnoreMatcher([os.path.join(os.sep, 'a', 'b')], ['*.tmp'])
+        self.assertTrue(matcher.match(os.path.join(os.sep, 'a', 'b', 'c')))
+        self.assertFalse(matcher.match(os.path.join(os.sep, 'a', 'bc')))
+        self.assertTrue(matcher.match(os.path.join(os.sep, 'a', 'bc.tmp')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import unittest
+from datetime import timedelta
+
+from src import backup, config, time_format, today
+from src.compress import zstd_compress
+from src.dir import scan_4_backup
+from src.manifest import FULL, INCREMENTAL, Manifest, path_of
+from test import valid_config, TEST_DIR
+
+
+class ManifestTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'manifest')
+
+    def setUp(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_save_and_load(self):
+        archive: str = os.path.join(self.path, f'{today.strftime(time_format)}.zstd')
+        files: dict = {'/a/b': [3, 1.5, 42, 'abcd'], '/a/c': [0, 2.25, 43, None]}
+        Manifest(INCREMENTAL, 'base.zstd', files, ['/a/d']).save(archive)
+
+        self.assertTrue(os.path.isfile(path_of(archive)))
+        loaded: Manifest = Manifest.load(archive)
+        self.assertEqual(INCREMENTAL, loaded.kind)
+        self.assertEqual('base.zstd', loaded.base)
+        self.assertEqual(files, loaded.files)
+        self.assertEqual(['/a/d'], loaded.deleted)
+
+        header: Manifest = Manifest.load(archive, header_only=True)
+        self.assertEqual({}, header.files)
+
+    def test_manifest_not_a_backup(self):
+        """
+        Manifests must not be picked up as backups
+        """
+        archive: str = os.path.join(self.path, f'{today.strftime(time_format)}.zstd')
+        Manifest().save(archive)
+        self.assertEqual([], scan_4_backup(self.path))
+
+    def test_missing(self):
+        self.assertIsNone(Manifest.load(os.path.join(self.path, 'missing.zstd')))
+
+    def test_chains(self):
+        """
+        Incremental backups join the chain of their base
+        """
+        names: list = []
+        for day in range(5, 0, -1):
+            name: str = f'{(today - timedelta(days=day)).strftime(time_format)}.zstd'
+            with open(os.path.join(self.path, name), 'w'):
+                pass
+            names.append(name)
+
+        " 5 days ago: full, 4: incremental, 3: no manifest, 2: full, 1: incremental "
+        Manifest(FULL).save(os.path.join(self.path, names[0]))
+        Manifest(INCREMENTAL, names[0]).save(os.path.join(self.path, names[1]))
+        Manifest(FULL).save(os.path.join(self.path, names[3]))
+        Manifest(INCREMENTAL, names[3]).save(os.path.join(self.path, names[4]))
+
+        result: list = backup.chains(scan_4_backup(self.path))
+        expected: list = [names[0:2], names[2:3], names[3:5]]
+        self.assertEqual(expected, [[os.path.basename(p) for p in chain] for chain in result])
+
+
+class IncrementalBackupTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'incremental')
+    configuration: config.Configuration
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for name in range(3):
+            with open(os.path.join(cls.incl_dir, f'{name}.txt'), 'w') as file:
+                file.write(str(name))
+
+        incremental_config: dict = valid_config.copy()
+        incremental_config['include'] = [cls.incl_dir]
+        incremental_config['destination'] = os.path.join(TEST_DIR, 'incremental_backups')
+        incremental_config['incremental'] = {'enabled': True, 'full_every': 3}
+        incremental_config['settings'] = {**valid_config['settings'], 'progress_bar': {'enabled': False}}
+        cls.configuration = config.Configuration(incremental_config)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.incl_dir)
+        shutil.rmtree(os.path.join(TEST_DIR, 'incremental_backups'))
+
+    def _backup(self, when: int) -> backup.BackupProfile:
+        """
+        Make a backup named as if it was created 'when' minutes from now
+        """
+        profile = backup.BackupProfile(self.configuration)
+        profile.filename = f'{(today + timedelta(minutes=when)).strftime(time_format)}.zstd'
+        zstd_compress(profile, self.configuration)
+        return profile
+
+    def test_chain(self):
+        first = self._backup(0)
+        self.assertEqual(FULL, first.kind)
+        self.assertEqual(3, len(first.children))
+
+        " Change 1 file, delete 1 file "
+        with open(os.path.join(self.incl_dir, '0.txt'), 'w') as file:
+            file.write('changed')
+        os.remove(os.path.join(self.incl_dir, '2.txt'))
+
+        second = self._backup(1)
+        self.assertEqual(INCREMENTAL, second.kind)
+        self.assertEqual(first.filename, second.base)
+        self.assertEqual({os.path.join(self.incl_dir, '0.txt')}, second.children)
+        self.assertEqual([os.path.join(self.incl_dir, '2.txt')], second.deleted)
+
+        " Unchanged files keep their hash "
+        saved: Manifest = Manifest.load(os.path.join(second.destination, second.filename))
+        previous: Manifest = Manifest.load(os.path.join(first.destination, first.filename))
+        unchanged: str = os.path.join(self.incl_dir, '1.txt')
+        self.assertIsNotNone(saved.files[unchanged][3])
+        self.assertEqual(previous.files[unchanged], saved.files[unchanged])
+
+        " Chain is full after 3 backups "
+        third = self._backup(2)
+        self.assertEqual(INCREMENTAL, third.kind)
+        self.assertEqual(0, len(third.children))
+        fourth = self._backup(3)
+        self.assertEqual(FULL, fourth.kind)
+
+
+if __name__ == '__main__':
+    unittest.main()
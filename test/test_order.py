@@ -0,0 +1,50 @@
+import os
+import shutil
+import unittest
+
+from src.ignore import IgnoreMatcher
+from src.order import order, physical_offset
+from src.scanner import scan
+from test import TEST_DIR
+
+
+class OrderTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'order')
+    entries: list
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(os.path.join(cls.path, 'sub'), exist_ok=True)
+        for name in ['b.txt', 'a.txt', os.path.join('sub', 'c.txt'), 'empty.txt']:
+            with open(os.path.join(cls.path, name), 'w') as file:
+                file.write('' if name == 'empty.txt' else name * 100)
+
+        cls.entries = list(scan({cls.path}, IgnoreMatcher()).values())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def test_path(self):
+        self.assertEqual(self.entries, order(self.entries))
+
+    def test_inode(self):
+        ordered: list = order(self.entries, 'inode')
+        self.assertEqual(sorted(self.entries, key=lambda x: x.inode), ordered)
+
+    def test_extent(self):
+        """
+        Every file is kept, whether its location is known or not
+        """
+        ordered: list = order(self.entries, 'extent')
+        self.assertEqual(sorted(self.entries), sorted(ordered))
+
+        " Empty files have no extent "
+        empty = next(entry for entry in self.entries if entry.path.endswith('empty.txt'))
+        self.assertEqual(-1, physical_offset(empty))
+        for entry in self.entries:
+            self.assertGreaterEqual(physical_offset(entry), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import unittest
+
+import zstandard as zstd
+
+from src.config.CompressionPolicy import CompressionPolicy
+from src.ignore import IgnoreMatcher
+from src.policy import STORE, Policy, entropy, is_compressed
+from src.scanner import scan
+from test import TEST_DIR
+
+
+class PolicyTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'policy')
+    entries: dict
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.path, exist_ok=True)
+        files: dict = {
+            'photo.JPG': b'\xff\xd8\xff' + bytes(100),
+            'notes.txt': b'text ' * 20000,
+            'random.bin': os.urandom(100 * 1024),
+            'archive.bin': b'PK\x03\x04' + bytes(100 * 1024),
+            'small.bin': os.urandom(1024),
+            'server.log': b'line\n' * 100,
+        }
+        for name, data in files.items():
+            with open(os.path.join(cls.path, name), 'wb') as file:
+                file.write(data)
+
+        cls.entries = {os.path.basename(path): entry for path, entry in scan({cls.path}, IgnoreMatcher()).items()}
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def _policy(self, **settings) -> Policy:
+        return Policy(CompressionPolicy({'enabled': True, **settings}), 3, lambda level: zstd.ZstdCompressor(level=level))
+
+    def test_entropy(self):
+        self.assertEqual(0.0, entropy(b''))
+        self.assertEqual(0.0, entropy(b'aaaa'))
+        self.assertEqual(1.0, entropy(b'abab'))
+        self.assertGreater(entropy(os.urandom(4096)), 7.5)
+
+    def test_is_compressed(self):
+        self.assertTrue(is_compressed(b'\x28\xb5\x2f\xfd\x00'))
+        self.assertTrue(is_compressed(b'\x00\x00\x00\x20ftypisom'))
+        self.assertFalse(is_compressed(b'hello world'))
+
+    def test_level_of(self):
+        policy: Policy = self._policy(levels={'log': 19, 'txt': 'store'})
+        levels: dict = {name: policy.level_of(entry) for name, entry in self.entries.items()}
+
+        self.assertEqual({
+            'photo.JPG': STORE,         # known extension
+            'notes.txt': STORE,         # level set for its extension
+            'random.bin': STORE,        # too random
+            'archive.bin': STORE,       # magic bytes
+            'small.bin': 3,             # too small to be sampled
+            'server.log': 19,
+        }, levels)
+
+    def test_no_sniff(self):
+        policy: Policy = self._policy(sniff=False)
+        self.assertEqual(3, policy.level_of(self.entries['random.bin']))
+        self.assertEqual(STORE, policy.level_of(self.entries['photo.JPG']))
+
+    def test_group(self):
+        """
+        Files of a level sit next to each other, in their original order
+        """
+        entries: list = sorted(self.entries.values())
+        grouped: list = self._policy().group(entries)
+
+        self.assertEqual(sorted(entries), sorted(grouped))
+        levels: list = [self._policy().level_of(entry) for entry in grouped]
+        self.assertEqual(len(set(levels)), sum(1 for a, b in zip([None] + levels, levels) if a != b))
+
+    def test_compressor(self):
+        """
+        One compressor per level
+        """
+        policy: Policy = self._policy()
+        self.assertIs(policy.compressor(self.entries['photo.JPG']), policy.compressor(self.entries['random.bin']))
+        self.assertIsNot(policy.compressor(self.entries['photo.JPG']), policy.compressor(self.entries['notes.txt']))
@@ -0,0 +1,85 @@
+import os
+import shutil
+import unittest
+
+from src.prefetch import MIN_BLOCK, Prefetcher, _plan
+from src.scanner import FileEntry
+from test import TEST_DIR
+
+
+class PrefetchTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'prefetch')
+    entries: list
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.path, exist_ok=True)
+
+        " Empty, smaller than a block, exactly a block and a few blocks "
+        cls.entries = []
+        for name, size in enumerate([0, 1000, MIN_BLOCK, 5 * MIN_BLOCK + 17]):
+            filepath: str = os.path.join(cls.path, f'{name}.bin')
+            with open(filepath, 'wb') as file:
+                file.write(os.urandom(size))
+            cls.entries.append(FileEntry.from_stat(filepath, os.lstat(filepath)))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def test_same_content(self):
+        with Prefetcher(self.entries, workers=2, depth=2, memory=3 * MIN_BLOCK) as prefetcher:
+            self.assertEqual(MIN_BLOCK, prefetcher.block_size)
+
+            for entry in self.entries:
+                with open(entry.path, 'rb') as original, prefetcher.open(entry) as file:
+                    " Odd read sizes cross block boundaries "
+                    data: bytes = b''.join(iter(lambda: file.read(10007), b''))
+                    self.assertEqual(original.read(), data)
+
+                " Buffers never outnumber the pool "
+                self.assertLessEqual(len(prefetcher._free) + len(prefetcher._pending), 3)
+
+    def test_small_files_batched(self):
+        """
+        Small files share a block, large ones are split
+        """
+        blocks: list = list(_plan(self.entries, 2 * MIN_BLOCK))
+        self.assertEqual([[self.entries[1], self.entries[2]]], [[part.entry for part in blocks[0]]])
+        self.assertEqual([0, 1000], [part.position for part in blocks[0]])
+        self.assertEqual(4, len(blocks))
+
+        with Prefetcher(self.entries + self.entries, workers=2, depth=2, memory=6 * MIN_BLOCK) as prefetcher:
+            for entry in self.entries + self.entries:
+                with open(entry.path, 'rb') as original, prefetcher.open(entry) as file:
+                    self.assertEqual(original.read(), file.read())
+
+    def test_unread_blocks_skipped(self):
+        """
+        Closing a file early keeps next files in line
+        """
+        entries: list = self.entries[1:] + self.entries[1:]
+
+        with Prefetcher(entries, workers=2, depth=2, memory=3 * MIN_BLOCK) as prefetcher:
+            for entry in entries[:3]:
+                with prefetcher.open(entry) as file:
+                    file.read(1)
+
+            for entry in entries[3:]:
+                with open(entry.path, 'rb') as original, prefetcher.open(entry) as file:
+                    self.assertEqual(original.read(), file.read())
+
+    def test_missing_file(self):
+        missing = self.entries[1]._replace(path=os.path.join(self.path, 'missing.bin'))
+
+        with Prefetcher([missing, self.entries[-1]], workers=2, depth=4) as prefetcher:
+            with self.assertRaises(OSError):
+                with prefetcher.open(missing) as file:
+                    file.read()
+
+            with open(self.entries[-1].path, 'rb') as original, prefetcher.open(self.entries[-1]) as file:
+                self.assertEqual(original.read(), file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
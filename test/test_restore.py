@@ -0,0 +1,275 @@
+import os
+import shutil
+import tarfile
+import unittest
+from datetime import timedelta
+from io import BytesIO
+
+import zstandard as zstd
+
+from src import backup, config, time_format, today
+from src.archive import sparse_regions
+from src.chunkstore import chunk_backup, load_snapshot
+from src.compress import arcname, zstd_compress
+from src.manifest import Manifest
+from src.restore import compile_patterns, extract_archive, members, restore, verify, verify_all
+from test import valid_config, TEST_DIR
+
+
+class PatternTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertTrue(compile_patterns([])('home/user/file.txt'))
+
+    def test_folder(self):
+        """
+        A folder selects everything inside it, nothing else
+        """
+        selected = compile_patterns(['/home/user/docs'])
+        self.assertTrue(selected('home/user/docs'))
+        self.assertTrue(selected('home/user/docs/a/b.txt'))
+        self.assertFalse(selected('home/user/docs2/b.txt'))
+
+    def test_any_depth(self):
+        selected = compile_patterns(['*.txt'])
+        self.assertTrue(selected('a.txt'))
+        self.assertTrue(selected('home/user/a.txt'))
+        self.assertFalse(selected('home/user/a.txt.bak'))
+
+
+class RestoreTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'restore_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'restore_backups')
+    target: str = os.path.join(TEST_DIR, 'restored')
+
+    def setUp(self):
+        os.makedirs(os.path.join(self.incl_dir, 'sub'), exist_ok=True)
+        for name in ['0.txt', '1.txt', os.path.join('sub', '2.bin')]:
+            with open(os.path.join(self.incl_dir, name), 'w') as file:
+                file.write(name * 1000)
+
+    def tearDown(self):
+        for path in [self.incl_dir, self.dest_dir, self.target]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _config(self, **changes) -> config.Configuration:
+        restore_config: dict = valid_config.copy()
+        restore_config['include'] = [self.incl_dir]
+        restore_config['destination'] = self.dest_dir
+        restore_config['settings'] = {**valid_config['settings'], 'progress_bar': {'enabled': False}}
+        restore_config.update(changes)
+        return config.Configuration(restore_config)
+
+    def _backup(self, configuration: config.Configuration, when: int = 0) -> str:
+        """
+        Make a backup named as if it was created 'when' minutes from now
+        :return: path to the backup
+        """
+        profile = backup.BackupProfile(configuration)
+        profile.filename = f'{(today + timedelta(minutes=when)).strftime(time_format)}.zstd'
+        if configuration.settings.backend == 'chunks':
+            chunk_backup(profile, configuration)
+            return os.path.join(self.dest_dir, profile.filename.replace('.zstd', '.snapshot'))
+
+        zstd_compress(profile, configuration)
+        return os.path.join(self.dest_dir, profile.filename)
+
+    def _restored(self, path: str) -> str:
+        return os.path.join(self.target, arcname(path))
+
+    def _assert_restored(self, *names: str) -> None:
+        for name in names:
+            path: str = os.path.join(self.incl_dir, name)
+            with open(path) as original, open(self._restored(path)) as restored:
+                self.assertEqual(original.read(), restored.read())
+
+    def test_single_frame(self):
+        archive: str = self._backup(self._config(arguments={'level': 1, 'threads': 0}))
+        self.assertEqual(3, len(restore(archive, self.target)))
+        self._assert_restored('0.txt', '1.txt', os.path.join('sub', '2.bin'))
+
+    def test_seekable(self):
+        archive: str = self._backup(self._config(arguments={'level': 1, 'threads': 0, 'frame_size': 1}))
+        self.assertEqual(3, len(list(members(archive))))
+
+        restored: list = restore(archive, self.target, ['sub'], workers=2)
+        self.assertEqual([arcname(os.path.join(self.incl_dir, 'sub', '2.bin'))], restored)
+        self.assertFalse(os.path.exists(self._restored(os.path.join(self.incl_dir, '0.txt'))))
+
+    def test_chain(self):
+        """
+        Incremental backup brings back files from its whole
+        chain, deleted files stay deleted.
+        """
+        configuration = self._config(incremental={'enabled': True, 'full_every': 3})
+        self._backup(configuration, 0)
+
+        with open(os.path.join(self.incl_dir, '0.txt'), 'w') as file:
+            file.write('changed')
+        os.remove(os.path.join(self.incl_dir, '1.txt'))
+        archive: str = self._backup(configuration, 1)
+
+        self.assertEqual(2, len(restore(archive, self.target)))
+        self._assert_restored('0.txt', os.path.join('sub', '2.bin'))
+        self.assertFalse(os.path.exists(self._restored(os.path.join(self.incl_dir, '1.txt'))))
+
+    def test_snapshot(self):
+        snapshot: str = self._backup(self._config(settings={**valid_config['settings'], 'backend': 'chunks'}))
+        self.assertEqual(3, len(restore(snapshot, self.target)))
+        self._assert_restored('0.txt', '1.txt', os.path.join('sub', '2.bin'))
+        self.assertTrue(verify(snapshot))
+
+    def _special_files(self) -> bool:
+        """
+        Add a hard link, symlinks to a file and a folder, an empty folder and a sparse file
+        :return: whether the file system reports holes of the sparse file
+        """
+        os.link(os.path.join(self.incl_dir, '0.txt'), os.path.join(self.incl_dir, 'hard.txt'))
+        os.symlink('0.txt', os.path.join(self.incl_dir, 'soft.txt'))
+        os.symlink('sub', os.path.join(self.incl_dir, 'soft_dir'))
+        os.makedirs(os.path.join(self.incl_dir, 'empty'))
+        with open(os.path.join(self.incl_dir, 'sparse.img'), 'wb') as file:
+            file.truncate(16 << 20)
+            file.seek(4 << 20)
+            file.write(b'data' * 2048)
+
+        with open(os.path.join(self.incl_dir, 'sparse.img'), 'rb') as file:
+            return sparse_regions(file, 16 << 20) is not None
+
+    @unittest.skipUnless(os.name == 'posix' and hasattr(os, 'SEEK_HOLE'), 'needs hard links and holes')
+    def test_special_files(self):
+        """
+        Hard links are stored once, holes are not stored,
+        links and empty folders come back as they were
+        """
+        holes: bool = self._special_files()
+        configuration = self._config(settings={**valid_config['settings'], 'verify': True})
+        archive: str = self._backup(configuration)
+        self.assertTrue(verify(archive))
+
+        kinds: dict = {os.path.basename(member.name): member for member in members(archive)}
+        self.assertTrue(kinds['hard.txt'].islnk() or kinds['0.txt'].islnk())
+        self.assertTrue(kinds['soft.txt'].issym())
+        self.assertTrue(kinds['soft_dir'].issym())
+        self.assertTrue(kinds['empty'].isdir())
+
+        restore(archive, self.target)
+        self._assert_restored('0.txt', 'hard.txt', 'sparse.img')
+        hard: os.stat_result = os.stat(self._restored(os.path.join(self.incl_dir, 'hard.txt')))
+        self.assertEqual(2, hard.st_nlink)
+        self.assertEqual('0.txt', os.readlink(self._restored(os.path.join(self.incl_dir, 'soft.txt'))))
+        self.assertEqual('sub', os.readlink(self._restored(os.path.join(self.incl_dir, 'soft_dir'))))
+        self.assertTrue(os.path.isdir(self._restored(os.path.join(self.incl_dir, 'empty'))))
+        if holes:
+            " Holes are neither stored nor written "
+            self.assertLess(os.path.getsize(archive), 1 << 20)
+            sparse: os.stat_result = os.stat(self._restored(os.path.join(self.incl_dir, 'sparse.img')))
+            self.assertLess(sparse.st_blocks * 512, 1 << 20)
+
+    @unittest.skipUnless(os.name == 'posix' and hasattr(os, 'SEEK_HOLE'), 'needs hard links and holes')
+    def test_hard_link_alone(self):
+        """
+        Restoring a hard link brings the file it points to
+        """
+        self._special_files()
+        archive: str = self._backup(self._config(arguments={'level': 1, 'threads': 0, 'frame_size': 1}))
+
+        link: str = next(member for member in members(archive) if member.islnk()).name
+        restored: list = restore(archive, self.target, [link])
+        self.assertEqual(2, len(restored))
+        self._assert_restored('0.txt', 'hard.txt')
+
+    def test_snapshot_empty_folder(self):
+        os.makedirs(os.path.join(self.incl_dir, 'empty'))
+        snapshot: str = self._backup(self._config(settings={**valid_config['settings'], 'backend': 'chunks'}))
+        restore(snapshot, self.target)
+        self.assertTrue(os.path.isdir(self._restored(os.path.join(self.incl_dir, 'empty'))))
+
+    @unittest.skipUnless(os.name == 'posix' and hasattr(os, 'SEEK_HOLE'), 'needs hard links and holes')
+    def test_snapshot_special_files(self):
+        """
+        Hard links are read once and linked again,
+        holes are neither stored nor written
+        """
+        holes: bool = self._special_files()
+        snapshot: str = self._backup(self._config(settings={**valid_config['settings'], 'backend': 'chunks'}))
+        self.assertTrue(verify(snapshot))
+
+        items: dict = {os.path.basename(item[0]): item for item in load_snapshot(snapshot)}
+        self.assertIn(items['hard.txt'][7] or items['0.txt'][7], (items['0.txt'][0], items['hard.txt'][0]))
+
+        restore(snapshot, self.target)
+        self._assert_restored('0.txt', 'hard.txt', 'sparse.img')
+        hard: os.stat_result = os.stat(self._restored(os.path.join(self.incl_dir, 'hard.txt')))
+        self.assertEqual(2, hard.st_nlink)
+        sparse: os.stat_result = os.stat(self._restored(os.path.join(self.incl_dir, 'sparse.img')))
+        self.assertEqual(16 << 20, sparse.st_size)
+        if holes:
+            self.assertIsInstance(items['sparse.img'][6][0], int)
+            self.assertLess(sparse.st_blocks * 512, 1 << 20)
+
+    @unittest.skipUnless(os.name == 'posix', 'needs symlinks')
+    def test_outside_target(self):
+        """
+        Nothing is written through a symlink leading out of
+        target folder, nor hard linked to a file out of it
+        """
+        outside: str = os.path.join(TEST_DIR, 'outside')
+        os.makedirs(outside, exist_ok=True)
+        self.addCleanup(shutil.rmtree, outside)
+
+        buffer = BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            link = tarfile.TarInfo('evil')
+            link.type, link.linkname = tarfile.SYMTYPE, outside
+            tar.addfile(link)
+
+            data: bytes = b'escaped'
+            member = tarfile.TarInfo('evil/file.txt')
+            member.size = len(data)
+            tar.addfile(member, BytesIO(data))
+
+            hard = tarfile.TarInfo('hard')
+            hard.type, hard.linkname = tarfile.LNKTYPE, 'evil/file.txt'
+            tar.addfile(hard)
+
+        os.makedirs(self.dest_dir, exist_ok=True)
+        archive: str = os.path.join(self.dest_dir, 'outside.zstd')
+        with open(archive, 'wb') as file:
+            file.write(zstd.ZstdCompressor().compress(buffer.getvalue()))
+
+        self.assertEqual(['evil'], extract_archive(archive, self.target, lambda name: True))
+        self.assertEqual([], os.listdir(outside))
+        self.assertFalse(os.path.lexists(os.path.join(self.target, 'hard')))
+
+    def test_verify(self):
+        archive: str = self._backup(self._config())
+        self.assertTrue(verify(archive))
+
+        " Flip a byte in the middle of the archive "
+        with open(archive, 'r+b') as file:
+            file.seek(os.path.getsize(archive) // 3)
+            byte: bytes = file.read(1)
+            file.seek(-1, os.SEEK_CUR)
+            file.write(bytes([byte[0] ^ 0xFF]))
+        self.assertFalse(verify(archive))
+
+    def test_verify_hashes(self):
+        """
+        Files are checked against hashes in backup's manifest
+        """
+        configuration = self._config(settings={**valid_config['settings'], 'verify': True})
+        archive: str = self._backup(configuration)
+        other: str = self._backup(configuration, 1)
+        self.assertEqual([], verify_all([archive, other]))
+
+        manifest: Manifest = Manifest.load(archive)
+        for info in manifest.files.values():
+            self.assertIsNotNone(info[3])
+            info[3] = '0' * 32
+        manifest.save(archive)
+        self.assertEqual([archive], verify_all([archive, other], 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import shutil
+import unittest
+from datetime import datetime, timedelta
+
+from src import retention, time_format, today
+from src.dir import scan_4_backup
+from src.manifest import FULL, INCREMENTAL, Manifest
+from test import TEST_DIR
+
+
+class BackupsTestCase(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'retention')
+    names: list
+
+    def setUp(self):
+        """
+        Backups made 40, 30, 20, 10 days ago (single ones) and
+        3, 2, 1 days ago (a chain), each of 1000 bytes
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        self.names = []
+        for day in [40, 30, 20, 10, 3, 2, 1]:
+            name: str = f'{(today - timedelta(days=day)).strftime(time_format)}.zstd'
+            with open(os.path.join(self.path, name), 'wb') as file:
+                file.write(bytes(1000))
+            self.names.append(name)
+
+        Manifest(FULL).save(os.path.join(self.path, self.names[4]))
+        Manifest(INCREMENTAL, self.names[4]).save(os.path.join(self.path, self.names[5]))
+        Manifest(INCREMENTAL, self.names[5]).save(os.path.join(self.path, self.names[6]))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _plan(self, **kwargs) -> retention.Plan:
+        return retention.plan(scan_4_backup(self.path), **kwargs)
+
+    def _deleted(self, plan: retention.Plan, reason: str = None) -> list:
+        return [os.path.basename(path) for path in plan.backups(reason)]
+
+
+class RetentionTest(BackupsTestCase):
+
+    def test_load(self):
+        chains: list = retention.load(scan_4_backup(self.path))
+        self.assertEqual(5, len(chains))
+        self.assertEqual(3, len(chains[-1].paths))
+        self.assertEqual(sorted(chains, key=lambda x: x.date), chains)
+        self.assertGreater(chains[-1].size, 3000)
+
+    def test_nothing(self):
+        self.assertEqual({}, self._plan().deletions)
+
+    def test_retention(self):
+        plan: retention.Plan = self._plan(retention=15)
+        self.assertEqual(self.names[:3], self._deleted(plan, retention.EXPIRED))
+        self.assertEqual(3000, plan.freed)
+
+    def test_keep(self):
+        """
+        Whole chains go, most recent one stays whatever 'keep' is
+        """
+        self.assertEqual(self.names[:3], self._deleted(self._plan(keep=5)))
+        self.assertEqual(self.names[:4], self._deleted(self._plan(keep=1)))
+        self.assertEqual(self.names[1:3], self._deleted(self._plan(keep=5, retention=35), retention.OVER_KEEP))
+
+    def test_space(self):
+        plan: retention.Plan = self._plan(needed=2500, free=0, for_space=True)
+        self.assertEqual(self.names[:3], self._deleted(plan, retention.FOR_SPACE))
+        self.assertTrue(plan.enough)
+
+        " Not aggressive: most recent chain is kept even without enough space "
+        plan = self._plan(needed=1 << 20, free=0, for_space=True)
+        self.assertEqual(self.names[:4], self._deleted(plan))
+        self.assertFalse(plan.enough)
+
+        plan = self._plan(needed=1 << 20, free=0, for_space=True, aggressive=True)
+        self.assertEqual(self.names, self._deleted(plan))
+
+        " Nothing goes when it fits already "
+        self.assertEqual([], self._deleted(self._plan(needed=2500, free=10000, for_space=True)))
+
+    def test_protect(self):
+        """
+        Chain a new incremental backup builds upon is never deleted
+        """
+        plan = self._plan(retention=1, needed=1 << 20, for_space=True, aggressive=True, protect={self.names[6]})
+        self.assertEqual(self.names[:4], self._deleted(plan))
+
+    def test_report_and_execute(self):
+        plan: retention.Plan = self._plan(keep=3)
+        report: list = plan.report()
+        self.assertEqual(len(self.names[:4]) + 1, len(report))
+        self.assertIn('over keep', report[0])
+
+        " Nothing is deleted until executed "
+        self.assertEqual(7, len(scan_4_backup(self.path)))
+        plan.execute()
+        self.assertEqual(sorted(self.names[4:]), sorted(os.path.basename(p) for p in scan_4_backup(self.path)))
+
+
+class GFSTest(unittest.TestCase):
+
+    def test_select(self):
+        """
+        Newest backup of each bucket, buckets of all tiers add up
+        """
+        start = datetime(2024, 3, 10, 12)
+        " A backup every 12 hours for 120 days, newest first "
+        dates: list = [start - timedelta(hours=12 * i) for i in range(240)]
+
+        kept: set = retention.select(dates, {'daily': 3})
+        self.assertEqual({0, 2, 4}, kept)
+
+        " Newest of March is picked already, then newest of February and January "
+        kept = retention.select(dates, {'daily': 2, 'monthly': 3})
+        picked: list = [dates[i] for i in sorted(kept)]
+        self.assertEqual(dates[0:3:2] + [datetime(2024, 2, 29, 12), datetime(2024, 1, 31, 12)], picked)
+
+        kept = retention.select(dates, {'weekly': 2, 'yearly': 5})
+        self.assertEqual(3, len(kept))
+        self.assertEqual(datetime(2023, 12, 31, 12), dates[max(kept)])
+
+        self.assertEqual(set(), retention.select(dates, {'daily': 0}))
+
+
+class GFSPlanTest(BackupsTestCase):
+
+    def setUp(self):
+        """
+        Make backups of 20 and 10 days ago a chain as well
+        """
+        super().setUp()
+        Manifest(FULL).save(os.path.join(self.path, self.names[2]))
+        Manifest(INCREMENTAL, self.names[2]).save(os.path.join(self.path, self.names[3]))
+
+    def test_tiers(self):
+        plan: retention.Plan = self._plan(keep=7, retention=100, tiers={'daily': 5})
+        self.assertEqual(self.names[:2], self._deleted(plan, retention.NOT_IN_TIERS))
+
+    def test_base_kept(self):
+        """
+        A base that isn't picked stays while a backup built on it is picked
+        """
+        plan: retention.Plan = self._plan(tiers={'daily': 4})
+        self.assertEqual(self.names[:2], self._deleted(plan))
+
+    def test_tail(self):
+        """
+        Backups after the last one needed in a chain go on their own
+        """
+        plan: retention.Plan = self._plan(tiers={'daily': 1}, protect={self.names[2]})
+        self.assertEqual(self.names[:2] + self.names[3:4], self._deleted(plan))
+
+        " Part left can go for space "
+        plan = self._plan(tiers={'daily': 4}, needed=1 << 20, for_space=True)
+        self.assertEqual(self.names[:2], self._deleted(plan, retention.NOT_IN_TIERS))
+        self.assertEqual(self.names[2:4], self._deleted(plan, retention.FOR_SPACE))
@@ -0,0 +1,152 @@
+import os
+import shutil
+import stat
+import unittest
+
+from src.ignore import IgnoreMatcher
+from src.scanner import FileEntry, scan
+from test import TEST_DIR
+
+
+class ScannerTest(unittest.TestCase):
+    path: str = os.path.join(TEST_DIR, 'scanner')
+
+    @classmethod
+    def setUpClass(cls):
+        " Create 3 nested folders, each contains 3 files "
+        for subdir in ['a', os.path.join('a', 'b'), 'c']:
+            os.makedirs(os.path.join(cls.path, subdir), exist_ok=True)
+
+            for name in range(3):
+                with open(os.path.join(cls.path, subdir, f'{name}.txt'), 'wb') as file:
+                    file.write(b'\0' * (name + 1))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def test_same_as_os_walk(self):
+        """
+        Scanner must find the same files as os.walk
+        """
+        expected = set()
+        for root, dirs, files in os.walk(self.path):
+            for name in files:
+                expected.add(os.path.join(root, name))
+
+        self.assertEqual(expected, set(scan({self.path}, IgnoreMatcher())))
+
+    def test_metadata(self):
+        """
+        Collected metadata must match a fresh stat
+        """
+        for path, entry in scan({self.path}, IgnoreMatcher()).items():
+            self.assertIsInstance(entry, FileEntry)
+            self.assertEqual(path, entry.path)
+
+            st = os.stat(path)
+            self.assertEqual(st.st_size, entry.size)
+            self.assertEqual(st.st_mtime, entry.mtime)
+            self.assertEqual(st.st_mode, entry.mode)
+            self.assertEqual(st.st_ino, entry.inode)
+            self.assertTrue(entry.isreg)
+
+    def test_empty_folder(self):
+        """
+        Empty folders are collected, folders with files are not
+        """
+        empty: str = os.path.join(self.path, 'c', 'empty')
+        os.makedirs(empty)
+        try:
+            manifest: dict = scan({self.path}, IgnoreMatcher())
+            self.assertIn(empty, manifest)
+            self.assertTrue(manifest[empty].isdir)
+            self.assertEqual(0, manifest[empty].size)
+            self.assertNotIn(os.path.join(self.path, 'c'), manifest)
+        finally:
+            os.rmdir(empty)
+
+    @unittest.skipUnless(os.name == 'posix', 'needs symlinks')
+    def test_symlink_to_folder(self):
+        """
+        A symlink to a folder is collected as a link,
+        the folder it points to is not scanned again
+        """
+        link: str = os.path.join(self.path, 'c', 'link')
+        os.symlink(os.path.join(self.path, 'a'), link)
+        try:
+            manifest: dict = scan({self.path}, IgnoreMatcher())
+            self.assertIn(link, manifest)
+            self.assertTrue(stat.S_ISLNK(manifest[link].mode))
+            self.assertEqual(0, manifest[link].size)
+            self.assertNotIn(os.path.join(link, '0.txt'), manifest)
+        finally:
+            os.remove(link)
+
+    def test_ignored(self):
+        """
+        Paths rejected by 'ignored' must not be collected
+        """
+        ignore: str = os.path.join(self.path, 'a')
+        manifest: dict = scan({self.path}, IgnoreMatcher([ignore]))
+
+        self.assertEqual(3, len(manifest))
+        for path in manifest:
+            self.assertFalse(path.startswith(ignore))
+
+    def test_ignored_folder_pruned(self):
+        """
+        Nothing inside an ignored folder may be looked at
+        """
+        ignore: str = os.path.join(self.path, 'a')
+        seen: list = []
+
+        class _Recorder(IgnoreMatcher):
+            def match(self, path: str, is_dir: bool = False) -> bool:
+                seen.append(path)
+                return super().match(path, is_dir)
+
+        scan({self.path}, _Recorder([ignore]))
+        for path in seen:
+            self.assertFalse(path.startswith(ignore + os.sep), f'{path} must not be scanned')
+
+    def test_ignore_file(self):
+        """
+        Patterns in a folder's ignore file only apply inside that folder
+        """
+        ignore_file: str = os.path.join(self.path, 'a', '.backupignore')
+        with open(ignore_file, 'w') as file:
+            file.write('# comment\n0.txt\nb/\n')
+
+        try:
+            manifest: dict = scan({self.path}, IgnoreMatcher(ignore_file='.backupignore'))
+        finally:
+            os.remove(ignore_file)
+
+        self.assertNotIn(os.path.join(self.path, 'a', '0.txt'), manifest)
+        self.assertNotIn(os.path.join(self.path, 'a', 'b', '1.txt'), manifest)
+        self.assertIn(os.path.join(self.path, 'a', '1.txt'), manifest)
+        self.assertIn(os.path.join(self.path, 'c', '0.txt'), manifest)
+
+    def test_parallel(self):
+        """
+        Parallel scan must return the same entries in the same order
+        """
+        serial: dict = scan({self.path}, IgnoreMatcher())
+        for workers in [0, 2, 4]:
+            parallel: dict = scan({self.path}, IgnoreMatcher(), workers)
+            self.assertEqual(list(serial.items()), list(parallel.items()))
+
+    def test_single_file(self):
+        """
+        A file can be included directly
+        """
+        filepath: str = os.path.join(self.path, 'c', '2.txt')
+        manifest: dict = scan({filepath}, IgnoreMatcher())
+
+        self.assertEqual([filepath], list(manifest))
+        self.assertEqual(3, manifest[filepath].size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import pickle
+import shutil
+import unittest
+from datetime import timedelta
+
+import zstandard as zstd
+
+from src import backup, config, dir, space, time_format, today
+from src.catalog import Catalog
+from src.compress import estimated_size, zstd_compress
+from src.frames import read_metadata
+from src.ignore import IgnoreMatcher
+from src.scanner import scan
+from test import valid_config, TEST_DIR
+
+
+class SpaceTest(unittest.TestCase):
+    incl_dir: str = os.path.join(TEST_DIR, 'space_include')
+    dest_dir: str = os.path.join(TEST_DIR, 'space_backups')
+
+    @classmethod
+    def setUpClass(cls):
+        os.makedirs(cls.incl_dir, exist_ok=True)
+        for name in range(5):
+            with open(os.path.join(cls.incl_dir, f'{name}.txt'), 'wb') as file:
+                file.write(b'compressible line of text\n' * 4000)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.incl_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_dir, ignore_errors=True)
+
+    def _configuration(self, reserve: int = 0, **changes) -> config.Configuration:
+        space_config: dict = valid_config.copy()
+        space_config['include'] = [self.incl_dir]
+        space_config['destination'] = self.dest_dir
+        space_config['arguments'] = {'level': 3, 'threads': 0}
+        space_config['settings'] = {**valid_config['settings'], 'shards': 1, 'reserve_space': reserve}
+        space_config.update(changes)
+        return config.Configuration(space_config)
+
+    def test_sample_ratio(self):
+        """
+        Without previous backup, a sample is compressed
+        """
+        entries: list = list(scan({self.incl_dir}, IgnoreMatcher()).values())
+        ratio: float = space.sample_ratio(entries, lambda x: zstd.ZstdCompressor(level=x), 3)
+        self.assertLess(ratio, 0.1)
+        self.assertEqual(1.0, space.sample_ratio([], lambda x: zstd.ZstdCompressor(level=x), 3))
+
+        predicted: int = space.estimate(1000, entries, [], lambda x: zstd.ZstdCompressor(level=x), 3)
+        self.assertEqual(int(1000 * ratio * space.MARGIN), predicted)
+
+    def test_previous_ratio(self):
+        """
+        Archives record their source size, next backup predicts its size from it
+        """
+        configuration = self._configuration()
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        archive: str = os.path.join(self.dest_dir, profile.filename)
+
+        with open(archive, 'rb') as file:
+            self.assertEqual(len(profile), read_metadata(file)['source_size'])
+
+        backups: list = dir.scan_4_backup(self.dest_dir)
+        ratio: float = space.previous_ratio(backups)
+        self.assertAlmostEqual(os.path.getsize(archive) / len(profile), ratio)
+        self.assertEqual(int(len(profile) * ratio * space.MARGIN), estimated_size(profile, configuration, backups))
+        self.assertLess(estimated_size(profile, configuration, backups), len(profile))
+
+    def test_full_ratio(self):
+        """
+        Incremental and tiny backups don't predict the next one,
+        last full backup of a decent size does
+        """
+        records: dict = {}
+        for name, kind, ratio, source_size in [('a', 'full', 0.1, 1 << 30), ('b', 'incremental', 0.9, 1 << 30),
+                                               ('c', 'full', 0.2, 1 << 30), ('d', 'incremental', 0.8, 1 << 30),
+                                               ('e', 'full', 0.7, 100)]:
+            records[name] = {'name': name, 'kind': kind, 'ratio': ratio, 'source_size': source_size}
+        self.assertEqual(0.2, space.previous_ratio([], Catalog(self.dest_dir, records)))
+        self.assertIsNone(space.previous_ratio([], Catalog(self.dest_dir, {'d': records['d']})))
+
+        " Same from archives themselves: a full one, then an incremental one of random data "
+        configuration = self._configuration(incremental={'enabled': True, 'full_every': 3})
+        profile = backup.BackupProfile(configuration)
+        zstd_compress(profile, configuration)
+        full: str = os.path.join(self.dest_dir, profile.filename)
+        ratio: float = os.path.getsize(full) / len(profile)
+
+        with open(os.path.join(self.incl_dir, 'random.bin'), 'wb') as file:
+            file.write(os.urandom(1 << 20))
+        self.addCleanup(os.remove, os.path.join(self.incl_dir, 'random.bin'))
+        profile = backup.BackupProfile(configuration)
+        profile.filename = f'{(today + timedelta(minutes=1)).strftime(time_format)}.zstd'
+        self.assertEqual('incremental', profile.kind)
+        zstd_compress(profile, configuration)
+
+        self.assertAlmostEqual(ratio, space.previous_ratio(dir.scan_4_backup(self.dest_dir)))
+
+    def test_guard(self):
+        """
+        Writing stops once free space is below reserve
+        """
+        path: str = os.path.join(TEST_DIR, 'guarded')
+        try:
+            with space.SpaceGuard(open(path, 'wb'), 0, every=4) as file:
+                for _ in range(4):
+                    file.write(b'data')
+                self.assertEqual(16, file.tell())
+
+            with space.SpaceGuard(open(path, 'wb'), 1 << 62) as file:
+                with self.assertRaises(space.NoSpaceError):
+                    file.write(b'data')
+        finally:
+            os.remove(path)
+
+        " Raised in shard workers, must be picklable "
+        error: space.NoSpaceError = pickle.loads(pickle.dumps(space.NoSpaceError('archive', 1024)))
+        self.assertEqual(('archive', 1024), (error.filename, error.free))
+
+    def test_abort(self):
+        """
+        Backup running out of space leaves no partial archive behind
+        """
+        configuration = self._configuration(1 << 40)
+        profile = backup.BackupProfile(configuration)
+
+        with self.assertRaises(space.NoSpaceError):
+            zstd_compress(profile, configuration)
+        self.assertEqual([], os.listdir(self.dest_dir))
@@ -0,0 +1,51 @@
+import unittest
+
+from src.tuner import ChunkTuner
+
+
+class ChunkTunerTest(unittest.TestCase):
+
+    def test_candidates(self):
+        """
+        Sizes grow 4 times each step, largest is always tried
+        """
+        self.assertEqual([64, 256, 1024, 3000], ChunkTuner(64, 3000).candidates)
+        self.assertEqual([64, 256], ChunkTuner(64, 256).candidates)
+        self.assertTrue(ChunkTuner(64, 64).done)
+
+    def test_fastest_is_kept(self):
+        tuner = ChunkTuner(1, 16, trial=1.0)
+        " Bytes per second of each size: 1 -> 10, 4 -> 40, 16 -> 20 "
+        for speed in (10, 40, 20):
+            tuner.record(speed, 1.0)
+
+        self.assertTrue(tuner.done)
+        self.assertEqual(4, tuner.chunk_size)
+        self.assertEqual(4, tuner())
+
+        " Nothing changes once done "
+        tuner.record(1000, 1.0)
+        self.assertEqual(4, tuner.chunk_size)
+
+    def test_trial_length(self):
+        """
+        A size is measured until 'trial' seconds passed
+        """
+        tuner = ChunkTuner(1, 16, trial=1.0)
+        tuner.record(10, 0.5)
+        self.assertEqual(1, tuner.chunk_size)
+        tuner.record(10, 0.5)
+        self.assertEqual(4, tuner.chunk_size)
+        self.assertEqual({1: 20.0}, tuner.results)
+
+    def test_finish_early(self):
+        """
+        Backup may end before every size was tried
+        """
+        tuner = ChunkTuner(1, 16, trial=1.0)
+        tuner.record(10, 1.0)
+        tuner.record(30, 0.5)
+        tuner.finish()
+
+        self.assertTrue(tuner.done)
+        self.assertEqual(4, tuner.chunk_size)
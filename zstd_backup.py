@@ -1,24 +1,17 @@
-from os.path import join
+from os.path import join, splitext
 from time import sleep, perf_counter
 
 import yaml
 
-from src import dir, logger, PROJECT_DIR
-from src.backup import BackupProfile, del_old_backups
-from src.compress import zstd_compress
+from src import dir, logger, retention, PROJECT_DIR
+from src.backup import BackupProfile
+from src.catalog import Catalog
+from src.chunkstore import EXTENSION as SNAPSHOT_EXTENSION, chunk_backup
+from src.compress import estimated_size, zstd_compress
 from src.config import Configuration
 from src.converter import size_converter, time_converter
-from src.parser import parse_date
-
-
-def delete_oldest(backups: list) -> list:
-    backups.sort(key=lambda x: parse_date(dir.basename(x)))
-
-    if len(backups) > 1:
-        dir.delete(backups[0])
-        backups.pop(0)
-
-    return backups
+from src.restore import verify
+from src.space import NoSpaceError
 
 
 if __name__ == '__main__':
@@ -49,12 +42,12 @@ if __name__ == '__main__':
 
         # Exit if there's nothing to compress
         total_size: int = len(profile)
-        if total_size == 0:
+        if not profile.children and not profile.deleted:
             logger.error('There is nothing to backup!')
             exit(0)
         else:
             comp_size: str = size_converter(total_size)
-            logger.info(f'{profile.filename} needs up to {comp_size} to store!')
+            logger.info(f'{profile.filename} has {comp_size} of data to store!')
 
         logger.debug(str(profile))
     except Exception as e:
@@ -62,72 +55,80 @@ if __name__ == '__main__':
         logger.exception(e)
         exit(3)
 
-    old_backups: list = dir.scan_4_backup(profile.destination)
+    # Previous backups come from the catalog loaded with the profile, the destination isn't listed
+    catalog: Catalog = profile.catalog
+    old_backups: list = catalog.paths()
     ob_settings = configuration.old_backups_settings
 
-    try:
-        #
-        #   Step 3: Delete expired backups
-        #
-        if ob_settings.retention > 0:
-
-            del_old_backups(old_backups, ob_settings.retention)
-            old_backups = dir.scan_4_backup(profile.destination)
+    # Compressed size, predicted from last backup's ratio or a sample
+    needed: int = estimated_size(profile, configuration, old_backups, catalog) + configuration.settings.reserve_space
+    logger.info(f'{profile.filename} is predicted to take {size_converter(needed)} (with reserved space)')
 
-        else:
+    #
+    #   Step 3: Plan deletion of old backups, all at once:
+    #   expired ones and ones over 'keep' (or not in GFS tiers),
+    #   then ones in the way of new backup
+    #
+    if ob_settings.gfs.enabled:
+        logger.info(f'Keeping newest backup of the last {ob_settings.gfs.daily} day(s), '
+                    f'{ob_settings.gfs.weekly} week(s), {ob_settings.gfs.monthly} month(s) '
+                    f'and {ob_settings.gfs.yearly} year(s)')
+    else:
+        if ob_settings.retention == 0:
             logger.info('Retention is set to 0 > Overdue backups will not be deleted!')
-
-        #
-        #   Step 4: Reduce the amount of backups to number defined in config.yml
-        #
-        if ob_settings.keep > 0:
-
-            while len(old_backups) > ob_settings.keep - 1:
-                old_backups = delete_oldest(old_backups)
-
-        else:
+        if ob_settings.keep == 0:
             logger.info('Keep is set to 0 > Keep all old backups!')
 
+    plan: retention.Plan = retention.Plan()
+    try:
+        plan = retention.plan(
+            old_backups,
+            ob_settings.keep,
+            ob_settings.retention,
+            needed,
+            dir.get_free_space(profile.destination),
+            ob_settings.del_old_4_space,
+            ob_settings.aggressive,
+            # Incremental backup needs its chain
+            {profile.base},
+            ob_settings.gfs.tiers,
+            catalog
+        )
     except Exception as e:
-        logger.fatal('Failed to make space for new backup!')
+        logger.fatal('Failed to plan deletion of old backups!')
         logger.exception(e)
 
     #
-    #   Step 5: Check for empty space
+    #   Step 4: Delete old backups in one go
     #
-    if total_size > dir.get_free_space(profile.destination):
-        if ob_settings.del_old_4_space:
-            """
-            If 'old_backups.remove_old_backups_for_space' is set to "true".
-            Program will attempt to remove older backups in order to make
-            space for new compressed file.
-            """
+    if ob_settings.dry_run:
+        logger.info('Dry run > Nothing is deleted! Backups that would be deleted:')
+        for line in plan.report():
+            logger.info(line)
 
+    elif plan.deletions:
+        if plan.backups(retention.FOR_SPACE):
             # Warn user about space inefficient, and give them 5 seconds to cancel the task
             logger.error('Not enough space, deleting old backups in 5 seconds... [Ctrl + C] to cancel!')
             sleep(5)
 
-            while total_size > dir.get_free_space(profile.destination):
-                if len(old_backups) == 0:
-                    break
-
-                if len(old_backups) > 1 and not ob_settings.aggressive:
-                    """
-                    Break while-loop if 'old_backups.aggressive' is set to "false"
-                    and only 1 backup left. Otherwise, delete to the last one.
-                    """
-                    break
+        try:
+            plan.execute(catalog)
+        except Exception as e:
+            logger.fatal('Failed to make space for new backup!')
+            logger.exception(e)
 
-                old_backups = delete_oldest(old_backups)
-
-        if total_size > dir.get_free_space(profile.destination):
-            """
-            If space is insufficient after old backups deletion
-            or when old backup removal is not allowed, throw error
-            then exit with code 2.
-            """
-            logger.fatal('Failed to free up some space, exiting...')
-            exit(2)
+    #
+    #   Step 5: Check for empty space
+    #
+    if needed > dir.get_free_space(profile.destination):
+        """
+        If space is insufficient after old backups deletion
+        or when old backup removal is not allowed, throw error
+        then exit with code 2.
+        """
+        logger.fatal('Failed to free up some space, exiting...')
+        exit(2)
 
     try:
         #
@@ -138,11 +139,35 @@ if __name__ == '__main__':
 
         # Begin compressing
         logger.info('Backing up. Please wait...')
-        zstd_compress(profile, configuration)
+        if configuration.settings.backend == 'chunks':
+            chunk_backup(profile, configuration)
+        else:
+            zstd_compress(profile, configuration)
 
         # Stop timer
         stop: float = perf_counter()
         logger.info(f'Backup finished in {time_converter(stop - start)}')
+    except NoSpaceError:
+        # Partial archive is removed already
+        logger.fatal('Ran out of space while backing up, exiting...')
+        exit(2)
     except Exception as e:
         logger.fatal('Error occurs while backing up!')
         logger.exception(e)
+        exit(4)
+
+    #
+    #   Step 7: Verify backup
+    #
+    if configuration.settings.verify:
+        start: float = perf_counter()
+        logger.info('Verifying backup. Please wait...')
+
+        archive: str = join(profile.destination, profile.filename)
+        if configuration.settings.backend == 'chunks':
+            archive = splitext(archive)[0] + SNAPSHOT_EXTENSION
+
+        if not verify(archive):
+            logger.fatal(f'{archive} failed verification!')
+            exit(5)
+        logger.info(f'Backup verified in {time_converter(perf_counter() - start)}')
@@ -0,0 +1,117 @@
+import os
+import sys
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from os.path import isdir, isfile
+from stat import filemode
+from time import perf_counter
+
+from src import logger
+from src.catalog import Catalog
+from src.chunkstore import EXTENSION as SNAPSHOT_EXTENSION, load_snapshot
+from src.compress import arcname
+from src.converter import size_converter, time_converter
+from src.restore import compile_patterns, members, restore, verify_all
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description='List, extract or verify backups made by zstd_backup.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='show members of a backup')
+    list_parser.add_argument('archive', help='path to a .zstd or .snapshot backup')
+    list_parser.add_argument('patterns', nargs='*', help='only show members matching these globs')
+
+    extract_parser = commands.add_parser('extract', help='restore files from a backup')
+    extract_parser.add_argument('archive', help='path to a .zstd or .snapshot backup')
+    extract_parser.add_argument('patterns', nargs='*', help='only restore members matching these globs')
+    extract_parser.add_argument('-C', '--target', default='.', help='folder to restore into (default: current folder)')
+
+    verify_parser = commands.add_parser('verify', help='check that backups can be read back')
+    verify_parser.add_argument('archives', nargs='+', help='paths to .zstd or .snapshot backups')
+
+    backups_parser = commands.add_parser('backups', help='show backups of a destination, from its catalog')
+    backups_parser.add_argument('destination', help='folder holding backups')
+
+    for sub in (list_parser, extract_parser, verify_parser):
+        sub.add_argument('-j', '--workers', type=int, default=0,
+                         help='threads decompressing frames, 0 uses all threads (default)')
+
+    return parser.parse_args()
+
+
+def describe(kind: str, mode: int, size: int, mtime: float, name: str, link: str = '') -> str:
+    """
+    :param kind: 'd' folder, 'l' symlink, 'h' hard link or '-' file
+    :param link: target of a symlink or hard link
+    :return: line of 'list' output, like 'tar -tv'
+    """
+    line: str = f'{kind}{filemode(mode)[1:]} {size:>12} {datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M")} {name}'
+    if kind == 'l':
+        line += f' -> {link}'
+    elif kind == 'h':
+        line += f' link to {link}'
+    return line
+
+
+def list_backup(archive: str, patterns: list, workers: int) -> None:
+    selected = compile_patterns(patterns)
+
+    if archive.endswith(SNAPSHOT_EXTENSION):
+        for path, size, mtime, mode, inode, link, ids, hard_link in load_snapshot(archive):
+            name: str = arcname(path)
+            if selected(name):
+                kind: str = 'h' if hard_link else filemode(mode)[0]
+                print(describe(kind, mode, size, mtime, name, arcname(hard_link) if hard_link else link))
+        return
+
+    for member in members(archive, workers):
+        if selected(member.name):
+            kind: str = 'd' if member.isdir() else 'l' if member.issym() else 'h' if member.islnk() else '-'
+            print(describe(kind, member.mode, member.size, member.mtime, member.name, member.linkname))
+
+
+if __name__ == '__main__':
+    args: Namespace = parse_args()
+
+    if args.command == 'backups' and not isdir(args.destination):
+        logger.fatal(f'{args.destination} is not a directory!')
+        exit(1)
+
+    for path in [args.archive] if 'archive' in args else getattr(args, 'archives', []):
+        if not isfile(path):
+            logger.fatal(f'{path} does not exist!')
+            exit(1)
+
+    start: float = perf_counter()
+
+    if args.command == 'list':
+        try:
+            list_backup(args.archive, args.patterns, args.workers)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            " Output went to 'head' or such, which stopped reading "
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+    elif args.command == 'extract':
+        logger.info(f'Restoring {args.archive} into {args.target}. Please wait...')
+        restored: list = restore(args.archive, args.target, args.patterns, args.workers)
+        logger.info(f'Restored {len(restored)} file(s) in {time_converter(perf_counter() - start)}')
+
+    elif args.command == 'backups':
+        for name, record in Catalog.load(args.destination).records.items():
+            ratio: str = f'{record["ratio"]:.1%}' if record.get('ratio') is not None else '-'
+            duration: str = time_converter(record['duration']) if record.get('duration') is not None else '-'
+            print(f'{record.get("kind", "full"):<11} {size_converter(record.get("size", 0)):>10} {ratio:>6} '
+                  f'{record.get("files", "-"):>8} {duration:>10} {name}')
+
+    elif args.command == 'verify':
+        damaged: list = verify_all(args.archives, args.workers)
+        for archive in args.archives:
+            if archive not in damaged:
+                logger.info(f'{archive}: OK')
+
+        logger.info(f'Verified {len(args.archives)} backup(s) in {time_converter(perf_counter() - start)}')
+        if damaged:
+            logger.fatal(f'{len(damaged)} backup(s) are damaged!')
+            exit(1)